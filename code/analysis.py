@@ -0,0 +1,148 @@
+import time
+from datetime import datetime
+
+from answer_cache import make_cache_key
+from context_budget import (DEFAULT_MAP_WORKERS, DEFAULT_TOKEN_BUDGET, RESPONSE_RESERVE_TOKENS,
+                            estimate_tokens, fits_budget, map_reduce_answer)
+from metrics import observe, span
+from retrieval import DEFAULT_TOP_K, content_hash, format_context
+from streaming import generate, stream_generate
+
+MODEL_NAME = 'gemini-1.5-flash-latest'
+# Bump whenever the analysis prompt changes so cached answers are not reused
+PROMPT_TEMPLATE_VERSION = "2"
+# Answer from the best matching excerpts, or from the whole document
+SCOPE_EXCERPTS = "excerpts"
+SCOPE_DOCUMENT = "document"
+
+
+def build_prompt(context, query):
+    return f"""
+            Based on the following excerpts from a document, provide a detailed and accurate answer to the question.
+            Each excerpt is labelled with its chunk number and character offsets in the source document.
+            Content: {context}
+            Question: {query}
+            Please provide a clear and concise answer based only on the provided content.
+            """
+
+
+# Excerpts from several corpus documents, each labelled D1, D2, ... so the answer can cite them
+def build_corpus_prompt(context, query):
+    return f"""
+            Based on the following excerpts from several documents, provide a detailed and accurate answer to the question.
+            Each excerpt is labelled with its document (D1, D2, ...), chunk number and character offsets.
+            After each statement, cite the documents it relies on in square brackets, e.g. [D1] or [D1, D3].
+            Content: {context}
+            Question: {query}
+            Please provide a clear and concise answer based only on the provided content.
+            """
+
+
+# Used when the document itself is already held in the model's cached context
+def build_question_prompt(query):
+    return f"""
+            Based on the document provided above, provide a detailed and accurate answer to the question.
+            Question: {query}
+            Please provide a clear and concise answer based only on the document.
+            """
+
+
+def make_history_entry(query, answer, doc_type, **details):
+    entry = {
+        'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'query': query,
+        'answer': answer,
+        'type': doc_type
+    }
+    entry.update(details)
+    return entry
+
+
+# Answer one question against an indexed document; safe to call from worker threads
+def answer_question(model, doc_index, query, answer_cache=None, near_duplicates=False,
+                    stream=False, on_chunk=None, model_name=MODEL_NAME, top_k=DEFAULT_TOP_K,
+                    scope=SCOPE_EXCERPTS, token_budget=DEFAULT_TOKEN_BUDGET, summary_cache=None,
+                    map_workers=DEFAULT_MAP_WORKERS, context_owner=None):
+    start = time.perf_counter()
+    cache_key = None
+    if answer_cache is not None:
+        cache_key = make_cache_key(doc_index.doc_hash, query, model_name,
+                                   f"{PROMPT_TEMPLATE_VERSION}:{scope}", near_duplicates=near_duplicates)
+        answer = answer_cache.get(cache_key, count_miss=scope == SCOPE_DOCUMENT)
+        if answer is not None:
+            return {'answer': answer, 'cached': True, 'strategy': 'cache', 'tokens_spent': 0,
+                    'latency': round(time.perf_counter() - start, 3)}
+    with span("prompt_build"):
+        if scope == SCOPE_DOCUMENT:
+            chunks = doc_index.chunks
+            context = doc_index.text
+        else:
+            # Only the best matching chunks are sent, not the whole document
+            results = doc_index.search(query, top_k=top_k)
+            chunks = sorted((chunk for chunk, _ in results), key=lambda chunk: chunk.start)
+            # Corpus selections label each excerpt with its document
+            context = (doc_index.format_context(results) if hasattr(doc_index, "format_context")
+                       else format_context(results))
+        prompt = (build_corpus_prompt(context, query) if hasattr(doc_index, "citations")
+                  else build_prompt(context, query))
+        evidence_key = None
+        if answer_cache is not None and scope != SCOPE_DOCUMENT:
+            # Keyed by the retrieved excerpts, so a revised document whose relevant chunks did not
+            # change keeps its answers
+            evidence = content_hash("\x00".join(getattr(chunk, "label", "") + chunk.text for chunk in chunks))
+            evidence_key = make_cache_key(evidence, query, model_name, f"{PROMPT_TEMPLATE_VERSION}:evidence",
+                                          near_duplicates=near_duplicates)
+            answer = answer_cache.get(evidence_key)
+            if answer is not None:
+                answer_cache.put(cache_key, answer)
+                reused = {'answer': answer, 'cached': True, 'strategy': 'cache', 'tokens_spent': 0,
+                          'reused_evidence': True, 'latency': round(time.perf_counter() - start, 3)}
+                if hasattr(doc_index, "citations"):
+                    reused['sources'] = doc_index.citations(chunks)
+                return reused
+        fits, prompt_tokens = fits_budget(model, prompt, token_budget - RESPONSE_RESERVE_TOKENS)
+    context = None
+    if fits and scope == SCOPE_DOCUMENT and hasattr(model, "cached_context"):
+        # Whole-document questions send the document once; later ones only send the question
+        with span("context_cache"):
+            context = model.cached_context(doc_index.doc_hash, doc_index.text, owner=context_owner)
+    with span("model_call"):
+        if context is not None:
+            cached_model, handle, created = context
+            prompt = build_question_prompt(query)
+            prompt_tokens = estimate_tokens(prompt)
+            if stream:
+                result = stream_generate(cached_model, prompt, on_chunk=on_chunk)
+            else:
+                result = generate(cached_model, prompt)
+            usage = {'strategy': 'context_cache', 'llm_calls': 1, 'prompt_tokens': prompt_tokens,
+                     'tokens_spent': prompt_tokens + estimate_tokens(result.text),
+                     'context_cache': 'created' if created else 'hit', 'cached_tokens': handle.tokens,
+                     'tokens_saved': 0 if created else handle.tokens}
+        elif fits:
+            if stream:
+                result = stream_generate(model, prompt, on_chunk=on_chunk)
+            else:
+                result = generate(model, prompt)
+            usage = {'strategy': 'direct', 'llm_calls': 1, 'prompt_tokens': prompt_tokens,
+                     'tokens_spent': prompt_tokens + estimate_tokens(result.text)}
+        else:
+            result, usage = map_reduce_answer(model, chunks, query, doc_index.doc_hash,
+                                              token_budget=token_budget, summary_cache=summary_cache,
+                                              model_name=model_name, max_workers=map_workers,
+                                              stream=stream, on_chunk=on_chunk)
+    if hasattr(doc_index, "citations"):
+        usage = dict(usage, sources=doc_index.citations(chunks))
+    observe("model_first_token", result.time_to_first_token)
+    if answer_cache is not None:
+        answer_cache.put(cache_key, result.text)
+        if evidence_key is not None:
+            answer_cache.put(evidence_key, result.text)
+    return dict(
+        usage,
+        answer=result.text,
+        cached=False,
+        time_to_first_token=round(result.time_to_first_token, 3),
+        generation_time=round(result.total_time, 3),
+        latency=round(time.perf_counter() - start, 3)
+    )
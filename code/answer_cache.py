@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import string
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".docugenius", "cache")
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query, near_duplicates=False):
+    query = _WHITESPACE.sub(" ", query).strip()
+    if near_duplicates:
+        query = _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", query.lower())).strip()
+    return query
+
+
+def make_cache_key(doc_hash, query, model_name, template_version, near_duplicates=False):
+    payload = json.dumps(
+        [doc_hash, normalize_query(query, near_duplicates), model_name, template_version]
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Two-tier answer cache: in-memory LRU in front of a SQLite table
+class AnswerCache:
+    def __init__(self, path=None, max_memory_entries=256, max_disk_bytes=64 * 1024 * 1024,
+                 ttl_seconds=7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "answers.sqlite")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, answer TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS answers_accessed ON answers (accessed)")
+        self._db.commit()
+
+    @property
+    def hits(self):
+        return self.stats['memory_hits'] + self.stats['disk_hits']
+
+    @property
+    def misses(self):
+        return self.stats['misses']
+
+    # `count_miss=False` for a first-tier lookup that will be followed by another one
+    def get(self, key, count_miss=True):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                answer, created = entry
+                if now - created <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return answer
+                del self._memory[key]
+            row = self._db.execute(
+                "SELECT answer, created FROM answers WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                self._db.execute("UPDATE answers SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row[0], row[1])
+                self.stats['disk_hits'] += 1
+                return row[0]
+            if row is not None:
+                self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+                self._db.commit()
+                self.stats['evictions'] += 1
+            if count_miss:
+                self.stats['misses'] += 1
+            return None
+
+    def put(self, key, answer):
+        now = time.time()
+        with self._lock:
+            self._remember(key, answer, now)
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, answer, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, answer, len(answer.encode("utf-8")), now, now),
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+
+    def disk_usage(self):
+        with self._lock:
+            row = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        return {'entries': row[0], 'bytes': row[1]}
+
+    def _remember(self, key, answer, created):
+        self._memory[key] = (answer, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def _evict_disk(self, now):
+        expired = self._db.execute(
+            "DELETE FROM answers WHERE created < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.stats['evictions'] += max(expired, 0)
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM answers").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        # Drop least recently accessed rows until the table fits the byte budget
+        for key, size in self._db.execute(
+            "SELECT key, size FROM answers ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM answers WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            self.stats['evictions'] += 1
@@ -0,0 +1,175 @@
+"""HTTP API for the DocuGenius engine.
+
+Run with:  uvicorn api:app --app-dir code --host 0.0.0.0 --port 8000 --workers 4
+
+Document ids are content hashes and every cache lives on disk, so replicas
+behind a load balancer can serve the same document once it has been posted
+to them; clients that cannot pin a replica simply re-post on a 404.
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import FastAPI, File, HTTPException, Query, UploadFile
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from corpus import Corpus
+from document_store import spooled_upload
+from engine import Engine
+from export_pipeline import EXPORT_FORMATS, MEDIA_TYPES, export_history
+from metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from model_backends import BACKEND_ENV_VAR, DEFAULT_BACKEND
+from model_client import get_client
+from usage_analytics import RESOLUTIONS, default_analytics
+
+load_dotenv()
+
+MAX_DOCUMENTS = int(os.environ.get("DOCUGENIUS_MAX_DOCUMENTS", "64"))
+
+app = FastAPI(title="DocuGenius Pro API")
+BACKEND = os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+engine = Engine(model_factory=get_client(BACKEND, os.environ.get("GEMINI_API_KEY")))
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+# Every remembered document, for questions that span several of them
+corpus = Corpus()
+
+
+class TextDocument(BaseModel):
+    text: str
+
+
+class UrlDocument(BaseModel):
+    urls: list[str]
+
+
+class Question(BaseModel):
+    question: str
+    near_duplicates: bool = False
+
+
+class CorpusQuestion(BaseModel):
+    question: str
+    document_ids: Optional[list[str]] = None
+    near_duplicates: bool = False
+
+
+class QuestionBatch(BaseModel):
+    questions: list[str]
+    workers: int = 4
+
+
+class HistoryExport(BaseModel):
+    history: list[dict]
+
+
+def _remember(document):
+    default_analytics().record('documents', document.doc_type)
+    with _documents_lock:
+        _documents[document.doc_id] = document
+        _documents.move_to_end(document.doc_id)
+        corpus.add(document)
+        while len(_documents) > MAX_DOCUMENTS:
+            forgotten, _ = _documents.popitem(last=False)
+            corpus.remove(forgotten)
+    return document.describe()
+
+
+def _answered(entry):
+    default_analytics().record('queries', entry['type'], value=entry.get('latency'))
+    return entry
+
+
+def _document(document_id):
+    with _documents_lock:
+        document = _documents.get(document_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Unknown document id; post the document again")
+    return document
+
+
+@app.get("/health")
+def health():
+    return dict(engine.documents.stats(), status="ok", documents=len(_documents))
+
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.prometheus_text(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+# Server-wide throughput (documents, queries and mean query latency per bucket), shared with the UI
+@app.get("/usage")
+def usage(resolution: str = Query("minute", enum=list(RESOLUTIONS)), buckets: int = Query(60, ge=1, le=1440)):
+    analytics = default_analytics()
+    result = {'resolution': resolution}
+    for metric in ('documents', 'queries'):
+        starts, series, means = analytics.timeline(metric, resolution, buckets)
+        result['buckets'] = starts
+        result[metric] = series
+        if metric == 'queries':
+            result['mean_latency'] = means
+    return result
+
+
+@app.post("/documents/text")
+def create_text_document(body: TextDocument):
+    return _remember(engine.ingest_text(body.text))
+
+
+@app.post("/documents/url")
+def create_url_document(body: UrlDocument):
+    if len(body.urls) == 1:
+        return _remember(engine.ingest_url(body.urls[0]))
+    document, failures = engine.ingest_urls(body.urls)
+    if document is None:
+        raise HTTPException(status_code=502, detail=failures)
+    return dict(_remember(document), failures=failures)
+
+
+@app.post("/documents/pdf")
+def create_pdf_document(file: UploadFile = File(...)):
+    with spooled_upload(file.file, suffix=".pdf") as (path, _):
+        return _remember(engine.ingest_pdf(path, source=file.filename))
+
+
+@app.post("/documents/csv")
+def create_csv_document(file: UploadFile = File(...)):
+    return _remember(engine.ingest_csv(file.file, source=file.filename))
+
+
+@app.post("/documents/{document_id}/query")
+def query_document(document_id: str, body: Question):
+    return _answered(engine.ask(_document(document_id), body.question, near_duplicates=body.near_duplicates))
+
+
+# Answers cite the documents they drew on; all remembered documents are searched unless ids are given
+@app.post("/corpus/query")
+def query_corpus(body: CorpusQuestion):
+    with _documents_lock:
+        unknown = [doc_id for doc_id in body.document_ids or [] if doc_id not in _documents]
+        if unknown:
+            raise HTTPException(status_code=404, detail={"unknown_document_ids": unknown})
+        if not len(corpus):
+            raise HTTPException(status_code=404, detail="No documents have been posted yet")
+        selection = corpus.select(body.document_ids)
+    return _answered(engine.ask(selection, body.question, near_duplicates=body.near_duplicates))
+
+
+@app.post("/documents/{document_id}/batch")
+def query_document_batch(document_id: str, body: QuestionBatch):
+    document = _document(document_id)
+    rows = engine.ask_many(document, body.questions, max_workers=body.workers)
+    for row in rows:
+        default_analytics().record('queries', document.doc_type, value=row.get('latency'))
+    return rows
+
+
+@app.post("/export/{export_format}")
+def export(export_format: str, body: HistoryExport):
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of {', '.join(EXPORT_FORMATS)}")
+    return Response(export_history(body.history, export_format), media_type=MEDIA_TYPES[export_format])
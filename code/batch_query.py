@@ -0,0 +1,70 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+DEFAULT_WORKERS = 4
+DEFAULT_RETRIES = 1
+
+
+# Questions from an uploaded CSV: a "question" column if present, otherwise the first column
+def parse_question_csv(csv_file):
+    df = pd.read_csv(csv_file)
+    columns = {str(name).strip().lower(): name for name in df.columns}
+    column = columns.get("question", columns.get("questions", df.columns[0]))
+    return [str(value).strip() for value in df[column].dropna() if str(value).strip()]
+
+
+def _attempt(answer_fn, question, max_retries):
+    start = time.perf_counter()
+    error = None
+    for attempt in range(max_retries + 1):
+        if attempt:
+            time.sleep(0.5 * 2 ** (attempt - 1))
+        try:
+            result = dict(answer_fn(question))
+            result.update(status='ok', error=None, attempts=attempt + 1,
+                          latency=round(time.perf_counter() - start, 3))
+            return result
+        except Exception as e:
+            error = str(e)
+    return {'answer': None, 'status': 'failed', 'error': error, 'attempts': max_retries + 1,
+            'latency': round(time.perf_counter() - start, 3)}
+
+
+def _execute(rows, positions, answer_fn, max_workers, max_retries, on_progress):
+    total = len(positions)
+    if not total:
+        return rows
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        futures = {
+            executor.submit(_attempt, answer_fn, rows[position]['question'], max_retries): position
+            for position in positions
+        }
+        # Progress is reported from the calling thread so UI callbacks are safe
+        for future in as_completed(futures):
+            position = futures[future]
+            rows[position] = dict(rows[position], **future.result())
+            done += 1
+            if on_progress is not None:
+                on_progress(done, total)
+    return rows
+
+
+# Run every question concurrently; the returned rows keep the input order
+def run_batch(questions, answer_fn, max_workers=DEFAULT_WORKERS, max_retries=DEFAULT_RETRIES,
+              on_progress=None):
+    rows = [{'#': number + 1, 'question': question, 'status': 'pending'}
+            for number, question in enumerate(questions)]
+    return _execute(rows, list(range(len(rows))), answer_fn, max_workers, max_retries, on_progress)
+
+
+# Re-run only the given rows (by position) of an earlier batch
+def retry_rows(rows, positions, answer_fn, max_workers=DEFAULT_WORKERS, max_retries=DEFAULT_RETRIES,
+               on_progress=None):
+    return _execute(list(rows), list(positions), answer_fn, max_workers, max_retries, on_progress)
+
+
+def failed_positions(rows):
+    return [position for position, row in enumerate(rows) if row.get('status') == 'failed']
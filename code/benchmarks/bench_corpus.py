@@ -0,0 +1,85 @@
+"""Measure corpus growth and cross-document query latency as the corpus grows.
+
+Adds synthetic documents one at a time (each one is indexed once, on add),
+then times document routing and full corpus searches over all documents at
+several corpus sizes. Everything runs locally, with no model calls.
+
+Usage: python code/benchmarks/bench_corpus.py [--documents 500 2000 5000] [--words 2000] [--queries 50] [--json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ("revenue quarter forecast margin supplier contract warranty clause region growth audit policy "
+         "customer churn latency throughput release incident budget hiring compliance inventory shipment "
+         "invoice discount renewal outage capacity").split()
+
+
+def make_text(rng, words):
+    # A few document-specific terms make routing meaningful
+    topic = [f"topic{rng.randrange(100_000)}" for _ in range(5)]
+    return " ".join(rng.choice(topic) if rng.random() < 0.05 else rng.choice(WORDS) for _ in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--words", type=int, default=2000, help="words per document")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="docugenius-corpus-")
+    from corpus import Corpus
+    from document_store import DocumentStore
+    from engine import Document
+
+    rng = random.Random(0)
+    store = DocumentStore(root=os.path.join(os.environ["HOME"], "documents"))
+    corpus = Corpus()
+    results, add_times = [], []
+    for size in sorted(args.documents):
+        while len(corpus) < size:
+            text = make_text(rng, args.words)
+            start = time.perf_counter()
+            corpus.add(Document(text, 'Text', store=store))
+            add_times.append(time.perf_counter() - start)
+        queries = [" ".join(rng.choice(WORDS) for _ in range(3)) + f" topic{rng.randrange(100_000)}"
+                   for _ in range(args.queries)]
+        selection = corpus.select()
+        route_times, search_times = [], []
+        for query in queries:
+            start = time.perf_counter()
+            corpus.index.route(query)
+            route_times.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            selection.retrieval_index().search(query)
+            search_times.append(time.perf_counter() - start)
+        results.append({
+            'documents': size,
+            'add_ms_mean': round(statistics.mean(add_times) * 1000, 2),
+            'route_ms_p50': round(statistics.median(route_times) * 1000, 2),
+            'search_ms_p50': round(statistics.median(search_times) * 1000, 2),
+            'search_ms_max': round(max(search_times) * 1000, 2),
+            'vocabulary': len(corpus.index.vocab),
+            'resident_indexes': store.stats()['resident_documents'],
+        })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'docs':>6} {'add ms':>8} {'route ms':>9} {'search ms':>10} {'max ms':>8} {'vocab':>8}")
+    for row in results:
+        print(f"{row['documents']:>6} {row['add_ms_mean']:>8} {row['route_ms_p50']:>9} "
+              f"{row['search_ms_p50']:>10} {row['search_ms_max']:>8} {row['vocabulary']:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Compare the legacy find_all() extraction with html_extractor on saved HTML fixtures.
+
+Usage: python code/benchmarks/bench_html_extraction.py [--repeat N] [--json]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from html_extractor import DEFAULT_PARSER, extract_text, legacy_extract_text  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def best_time(function, html, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(html)
+        timings.append(time.perf_counter() - start)
+    return output, min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    extractors = {"legacy": legacy_extract_text, "single_pass[html.parser]": lambda html: extract_text(html, "html.parser")}
+    if DEFAULT_PARSER != "html.parser":
+        extractors[f"single_pass[{DEFAULT_PARSER}]"] = extract_text
+
+    results = []
+    for path in sorted(glob.glob(os.path.join(FIXTURES, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            html = f.read()
+        for name, function in extractors.items():
+            output, seconds = best_time(function, html, args.repeat)
+            results.append({
+                "fixture": os.path.basename(path),
+                "extractor": name,
+                "html_bytes": len(html.encode("utf-8")),
+                "output_chars": len(output),
+                "seconds": round(seconds, 5),
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'fixture':<22}{'extractor':<28}{'html bytes':>12}{'output chars':>14}{'ms':>10}")
+    for row in results:
+        print(f"{row['fixture']:<22}{row['extractor']:<28}{row['html_bytes']:>12}"
+              f"{row['output_chars']:>14}{row['seconds'] * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Load-test ingestion and querying against the local fake model backend.
+
+Builds synthetic PDF, CSV and HTML corpora, times their ingestion, then asks
+batches of questions about each at several concurrency levels through
+Engine.ask_many. No API key or network is needed. The report is JSON with
+stable keys, so reports from two releases can be diffed directly or compared
+with --baseline.
+
+With --quota-rpm/--quota-tpm the fake backend enforces quotas and answers
+429 when they are exceeded; calls go through the shared rate-limited client
+(limits default to the quota) unless --no-client is given, so both modes can
+be compared for quota errors and sustained throughput.
+
+Usage:
+    python code/benchmarks/bench_load.py [--concurrency 1 4 16] [--questions 32]
+        [--pdf-pages 40] [--csv-rows 200000] [--first-token-latency 0.05]
+        [--chunk-delay 0.01] [--error-rate 0.0] [--quota-rpm N] [--quota-tpm N]
+        [--client-rpm N] [--client-tpm N] [--no-client]
+        [--output report.json] [--baseline previous.json]
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPORT_SCHEMA = 1
+WORDS = ("revenue quarter forecast margin supplier contract warranty clause region growth "
+         "audit policy customer churn latency throughput release incident budget hiring "
+         "compliance inventory shipment invoice discount renewal outage capacity").split()
+
+
+def sentences(rng, count):
+    return " ".join(
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 18))).capitalize() + "."
+        for _ in range(count)
+    )
+
+
+def make_pdf(pages, seed):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate
+
+    rng = random.Random(seed)
+    styles = getSampleStyleSheet()
+    elements = []
+    for page in range(pages):
+        elements.append(Paragraph(f"Section {page + 1}", styles['Heading2']))
+        for _ in range(4):
+            elements.append(Paragraph(sentences(rng, 6), styles['Normal']))
+        elements.append(PageBreak())
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter).build(elements)
+    return buffer.getvalue()
+
+
+def make_csv(rows, seed):
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'order_id': np.arange(rows),
+        'region': rng.choice(["north", "south", "east", "west"], rows),
+        'product': rng.choice(WORDS, rows),
+        'units': rng.integers(1, 50, rows),
+        'price': rng.normal(40, 12, rows).round(2),
+        'returned': rng.random(rows) < 0.05,
+    })
+    buffer = io.BytesIO(frame.to_csv(index=False).encode("utf-8"))
+    buffer.name = "synthetic.csv"
+    return buffer
+
+
+def make_html(sections, seed):
+    rng = random.Random(seed)
+    nav = "".join(f"<li><a href='/p{number}'>Link {number}</a></li>" for number in range(40))
+    body = "".join(
+        f"<h2>Topic {number + 1}</h2>" + "".join(f"<p>{sentences(rng, 5)}</p>" for _ in range(3))
+        for number in range(sections)
+    )
+    return (f"<html><head><script>var tracking = 1;</script><style>p {{ margin: 0 }}</style></head>"
+            f"<body><nav><ul>{nav}</ul></nav><article><h1>Synthetic report</h1>{body}</article>"
+            f"<footer>{'Copyright notice. ' * 20}</footer></body></html>")
+
+
+def percentile(ordered, quantile):
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_queries(engine, backend, client, document, corpus, concurrency, questions):
+    rng = random.Random(f"{corpus}-{concurrency}")
+    batch = [f"[{corpus}/{concurrency}/{number}] What does the document say about "
+             f"{rng.choice(WORDS)} and {rng.choice(WORDS)}?" for number in range(questions)]
+    before, client_before = backend.stats(), client.stats() if client else {}
+    rows, elapsed = timed(engine.ask_many, document, batch, max_workers=concurrency, max_retries=1)
+    after, client_after = backend.stats(), client.stats() if client else {}
+    latencies = sorted(row['latency'] for row in rows if row['status'] == 'ok')
+    return {
+        'corpus': corpus,
+        'concurrency': concurrency,
+        'questions': questions,
+        'failed': sum(row['status'] != 'ok' for row in rows),
+        'wall_seconds': round(elapsed, 4),
+        'throughput_qps': round(questions / elapsed, 3),
+        'latency_p50_ms': round(percentile(latencies, 0.5) * 1000, 2) if latencies else None,
+        'latency_p95_ms': round(percentile(latencies, 0.95) * 1000, 2) if latencies else None,
+        'latency_p99_ms': round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        'latency_mean_ms': round(statistics.mean(latencies) * 1000, 2) if latencies else None,
+        'model_calls': after['calls'] - before['calls'],
+        'model_errors': after['errors'] - before['errors'],
+        'quota_errors': after['quota_errors'] - before['quota_errors'],
+        'tokens': after['total_tokens'] - before['total_tokens'],
+        'client_retries': client_after.get('retries', 0) - client_before.get('retries', 0),
+        'client_coalesced': client_after.get('coalesced', 0) - client_before.get('coalesced', 0),
+        'client_throttled_seconds': round(client_after.get('throttled_seconds', 0)
+                                          - client_before.get('throttled_seconds', 0), 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "-C", CODE_DIR, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Percentage change of the headline numbers against an earlier report
+def compare(report, baseline):
+    old = {(row['corpus'], row['concurrency']): row for row in baseline['queries']}
+    lines = [f"{'corpus':<6} {'conc':>4} {'qps':>10} {'Δqps':>8} {'p95 ms':>10} {'Δp95':>8}"]
+    for row in report['queries']:
+        previous = old.get((row['corpus'], row['concurrency']))
+        def delta(key):
+            if not previous or not previous.get(key) or row.get(key) is None:
+                return "n/a"
+            return f"{(row[key] - previous[key]) / previous[key] * 100:+.1f}%"
+        lines.append(f"{row['corpus']:<6} {row['concurrency']:>4} {row['throughput_qps']:>10} "
+                     f"{delta('throughput_qps'):>8} {row['latency_p95_ms'] or '':>10} {delta('latency_p95_ms'):>8}")
+    for corpus, stats in report['ingestion'].items():
+        previous = baseline['ingestion'].get(corpus)
+        if previous:
+            change = (stats['seconds'] - previous['seconds']) / previous['seconds'] * 100
+            lines.append(f"ingest {corpus}: {stats['seconds']}s ({change:+.1f}%)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--questions", type=int, default=32, help="questions per corpus and concurrency level")
+    parser.add_argument("--pdf-pages", type=int, default=40)
+    parser.add_argument("--csv-rows", type=int, default=200_000)
+    parser.add_argument("--html-sections", type=int, default=60)
+    parser.add_argument("--first-token-latency", type=float, default=0.05)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-rpm", type=int, help="fake backend requests-per-minute quota")
+    parser.add_argument("--quota-tpm", type=int, help="fake backend tokens-per-minute quota")
+    parser.add_argument("--client-rpm", type=int, help="client request limit (defaults to --quota-rpm)")
+    parser.add_argument("--client-tpm", type=int, help="client token limit (defaults to --quota-tpm)")
+    parser.add_argument("--no-client", action="store_true", help="call the backend directly, without the client layer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    # Cold, throwaway caches so runs are comparable
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="docugenius-load-")
+    sys.path.insert(0, CODE_DIR)
+    from engine import Engine
+    from model_backends import FakeBackend
+    from model_client import ModelClient
+
+    backend_options = dict(first_token_latency=args.first_token_latency, chunk_delay=args.chunk_delay,
+                           error_rate=args.error_rate, seed=args.seed, quota_rpm=args.quota_rpm,
+                           quota_tpm=args.quota_tpm)
+    backend = FakeBackend(**backend_options)
+    client_options = None
+    client = None
+    if not args.no_client:
+        client_options = dict(requests_per_minute=args.client_rpm or args.quota_rpm,
+                              tokens_per_minute=args.client_tpm or args.quota_tpm)
+        client = ModelClient(backend, **client_options)
+    engine = Engine(model_factory=client or backend)
+
+    pdf_bytes = make_pdf(args.pdf_pages, args.seed)
+    csv_file = make_csv(args.csv_rows, args.seed)
+    html = make_html(args.html_sections, args.seed)
+
+    documents, ingestion = {}, {}
+    for corpus, ingest in (("pdf", lambda: engine.ingest_pdf(pdf_bytes)),
+                           ("csv", lambda: engine.ingest_csv(csv_file)),
+                           ("html", lambda: engine.ingest_html(html))):
+        document, elapsed = timed(ingest)
+        documents[corpus] = document
+        ingestion[corpus] = {'seconds': round(elapsed, 4), 'characters': len(document.text),
+                             'chunks': len(document.index)}
+    ingestion['pdf']['pages'] = args.pdf_pages
+    ingestion['pdf']['input_bytes'] = len(pdf_bytes)
+    ingestion['csv']['rows'] = args.csv_rows
+    ingestion['csv']['input_bytes'] = len(csv_file.getvalue())
+    ingestion['html']['input_bytes'] = len(html.encode("utf-8"))
+
+    queries = [run_queries(engine, backend, client, documents[corpus], corpus, concurrency, args.questions)
+               for corpus in documents for concurrency in args.concurrency]
+
+    report = {
+        'schema': REPORT_SCHEMA,
+        'meta': {
+            'revision': git_revision(),
+            'created': time.strftime("%Y-%m-%dT%H:%M:%S"),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'backend': dict(backend_options, name="fake"),
+            'client': client_options,
+        },
+        'ingestion': ingestion,
+        'queries': queries,
+    }
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(report, json.load(f)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Measure Streamlit rerun latency of the app with a document loaded.
+
+Drives the script headlessly through streamlit.testing.AppTest with a fake
+model, processes a text document, runs a few queries so the sidebar chart and
+history are populated, then times plain reruns (what every widget interaction
+costs).
+
+Usage:
+    python code/benchmarks/bench_rerun.py [--reruns 30] [--script path/to/main.py] [--json]
+
+Point --script at an older checkout's main.py to get before/after numbers.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import warnings
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default=os.path.join(CODE_DIR, "main.py"))
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    # Keep the app's on-disk caches out of the user's home directory
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="docugenius-bench-")
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    script_dir = os.path.dirname(os.path.abspath(args.script))
+    sys.path.insert(0, script_dir)
+    sys.path.insert(1, CODE_DIR)
+
+    import google.generativeai as genai
+    from streaming import FakeChunkModel
+    genai.GenerativeModel = lambda *a, **k: FakeChunkModel(["Benchmark ", "answer."])
+    from streamlit.testing.v1 import AppTest
+
+    start = time.perf_counter()
+    app = AppTest.from_file(os.path.abspath(args.script), default_timeout=120)
+    app.run()
+    first_run = time.perf_counter() - start
+
+    app.text_area[0].input("Benchmark document. " * 2000)
+    next(button for button in app.button if button.label == "Process Text").click().run()
+    for number in range(3):
+        query = next(box for box in app.text_input if box.label.startswith("What would you like"))
+        query.input(f"Question {number}?")
+        next(button for button in app.button if button.key == "analyze_btn").click().run()
+
+    timings = []
+    for _ in range(args.reruns):
+        start = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - start)
+    if app.exception:
+        raise SystemExit(f"App raised: {app.exception}")
+
+    timings.sort()
+    result = {
+        "script": os.path.abspath(args.script),
+        "first_run_ms": round(first_run * 1000, 1),
+        "reruns": args.reruns,
+        "rerun_p50_ms": round(statistics.median(timings) * 1000, 1),
+        "rerun_p95_ms": round(timings[int(0.95 * (len(timings) - 1))] * 1000, 1),
+        "rerun_mean_ms": round(statistics.mean(timings) * 1000, 1),
+    }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:>15}: {value}")
+
+
+if __name__ == "__main__":
+    main()
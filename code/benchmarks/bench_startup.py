@@ -0,0 +1,114 @@
+"""Measure time to first render of the Streamlit app and fail when it exceeds a budget.
+
+Each sample is a fresh interpreter that runs the script once through
+streamlit.testing.AppTest with the offline model backend:
+
+  cold  imports happen during the first script run, as on a freshly started
+        replica whose first visitor arrives straight away.
+  warm  startup.warm_start() runs first, as `python code/startup.py serve`
+        does before the server accepts connections; only the first script
+        run is what a visitor waits for.
+
+Time to first render is measured from interpreter start (cold) or from the
+end of the warm start (warm) to the end of the first script run. Exits with
+status 1 if the median of either mode is over its budget.
+
+Usage:
+    python code/benchmarks/bench_startup.py [--samples 3] [--budget 3.0] [--warm-budget 1.0] [--json]
+"""
+import time
+
+PROCESS_STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import warnings
+
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("cold", "warm")
+
+
+# Runs in the child interpreter: one first render, reported as a JSON line on stdout
+def sample(mode, script):
+    warnings.filterwarnings("ignore")
+    # Keep the app's on-disk caches out of the user's home directory
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="docugenius-startup-")
+    os.environ["DOCUGENIUS_MODEL_BACKEND"] = "fake"
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    sys.path.insert(1, CODE_DIR)
+    warm_seconds = 0.0
+    if mode == "warm":
+        from startup import warm_start
+        start = time.perf_counter()
+        warm_start()
+        warm_seconds = time.perf_counter() - start
+    ready = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    app = AppTest.from_file(os.path.abspath(script), default_timeout=120)
+    start = time.perf_counter()
+    app.run()
+    finished = time.perf_counter()
+    if app.exception:
+        raise SystemExit(f"App raised: {app.exception}")
+    print(json.dumps({
+        'mode': mode,
+        'warm_start': warm_seconds,
+        'script_run': finished - start,
+        'first_render': finished - (PROCESS_STARTED if mode == "cold" else ready),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default=os.path.join(CODE_DIR, "main.py"))
+    parser.add_argument("--samples", type=int, default=3)
+    parser.add_argument("--budget", type=float, default=3.0, help="cold time to first render budget, seconds")
+    parser.add_argument("--warm-budget", type=float, default=1.0, help="warm time to first render budget, seconds")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    parser.add_argument("--sample", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.sample:
+        sample(args.sample, args.script)
+        return
+
+    samples = {mode: [] for mode in MODES}
+    for _ in range(args.samples):
+        for mode in MODES:
+            completed = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--sample", mode, "--script", args.script],
+                capture_output=True, text=True,
+            )
+            if completed.returncode:
+                raise SystemExit(f"{mode} sample failed:\n{completed.stderr.strip()}")
+            samples[mode].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    budgets = {'cold': args.budget, 'warm': args.warm_budget}
+    result = {'script': os.path.abspath(args.script), 'samples': args.samples}
+    for mode in MODES:
+        first_render = statistics.median(row['first_render'] for row in samples[mode])
+        result[mode] = {
+            'first_render_p50_s': round(first_render, 3),
+            'script_run_p50_s': round(statistics.median(row['script_run'] for row in samples[mode]), 3),
+            'warm_start_p50_s': round(statistics.median(row['warm_start'] for row in samples[mode]), 3),
+            'budget_s': budgets[mode],
+            'within_budget': first_render <= budgets[mode],
+        }
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for mode in MODES:
+            row = result[mode]
+            status = "ok" if row['within_budget'] else "OVER BUDGET"
+            print(f"{mode:>5}: first render {row['first_render_p50_s']:.2f}s (budget {row['budget_s']:.2f}s, {status}); "
+                  f"script run {row['script_run_p50_s']:.2f}s, warm start {row['warm_start_p50_s']:.2f}s")
+    if not all(result[mode]['within_budget'] for mode in MODES):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
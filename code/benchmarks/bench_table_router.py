@@ -0,0 +1,109 @@
+"""Measure how fast tabular questions are answered locally by the query router.
+
+Ingests a synthetic CSV, then times routing plus pandas execution for typical
+questions (aggregates, filtered counts, top-N, group-bys) and checks each
+answer against a direct pandas computation on the full frame. Questions the
+router leaves to the model are listed separately. No model calls are made.
+
+Usage: python code/benchmarks/bench_table_router.py [--rows 1000000] [--repeat 5] [--json]
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# (question, reference computed on the full frame, or None if the question should go to the model)
+QUESTIONS = (
+    ("What is the average price?", lambda df: df.price.mean()),
+    ("average price where qty > 10", lambda df: df.price[df.qty > 10].mean()),
+    ("How many rows where price > 100 and region is north?",
+     lambda df: int(((df.price > 100) & (df.region == "north")).sum())),
+    ("median price", lambda df: df.price.median()),
+    ("total qty per region", lambda df: df.groupby("region").qty.sum().max()),
+    ("top 5 by price", lambda df: df.price.nlargest(5).iloc[0]),
+    ("how many distinct product", lambda df: df["product"].nunique()),
+    ("Why are prices higher in the north?", None),
+)
+
+
+def make_frame(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "order_id": np.arange(rows),
+        "region": rng.choice(["north", "south", "east", "west"], rows),
+        "product": rng.choice([f"p{i}" for i in range(200)], rows),
+        "price": rng.gamma(2.0, 30.0, rows).round(2),
+        "qty": rng.integers(1, 20, rows),
+    })
+
+
+def headline(result):
+    value = result.value
+    if isinstance(value, pd.DataFrame):
+        return float(value.iloc[0, -1]) if "price" not in value.columns else float(value["price"].iloc[0])
+    return float(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    os.environ["HOME"] = tempfile.mkdtemp(prefix="docugenius-table-")
+    from csv_ingestion import ingest_csv
+    from table_query import plan_table_question, run_table_plan
+
+    frame = make_frame(args.rows)
+    source = io.BytesIO(frame.to_csv(index=False).encode("utf-8"))
+    start = time.perf_counter()
+    dataset = ingest_csv(source)
+    ingest_seconds = time.perf_counter() - start
+
+    results = []
+    for question, reference in QUESTIONS:
+        plan = plan_table_question(dataset, question)
+        if plan is None:
+            results.append({'question': question, 'route': 'llm',
+                            'expected_route': 'llm' if reference is None else 'pandas'})
+            continue
+        times = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run_table_plan(dataset, plan_table_question(dataset, question))
+            times.append(time.perf_counter() - start)
+        expected = float(reference(frame))
+        results.append({
+            'question': question,
+            'route': 'pandas',
+            'expected_route': 'pandas' if reference is not None else 'llm',
+            'operation': result.operation,
+            'ms_p50': round(statistics.median(times) * 1000, 2),
+            'correct': bool(np.isclose(headline(result), expected, rtol=1e-6)),
+        })
+
+    if args.json:
+        print(json.dumps({'rows': args.rows, 'ingest_seconds': round(ingest_seconds, 2), 'questions': results},
+                         indent=2))
+        return
+    print(f"{args.rows:,} rows ingested in {ingest_seconds:.1f}s")
+    for row in results:
+        if row['route'] == 'llm':
+            print(f"  {'model':>8}  {'':>9}  {row['question']}")
+        else:
+            status = "ok" if row['correct'] else "MISMATCH"
+            print(f"  {row['ms_p50']:>6} ms  {status:>9}  {row['question']}  ->  {row['operation']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Command-line entry point for the DocuGenius engine.
+
+Examples:
+    python code/cli.py extract --pdf manual.pdf
+    python code/cli.py ask --url https://example.com "What is this page about?"
+    python code/cli.py ask --csv sales.csv --questions-file checklist.txt --workers 8
+    python code/cli.py export history.json --format pdf --output report.pdf
+"""
+import argparse
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from engine import Engine
+from export_pipeline import EXPORT_FORMATS, export_history
+from model_backends import BACKEND_ENV_VAR, BACKENDS, DEFAULT_BACKEND
+from model_client import get_client
+
+
+def _load_document(engine, args):
+    if args.text is not None:
+        return engine.ingest_text(args.text)
+    if args.pdf:
+        return engine.ingest_pdf(args.pdf, max_workers=args.pdf_workers, source=args.pdf)
+    if args.csv:
+        with open(args.csv, "rb") as f:
+            return engine.ingest_csv(f, source=args.csv)
+    if len(args.url) == 1:
+        return engine.ingest_url(args.url[0])
+    document, failures = engine.ingest_urls(args.url)
+    for url, error in failures.items():
+        print(f"warning: skipped {url}: {error}", file=sys.stderr)
+    if document is None:
+        raise SystemExit("error: none of the URLs could be fetched")
+    return document
+
+
+def _add_source_arguments(parser):
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--text", help="raw text to analyse")
+    source.add_argument("--pdf", help="path to a PDF file")
+    source.add_argument("--csv", help="path to a CSV file")
+    source.add_argument("--url", action="append", help="web page URL (repeat for several pages)")
+    parser.add_argument("--pdf-workers", type=int, default=None)
+
+
+def cmd_extract(engine, args):
+    document = _load_document(engine, args)
+    print(json.dumps(document.describe(), indent=2), file=sys.stderr)
+    print(document.text)
+
+
+def cmd_ask(engine, args):
+    document = _load_document(engine, args)
+    questions = list(args.question)
+    if args.questions_file:
+        with open(args.questions_file) as f:
+            questions += [line.strip() for line in f if line.strip()]
+    if not questions:
+        raise SystemExit("error: give at least one question or --questions-file")
+    if len(questions) == 1:
+        results = [engine.ask(document, questions[0])]
+    else:
+        results = engine.ask_many(document, questions, max_workers=args.workers)
+    print(json.dumps(results, indent=2))
+
+
+def cmd_export(engine, args):
+    with open(args.history) as f:
+        if args.history.endswith(".jsonl"):
+            history = [json.loads(line) for line in f if line.strip()]
+        else:
+            history = json.load(f)
+    with open(args.output, "wb") as f:
+        f.write(export_history(history, args.format))
+    print(f"Wrote {len(history)} entries to {args.output}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="docugenius", description="DocuGenius Pro headless CLI")
+    parser.add_argument("--api-key", default=None, help="Gemini API key (defaults to $GEMINI_API_KEY)")
+    parser.add_argument("--backend", choices=sorted(BACKENDS),
+                        default=os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND),
+                        help="model backend; 'fake' answers locally without a key or network")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    extract = commands.add_parser("extract", help="ingest a document and print its extracted text")
+    _add_source_arguments(extract)
+    extract.set_defaults(handler=cmd_extract)
+
+    ask = commands.add_parser("ask", help="ask one or more questions about a document")
+    _add_source_arguments(ask)
+    ask.add_argument("question", nargs="*")
+    ask.add_argument("--questions-file", help="file with one question per line")
+    ask.add_argument("--workers", type=int, default=4)
+    ask.set_defaults(handler=cmd_ask)
+
+    export = commands.add_parser("export", help="convert a JSON history file to another format")
+    export.add_argument("history", help="JSON or JSONL history file as written by the app")
+    export.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    export.add_argument("--output", required=True)
+    export.set_defaults(handler=cmd_export)
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    model_factory = None
+    if args.command == "ask":
+        model_factory = get_client(args.backend, args.api_key or os.environ.get("GEMINI_API_KEY"))
+    engine = Engine(model_factory=model_factory or (lambda name: None))
+    args.handler(engine, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from streaming import generate, stream_generate
+
+CHARS_PER_TOKEN = 4
+DEFAULT_TOKEN_BUDGET = 32_000
+# Room left for the instructions, the question and the model's answer
+RESPONSE_RESERVE_TOKENS = 2_000
+DEFAULT_MAP_WORKERS = 4
+SUMMARY_TEMPLATE_VERSION = "1"
+
+
+def estimate_tokens(text):
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+# Cheap estimate first; ask the model for an exact count only when it is a close call
+def count_tokens(model, text):
+    estimate = estimate_tokens(text)
+    counter = getattr(model, "count_tokens", None)
+    if counter is None:
+        return estimate
+    try:
+        return counter(text).total_tokens
+    except Exception:
+        return estimate
+
+
+def fits_budget(model, text, budget):
+    estimate = estimate_tokens(text)
+    if estimate < budget * 0.85:
+        return True, estimate
+    if estimate > budget * 1.15:
+        return False, estimate
+    tokens = count_tokens(model, text)
+    return tokens <= budget, tokens
+
+
+def build_summary_prompt(text):
+    return f"""
+            Summarize the following part of a document. Keep every fact, figure, name, date and
+            conclusion that a reader might ask about; drop only repetition and filler.
+            Content: {text}
+            """
+
+
+def build_reduce_prompt(summaries, query):
+    joined = "\n\n".join(f"[Part {number + 1}]\n{summary}" for number, summary in enumerate(summaries))
+    return f"""
+            The following are summaries of consecutive parts of one document.
+            Using only these summaries, provide a detailed and accurate answer to the question.
+            Summaries: {joined}
+            Question: {query}
+            Please provide a clear and concise answer based only on the provided content.
+            """
+
+
+def _summary_key(doc_hash, level, start, end, model_name):
+    payload = json.dumps(["summary", doc_hash, level, start, end, model_name, SUMMARY_TEMPLATE_VERSION])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Pack (start, end, text) pieces into consecutive groups that each fit the budget
+def _group(pieces, budget):
+    groups, current, used = [], [], 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece[2])
+        if current and used + tokens > budget:
+            groups.append(current)
+            current, used = [], 0
+        current.append(piece)
+        used += tokens
+    if current:
+        groups.append(current)
+    return groups
+
+
+# Answer over content too large for one prompt: summarize groups in parallel, then reduce
+def map_reduce_answer(model, chunks, query, doc_hash, token_budget=DEFAULT_TOKEN_BUDGET,
+                      summary_cache=None, model_name="", max_workers=DEFAULT_MAP_WORKERS,
+                      stream=False, on_chunk=None):
+    stats = {'strategy': 'map_reduce', 'llm_calls': 0, 'tokens_spent': 0, 'reduce_levels': 0,
+             'cached_summaries': 0}
+    group_budget = max(token_budget - RESPONSE_RESERVE_TOKENS, 1_000)
+    pieces = [(chunk.start, chunk.end, chunk.text) for chunk in chunks]
+    span = (pieces[0][0], pieces[-1][1]) if pieces else (0, 0)
+    level = 0
+    while True:
+        reduce_prompt = build_reduce_prompt([piece[2] for piece in pieces], query)
+        if len(pieces) == 1 or estimate_tokens(reduce_prompt) <= token_budget - RESPONSE_RESERVE_TOKENS:
+            break
+        groups = _group(pieces, group_budget)
+        if level and len(groups) >= len(pieces):
+            # Summaries are not shrinking any further; answer from the leading part that fits and report it
+            pieces = groups[0]
+            stats['truncated'] = True
+            continue
+        pieces = _summarize_level(model, groups, doc_hash, level, summary_cache, model_name,
+                                  max_workers, stats)
+        level += 1
+    stats['reduce_levels'] = level
+    if stats.get('truncated'):
+        stats['covered_share'] = round((pieces[-1][1] - span[0]) / max(span[1] - span[0], 1), 3)
+    if stream:
+        result = stream_generate(model, reduce_prompt, on_chunk=on_chunk)
+    else:
+        result = generate(model, reduce_prompt)
+    stats['llm_calls'] += 1
+    stats['prompt_tokens'] = estimate_tokens(reduce_prompt)
+    stats['tokens_spent'] += stats['prompt_tokens'] + estimate_tokens(result.text)
+    return result, stats
+
+
+def _summarize_level(model, groups, doc_hash, level, summary_cache, model_name, max_workers, stats):
+    def summarize(group):
+        start, end = group[0][0], group[-1][1]
+        key = _summary_key(doc_hash, level, start, end, model_name)
+        if summary_cache is not None:
+            cached = summary_cache.get(key)
+            if cached is not None:
+                return (start, end, cached), 0, True
+        prompt = build_summary_prompt("\n\n".join(piece[2] for piece in group))
+        summary = generate(model, prompt).text
+        if summary_cache is not None:
+            summary_cache.put(key, summary)
+        return (start, end, summary), estimate_tokens(prompt) + estimate_tokens(summary), False
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as executor:
+        results = list(executor.map(summarize, groups))
+    for _, tokens, cached in results:
+        if cached:
+            stats['cached_summaries'] += 1
+        else:
+            stats['llm_calls'] += 1
+            stats['tokens_spent'] += tokens
+    return [piece for piece, _, _ in results]
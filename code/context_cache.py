@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+from context_budget import estimate_tokens
+
+DEFAULT_CONTEXT_TTL = int(os.environ.get("DOCUGENIUS_CONTEXT_TTL", "3600"))
+# Stop using a cache this long before the provider expires it
+EXPIRY_MARGIN = 30
+# A hit in the last quarter of the TTL pushes the expiry out again
+EXTEND_FRACTION = 0.25
+# After a failed registration, wait this long before trying the same model again
+RETRY_UNSUPPORTED_AFTER = 600
+
+
+def build_context_text(text):
+    return f"Document content:\n{text}"
+
+
+class ContextHandle:
+    def __init__(self, name, doc_hash, model_name, tokens, expires_at):
+        self.name = name
+        self.doc_hash = doc_hash
+        self.model_name = model_name
+        self.tokens = tokens
+        self.expires_at = expires_at
+        self.owners = set()
+        self.uses = 0
+
+
+# Documents registered once per (document hash, model) with the backend's cached-content store
+class ContextCache:
+    def __init__(self, backend, ttl_seconds=DEFAULT_CONTEXT_TTL, clock=time.time):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._handles = {}
+        self._unsupported = {}
+        self._lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.tokens_saved = 0
+
+    @property
+    def supported(self):
+        return hasattr(self.backend, "create_context")
+
+    def stats(self):
+        with self._lock:
+            return {'contexts': len(self._handles), 'created': self.created, 'hits': self.hits,
+                    'tokens_saved': self.tokens_saved}
+
+    # Returns (handle, created) or None when the document is too small or caching is unavailable
+    def acquire(self, model_name, doc_hash, text, owner=None):
+        if not self.supported:
+            return None
+        key = (doc_hash, model_name)
+        handle = self._live_handle(key, owner)
+        if handle is not None:
+            return handle, False
+        tokens = estimate_tokens(text)
+        if tokens < getattr(self.backend, "min_context_tokens", 0):
+            return None
+        if self.clock() < self._unsupported.get(model_name, 0):
+            return None
+        with self._create_lock:
+            # Another thread may have registered it while we waited
+            handle = self._live_handle(key, owner)
+            if handle is not None:
+                return handle, False
+            self._purge_expired()
+            try:
+                name = self.backend.create_context(model_name, build_context_text(text), self.ttl_seconds)
+            except Exception:
+                self._unsupported[model_name] = self.clock() + RETRY_UNSUPPORTED_AFTER
+                return None
+            handle = ContextHandle(name, doc_hash, model_name, tokens, self.clock() + self.ttl_seconds)
+            handle.owners.add(owner)
+            handle.uses = 1
+            with self._lock:
+                self._handles[key] = handle
+                self.created += 1
+        return handle, True
+
+    def _live_handle(self, key, owner):
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is None or handle.expires_at - self.clock() <= EXPIRY_MARGIN:
+                return None
+            handle.owners.add(owner)
+            handle.uses += 1
+            self.hits += 1
+            self.tokens_saved += handle.tokens
+            extend = handle.expires_at - self.clock() < self.ttl_seconds * EXTEND_FRACTION
+        if extend:
+            try:
+                self.backend.extend_context(handle.name, self.ttl_seconds)
+                handle.expires_at = self.clock() + self.ttl_seconds
+            except Exception:
+                pass
+        return handle
+
+    def _purge_expired(self):
+        now = self.clock()
+        with self._lock:
+            expired = [key for key, handle in self._handles.items() if handle.expires_at <= now]
+            for key in expired:
+                del self._handles[key]
+
+    def names(self):
+        with self._lock:
+            return {handle.name for handle in self._handles.values()}
+
+    # Drop `owner`'s claim on a document; the cache is deleted once nobody uses it
+    def release(self, doc_hash, owner=None):
+        released = []
+        with self._lock:
+            for key, handle in list(self._handles.items()):
+                if handle.doc_hash != doc_hash:
+                    continue
+                handle.owners.discard(owner)
+                if not handle.owners:
+                    released.append(self._handles.pop(key))
+        for handle in released:
+            try:
+                self.backend.delete_context(handle.name)
+            except Exception:
+                pass
+        return len(released)
+
+    def clear(self):
+        with self._lock:
+            handles = list(self._handles.values())
+            self._handles.clear()
+        for handle in handles:
+            try:
+                self.backend.delete_context(handle.name)
+            except Exception:
+                pass
@@ -0,0 +1,282 @@
+import threading
+import time
+from array import array
+from collections import Counter, OrderedDict, namedtuple
+
+import numpy as np
+
+from retrieval import DEFAULT_TOP_K, content_hash, tokenize
+
+# Documents whose chunks are searched for each query; the rest are ruled out by the document-level index
+ROUTE_DOCUMENTS = 8
+
+# A chunk of one corpus document; start/end are offsets in the selection's combined text
+CitedChunk = namedtuple("CitedChunk", ["index", "start", "end", "text", "document_id", "label", "offset"])
+
+
+def source_name(document):
+    source = document.source
+    if isinstance(source, (list, tuple)):
+        return f"{source[0]} (+{len(source) - 1} more)" if len(source) > 1 else source[0]
+    return source or document.doc_type
+
+
+# Document-level BM25 over term counts, grown one document at a time without touching the others
+class CorpusIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self._postings = []
+        self._freqs = []
+        self._lengths = array('f')
+        self._live = array('b')
+        self._slots = {}
+        self._doc_ids = []
+        self._live_count = 0
+        self._total_length = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._live_count
+
+    def add(self, doc_id, text):
+        counts = Counter(tokenize(str(text)))
+        with self._lock:
+            if doc_id in self._slots:
+                return
+            slot = len(self._doc_ids)
+            self._slots[doc_id] = slot
+            self._doc_ids.append(doc_id)
+            for term, count in counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self._postings)
+                    self._postings.append(array('i'))
+                    self._freqs.append(array('f'))
+                self._postings[term_id].append(slot)
+                self._freqs[term_id].append(count)
+            length = float(sum(counts.values()))
+            self._lengths.append(length)
+            self._live.append(1)
+            self._live_count += 1
+            self._total_length += length
+
+    # Removed documents stay in the postings but no longer count or score
+    def remove(self, doc_id):
+        with self._lock:
+            slot = self._slots.pop(doc_id, None)
+            if slot is None or not self._live[slot]:
+                return
+            self._live[slot] = 0
+            self._live_count -= 1
+            self._total_length -= self._lengths[slot]
+
+    # Best matching documents among `doc_ids` (all live documents if None) as [(doc_id, score)]
+    def route(self, query, doc_ids=None, limit=ROUTE_DOCUMENTS):
+        with self._lock:
+            scores = self._score(tokenize(query), doc_ids)
+        if scores is None:
+            return []
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > limit:
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self._doc_ids[slot], float(scores[slot])) for slot in candidates]
+
+    # Runs under the lock: the array views must not outlive it, or a concurrent append would fail
+    def _score(self, query_tokens, doc_ids):
+        if not self._live_count:
+            return None
+        live = np.frombuffer(self._live, dtype=np.int8).astype(bool)
+        if doc_ids is not None:
+            allowed = np.zeros(len(live), dtype=bool)
+            allowed[[self._slots[doc_id] for doc_id in doc_ids if doc_id in self._slots]] = True
+            live &= allowed
+        lengths = np.frombuffer(self._lengths, dtype=np.float32)
+        norm = self.k1 * (1.0 - self.b + self.b * lengths / max(self._total_length / self._live_count, 1.0))
+        scores = np.zeros(len(live), dtype=np.float32)
+        for term in set(query_tokens):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            slots = np.frombuffer(self._postings[term_id], dtype=np.intc)
+            freqs = np.frombuffer(self._freqs[term_id], dtype=np.float32)
+            document_frequency = int(np.frombuffer(self._live, dtype=np.int8)[slots].sum())
+            idf = np.log(1.0 + (self._live_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            scores[slots] += idf * freqs * (self.k1 + 1.0) / (freqs + norm[slots])
+        scores[~live] = 0.0
+        return scores
+
+
+# Documents a session (or the API) has ingested, deduplicated by content hash
+class Corpus:
+    def __init__(self):
+        self._documents = OrderedDict()
+        self._labels = {}
+        self._added = {}
+        self._next_label = 1
+        self.index = CorpusIndex()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._documents
+
+    def __iter__(self):
+        return iter(list(self._documents.values()))
+
+    def get(self, doc_id):
+        return self._documents[doc_id]
+
+    def label(self, doc_id):
+        return self._labels[doc_id]
+
+    # Returns False if the same content is already in the corpus; nothing else is reprocessed
+    def add(self, document):
+        with self._lock:
+            if document.doc_id in self._documents:
+                return False
+            self._documents[document.doc_id] = document
+            self._labels[document.doc_id] = f"D{self._next_label}"
+            self._added[document.doc_id] = time.strftime("%Y-%m-%d %H:%M:%S")
+            self._next_label += 1
+        self.index.add(document.doc_id, document.text)
+        return True
+
+    def remove(self, doc_id):
+        with self._lock:
+            document = self._documents.pop(doc_id, None)
+            self._labels.pop(doc_id, None)
+            self._added.pop(doc_id, None)
+        self.index.remove(doc_id)
+        return document
+
+    def describe(self):
+        return [
+            dict(document.describe(), label=self._labels[doc_id], name=source_name(document),
+                 added=self._added[doc_id])
+            for doc_id, document in list(self._documents.items())
+        ]
+
+    def select(self, doc_ids=None):
+        wanted = set(self._documents if doc_ids is None else doc_ids)
+        return CorpusSelection(self, [doc_id for doc_id in self._documents if doc_id in wanted])
+
+
+# A subset of the corpus that can be queried like a single document
+class CorpusSelection:
+    doc_type = 'Corpus'
+
+    def __init__(self, corpus, doc_ids):
+        if not doc_ids:
+            raise ValueError("Select at least one document")
+        self.corpus = corpus
+        self.doc_ids = list(doc_ids)
+        self.doc_id = content_hash("corpus:" + "\n".join(sorted(self.doc_ids)))
+        self.source = [source_name(document) for document in self.documents]
+        self.details = {'documents': len(self.doc_ids)}
+
+    @property
+    def documents(self):
+        return [self.corpus.get(doc_id) for doc_id in self.doc_ids]
+
+    def header(self, doc_id):
+        return f"=== [{self.corpus.label(doc_id)}] {source_name(self.corpus.get(doc_id))} ===\n"
+
+    # Offset of each document's text within the combined selection text
+    def offsets(self):
+        offsets, position = {}, 0
+        for document in self.documents:
+            position += len(self.header(document.doc_id))
+            offsets[document.doc_id] = position
+            position += len(document.text) + 2
+        return offsets
+
+    def retrieval_index(self, owner=None):
+        return CorpusRetriever(self, owner)
+
+    def describe(self):
+        return {
+            'document_id': self.doc_id,
+            'type': self.doc_type,
+            'source': self.source,
+            'documents': [self.corpus.label(doc_id) for doc_id in self.doc_ids],
+            'details': self.details,
+        }
+
+
+# DocumentIndex-compatible view over a selection: the corpus index picks candidate documents,
+# then only their chunk indexes are searched
+class CorpusRetriever:
+    def __init__(self, selection, owner=None):
+        self.selection = selection
+        self.owner = owner
+        self.doc_hash = selection.doc_id
+
+    def _index(self, doc_id):
+        return self.selection.corpus.get(doc_id).retrieval_index(self.owner)
+
+    def _cite(self, chunk, doc_id, offset, prefix=""):
+        return CitedChunk(chunk.index, offset + chunk.start, offset + chunk.end, prefix + chunk.text, doc_id,
+                          self.selection.corpus.label(doc_id), offset)
+
+    def __len__(self):
+        return sum(len(self._index(doc_id)) for doc_id in self.selection.doc_ids)
+
+    @property
+    def text(self):
+        return "\n\n".join(self.selection.header(document.doc_id) + str(document.text)
+                           for document in self.selection.documents)
+
+    # Every chunk, labelled with its document so map-reduce summaries can still cite it
+    @property
+    def chunks(self):
+        offsets = self.selection.offsets()
+        return [self._cite(chunk, doc_id, offsets[doc_id], prefix=f"[{self.selection.corpus.label(doc_id)}] ")
+                for doc_id in self.selection.doc_ids for chunk in self._index(doc_id).chunks]
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        doc_ids = self.selection.doc_ids
+        if len(doc_ids) <= ROUTE_DOCUMENTS:
+            routed = dict(self.selection.corpus.index.route(query, doc_ids, limit=len(doc_ids)))
+            candidates = [(doc_id, routed.get(doc_id, 0.0)) for doc_id in doc_ids]
+        else:
+            candidates = self.selection.corpus.index.route(query, doc_ids)
+            if not candidates:
+                # Nothing matched anywhere: open with the first documents of the selection
+                candidates = [(doc_id, 0.0) for doc_id in doc_ids[:ROUTE_DOCUMENTS]]
+        best_document = max(score for _, score in candidates) or 1.0
+        offsets = self.selection.offsets()
+        ranked = []
+        for rank, (doc_id, doc_score) in enumerate(candidates):
+            results = self._index(doc_id).search(query, top_k=top_k)
+            best_chunk = max((score for _, score in results), default=0.0) or 1.0
+            for chunk, score in results:
+                combined = (doc_score / best_document) * (score / best_chunk)
+                ranked.append((-combined, rank, chunk.index, self._cite(chunk, doc_id, offsets[doc_id]), combined))
+        if any(item[-1] > 0 for item in ranked):
+            ranked = [item for item in ranked if item[-1] > 0]
+        ranked.sort(key=lambda item: item[:3])
+        return [(chunk, combined) for _, _, _, chunk, combined in ranked[:top_k]]
+
+    def format_context(self, results):
+        ordered = sorted(results, key=lambda item: item[0].start)
+        return "\n\n".join(
+            f"[{chunk.label} · {source_name(self.selection.corpus.get(chunk.document_id))} | chunk {chunk.index} | "
+            f"chars {chunk.start - chunk.offset}-{chunk.end - chunk.offset}]\n{chunk.text}"
+            for chunk, _ in ordered
+        )
+
+    # Which documents (and chunks) an answer drew on, in label order
+    def citations(self, chunks):
+        cited = OrderedDict()
+        for chunk in sorted(chunks, key=lambda chunk: chunk.start):
+            cited.setdefault(chunk.document_id, []).append(chunk.index)
+        return [
+            {'label': self.selection.corpus.label(doc_id), 'document_id': doc_id,
+             'source': source_name(self.selection.corpus.get(doc_id)), 'chunks': sorted(set(indexes))}
+            for doc_id, indexes in cited.items()
+        ]
@@ -0,0 +1,336 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+try:
+    import pyarrow  # noqa: F401
+    PART_FORMAT = "parquet"
+except ImportError:
+    PART_FORMAT = "pickle"
+
+DEFAULT_CHUNK_ROWS = 100_000
+SAMPLE_ROWS = 10_000
+PREVIEW_ROWS = 5
+RESERVOIR_ROWS = 20
+DATASET_DIR = os.path.join(DEFAULT_CACHE_DIR, "csv")
+
+
+def _file_hash(source, block_size=1 << 20):
+    digest = hashlib.sha256()
+    source.seek(0)
+    for block in iter(lambda: source.read(block_size), b""):
+        digest.update(block if isinstance(block, bytes) else block.encode("utf-8"))
+    source.seek(0)
+    return digest.hexdigest()
+
+
+# Mirror the old fallback chain: default parser, then ';', then skipping bad lines
+def _detect_read_options(source):
+    for options in ({}, {'sep': ';'}):
+        source.seek(0)
+        try:
+            return options, pd.read_csv(source, nrows=SAMPLE_ROWS, **options)
+        except pd.errors.ParserError:
+            continue
+    options = {'on_bad_lines': 'skip'}
+    source.seek(0)
+    return options, pd.read_csv(source, nrows=SAMPLE_ROWS, **options)
+
+
+def _compact(chunk, numeric_columns):
+    for column in chunk.columns:
+        if column in numeric_columns:
+            values = pd.to_numeric(chunk[column], errors='coerce')
+            if pd.api.types.is_integer_dtype(values):
+                chunk[column] = pd.to_numeric(values, downcast='integer')
+            elif pd.api.types.is_bool_dtype(values):
+                chunk[column] = values
+            else:
+                chunk[column] = pd.to_numeric(values, downcast='float')
+        else:
+            chunk[column] = chunk[column].astype('string')
+    return chunk
+
+
+def _write_part(frame, path):
+    if PART_FORMAT == "parquet":
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_pickle(path)
+
+
+def _read_part(path, columns=None):
+    if PART_FORMAT == "parquet":
+        return pd.read_parquet(path, columns=columns)
+    frame = pd.read_pickle(path)
+    return frame[columns] if columns is not None else frame
+
+
+# Running per-column aggregates, updated one chunk at a time
+class ColumnStats:
+    def __init__(self, numeric):
+        self.numeric = numeric
+        self.count = 0
+        self.nulls = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def update(self, values):
+        nulls = int(values.isna().sum())
+        self.nulls += nulls
+        self.count += len(values) - nulls
+        if not self.numeric or len(values) == nulls:
+            return
+        data = values.dropna().to_numpy(dtype=np.float64)
+        self.total += float(data.sum())
+        self.total_squares += float(np.square(data).sum())
+        low, high = float(data.min()), float(data.max())
+        self.minimum = low if self.minimum is None else min(self.minimum, low)
+        self.maximum = high if self.maximum is None else max(self.maximum, high)
+
+    def merge(self, other):
+        self.count += other.count
+        self.nulls += other.nulls
+        self.total += other.total
+        self.total_squares += other.total_squares
+        for value in (other.minimum, other.maximum):
+            if value is not None:
+                self.minimum = value if self.minimum is None else min(self.minimum, value)
+                self.maximum = value if self.maximum is None else max(self.maximum, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.numeric and self.count else None
+
+    @property
+    def std(self):
+        if not self.numeric or self.count < 2:
+            return None
+        variance = (self.total_squares - self.total * self.total / self.count) / (self.count - 1)
+        return float(np.sqrt(max(variance, 0.0)))
+
+    def to_dict(self):
+        return {
+            'numeric': self.numeric, 'count': self.count, 'nulls': self.nulls,
+            'total': self.total, 'total_squares': self.total_squares,
+            'minimum': self.minimum, 'maximum': self.maximum,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['numeric'])
+        for key in ('count', 'nulls', 'total', 'total_squares', 'minimum', 'maximum'):
+            setattr(stats, key, data[key])
+        return stats
+
+
+# Handle to a CSV stored as columnar parts on disk plus its aggregates
+class CsvDataset:
+    def __init__(self, path, manifest):
+        self.path = path
+        self.manifest = manifest
+        self.columns = manifest['columns']
+        self.dtypes = manifest['dtypes']
+        self.rows = manifest['rows']
+        self.duplicate_rows = manifest['duplicate_rows']
+        self.stats = {name: ColumnStats.from_dict(data) for name, data in manifest['stats'].items()}
+        self._head = None
+        self._sample = None
+
+    @property
+    def dataset_id(self):
+        return os.path.basename(self.path)
+
+    @property
+    def part_paths(self):
+        return [os.path.join(self.path, name) for name in self.manifest['parts']]
+
+    @property
+    def numeric_columns(self):
+        return [name for name in self.columns if self.stats[name].numeric]
+
+    @property
+    def missing_values(self):
+        return sum(stats.nulls for stats in self.stats.values())
+
+    @property
+    def head(self):
+        if self._head is None:
+            self._head = pd.read_json(os.path.join(self.path, "head.json"), orient="split")
+        return self._head
+
+    @property
+    def sample(self):
+        if self._sample is None:
+            self._sample = pd.read_json(os.path.join(self.path, "sample.json"), orient="split")
+        return self._sample
+
+    def iter_parts(self, columns=None):
+        for part in self.part_paths:
+            yield _read_part(part, columns)
+
+    def load(self, columns=None):
+        parts = list(self.iter_parts(columns))
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=columns or self.columns)
+
+    def histogram(self, column, bins=30):
+        stats = self.stats[column]
+        if stats.minimum is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        high = stats.maximum if stats.maximum > stats.minimum else stats.minimum + 1.0
+        edges = np.linspace(stats.minimum, high, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        for part in self.iter_parts([column]):
+            values = part[column].dropna().to_numpy(dtype=np.float64)
+            counts += np.histogram(values, bins=edges)[0]
+        return counts, edges
+
+    def summary_text(self):
+        lines = [f"CSV dataset: {self.rows} rows x {len(self.columns)} columns", "", "Schema and statistics:"]
+        for name in self.columns:
+            stats = self.stats[name]
+            line = f"- {name} ({self.dtypes[name]}): {stats.count} values, {stats.nulls} missing"
+            if stats.numeric and stats.count:
+                line += (f", min {stats.minimum:g}, max {stats.maximum:g}, "
+                         f"mean {stats.mean:g}, std {stats.std or 0:g}, sum {stats.total:g}")
+            lines.append(line)
+        lines += ["", f"Duplicate rows: {self.duplicate_rows}", "",
+                  "First rows:", self.head.to_csv(index=False),
+                  "Random sample of rows:", self.sample.to_csv(index=False)]
+        return "\n".join(lines)
+
+
+def open_dataset(dataset_id, root=DATASET_DIR):
+    path = os.path.join(root, dataset_id)
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return CsvDataset(path, json.load(f))
+    except (OSError, ValueError):
+        return None
+
+
+# The numeric columns inferred from the sample decide each part's dtypes and stats, so they are part of the hash
+def _block_hash(columns, numeric_columns, row_hashes, options):
+    header = [columns, sorted(str(name) for name in numeric_columns), options, PART_FORMAT]
+    digest = hashlib.sha256(json.dumps(header).encode("utf-8"))
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()
+
+
+def _reuse_part(previous_path, path):
+    try:
+        os.link(previous_path, path)
+    except OSError:
+        shutil.copy2(previous_path, path)
+
+
+# Stream a CSV into compact columnar parts, computing aggregates along the way. Row blocks whose
+# content matches a block of `previous` (an earlier version of the same file) reuse its part and stats;
+# `on_progress(bytes_read, total_bytes)` is called after each block
+def ingest_csv(source, chunk_rows=DEFAULT_CHUNK_ROWS, root=DATASET_DIR, seed=0, previous=None, on_progress=None):
+    dataset_id = _file_hash(source)
+    path = os.path.join(root, dataset_id)
+    manifest_path = os.path.join(path, "manifest.json")
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            return CsvDataset(path, json.load(f))
+    options, sample = _detect_read_options(source)
+    numeric_columns = set(sample.select_dtypes(include=['number', 'bool']).columns)
+    columns = [str(name) for name in sample.columns]
+    stats = {str(name): ColumnStats(name in numeric_columns) for name in sample.columns}
+    # Each ingest writes its own directory, so concurrent ingests of the same file never share one
+    os.makedirs(root, exist_ok=True)
+    work_path = tempfile.mkdtemp(prefix=f"{dataset_id}.", suffix=".partial", dir=root)
+    rng = np.random.default_rng(seed)
+    reusable = {}
+    if previous is not None and previous.manifest.get('chunk_rows') == chunk_rows:
+        reusable = {block['hash']: block for block in previous.manifest.get('blocks', [])}
+    parts, row_hashes, blocks = [], [], []
+    head = None
+    reservoir, reservoir_keys = None, np.empty(0)
+    dtypes = {}
+    rows = 0
+    reused_blocks = 0
+    total_bytes = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    try:
+        for number, chunk in enumerate(pd.read_csv(source, chunksize=chunk_rows, **options)):
+            chunk_hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            row_hashes.append(chunk_hashes)
+            block_hash = _block_hash(columns, numeric_columns, chunk_hashes, options)
+            if head is None:
+                head = _compact(chunk.head(PREVIEW_ROWS).copy(), numeric_columns)
+            # Bottom-k sampling on random keys gives a uniform sample without a second pass
+            keys = rng.random(len(chunk))
+            candidates = pd.concat([reservoir, chunk]) if reservoir is not None else chunk
+            all_keys = np.concatenate([reservoir_keys, keys])
+            keep = np.argsort(all_keys)[:RESERVOIR_ROWS]
+            reservoir, reservoir_keys = candidates.iloc[keep], all_keys[keep]
+            part_name = f"part-{number:05d}.{PART_FORMAT}"
+            block = reusable.get(block_hash)
+            if block is not None:
+                # Unchanged rows: take the compacted part and its aggregates from the previous version
+                _reuse_part(os.path.join(previous.path, block['part']), os.path.join(work_path, part_name))
+                block_stats = {name: ColumnStats.from_dict(data) for name, data in block['stats'].items()}
+                block_dtypes = block['dtypes']
+                reused_blocks += 1
+            else:
+                chunk = _compact(chunk, numeric_columns)
+                block_stats = {str(name): ColumnStats(name in numeric_columns) for name in chunk.columns}
+                for name in chunk.columns:
+                    block_stats[str(name)].update(chunk[name])
+                block_dtypes = {str(name): str(chunk[name].dtype) for name in chunk.columns}
+                chunk.columns = [str(name) for name in chunk.columns]
+                _write_part(chunk, os.path.join(work_path, part_name))
+            for name, column_stats in block_stats.items():
+                stats[name].merge(column_stats)
+            dtypes.update(block_dtypes)
+            blocks.append({'hash': block_hash, 'part': part_name, 'rows': len(chunk), 'dtypes': block_dtypes,
+                           'stats': {name: column_stats.to_dict() for name, column_stats in block_stats.items()}})
+            parts.append(part_name)
+            rows += len(chunk)
+            if on_progress is not None:
+                on_progress(min(source.tell(), total_bytes), total_bytes)
+    except BaseException:
+        # Failed or cancelled: leave no half-written dataset behind
+        shutil.rmtree(work_path, ignore_errors=True)
+        raise
+    hashes = np.concatenate(row_hashes) if row_hashes else np.empty(0, dtype=np.uint64)
+    head = head if head is not None else sample.head(0)
+    reservoir = _compact(reservoir.copy(), numeric_columns) if reservoir is not None else sample.head(0)
+    head.to_json(os.path.join(work_path, "head.json"), orient="split", index=False)
+    reservoir.sort_index().to_json(os.path.join(work_path, "sample.json"), orient="split", index=False)
+    manifest = {
+        'columns': columns,
+        'dtypes': {name: dtypes.get(name, 'object') for name in columns},
+        'rows': rows,
+        'duplicate_rows': int(len(hashes) - len(np.unique(hashes))),
+        'parts': parts,
+        'format': PART_FORMAT,
+        'read_options': options,
+        'stats': {name: column_stats.to_dict() for name, column_stats in stats.items()},
+        'chunk_rows': chunk_rows,
+        'blocks': blocks,
+        'reused_blocks': reused_blocks,
+    }
+    with open(os.path.join(work_path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    if not os.path.exists(manifest_path):
+        shutil.rmtree(path, ignore_errors=True)
+    try:
+        os.replace(work_path, path)
+    except OSError:
+        # A concurrent ingest of the same file finished first; its dataset is identical
+        shutil.rmtree(work_path, ignore_errors=True)
+        with open(manifest_path) as f:
+            return CsvDataset(path, json.load(f))
+    return CsvDataset(path, manifest)
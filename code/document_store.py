@@ -0,0 +1,282 @@
+import contextlib
+import hashlib
+import mmap
+import os
+import shutil
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from answer_cache import DEFAULT_CACHE_DIR
+from retrieval import DocumentIndex, content_hash
+
+DEFAULT_STORE_DIR = os.path.join(DEFAULT_CACHE_DIR, "documents")
+# Resident retrieval indexes across all sessions, and for any one session
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get("DOCUGENIUS_MEMORY_BUDGET_MB", "1024"))
+DEFAULT_SESSION_MEMORY_BUDGET_MB = int(os.environ.get("DOCUGENIUS_SESSION_MEMORY_BUDGET_MB", "256"))
+# Characters per entry of the character -> byte offset table
+BLOCK_CHARS = 1 << 16
+SPOOL_BLOCK = 1 << 20
+# Lone surrogates (seen in some PDF extractions) round-trip, so character offsets stay exact
+ENCODING_ERRORS = "surrogatepass"
+
+
+# Read-only text in a UTF-8 file; slices decode only the blocks they touch
+class StoredText:
+    def __init__(self, path, offsets):
+        self.path = path
+        self.length = int(offsets[0])
+        self.offsets = offsets[1:]
+
+    def __len__(self):
+        return self.length
+
+    def _decode(self, start, stop):
+        if start >= stop:
+            return ""
+        first, last = start // BLOCK_CHARS, (stop - 1) // BLOCK_CHARS
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            data = view[int(self.offsets[first]):int(self.offsets[last + 1])]
+        text = data.decode("utf-8", errors=ENCODING_ERRORS)
+        base = first * BLOCK_CHARS
+        return text[start - base:stop - base]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if step != 1:
+                return str(self)[key]
+            return self._decode(start, stop)
+        if key < 0:
+            key += self.length
+        if not 0 <= key < self.length:
+            raise IndexError("StoredText index out of range")
+        return self._decode(key, key + 1)
+
+    def __str__(self):
+        return self._decode(0, self.length)
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def __repr__(self):
+        return f"StoredText({self.path!r}, length={self.length})"
+
+    def preview(self, limit=1000):
+        return self[:limit] + "..." if self.length > limit else self[:limit]
+
+
+def _index_bytes(index):
+    size = sum(sys.getsizeof(chunk.text) for chunk in index.chunks)
+    size += sum(array.nbytes for array in (index.bm25.doc_lengths, index.bm25.indptr, index.bm25.doc_ids,
+                                           index.bm25.term_freqs, index.bm25.idf))
+    # Vocabulary dict: key string plus entry overhead
+    size += sum(sys.getsizeof(term) + 40 for term in index.bm25.vocab)
+    if index.embeddings is not None:
+        size += index.embeddings.nbytes
+    return size
+
+
+# Copy an upload to a temporary file block by block, yielding (path, sha256); the file is removed afterwards
+@contextlib.contextmanager
+def spooled_upload(stream, suffix="", directory=None):
+    directory = directory or os.path.join(DEFAULT_STORE_DIR, "uploads")
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    handle, path = tempfile.mkstemp(suffix=suffix, dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as f:
+            if hasattr(stream, "getbuffer"):
+                # In-memory uploads: hash and write the existing buffer without copying it
+                buffer = stream.getbuffer()
+                digest.update(buffer)
+                f.write(buffer)
+                del buffer
+            else:
+                stream.seek(0)
+                for block in iter(lambda: stream.read(SPOOL_BLOCK), b""):
+                    digest.update(block)
+                    f.write(block)
+        yield path, digest.hexdigest()
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(path)
+
+
+# Write through a uniquely named temporary file in the target directory, then move it into place.
+# Files are content-addressed, so when a concurrent writer got there first its copy is as good as ours
+def _write_once(path, write):
+    handle, work_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".partial",
+                                         dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, "wb") as f:
+            write(f)
+        os.replace(work_path, path)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+    finally:
+        with contextlib.suppress(OSError):
+            os.remove(work_path)
+
+
+# Extracted text lives on disk; only retrieval indexes are held in memory, within the budgets, evicting LRU
+class DocumentStore:
+    def __init__(self, root=DEFAULT_STORE_DIR, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB,
+                 session_budget_mb=DEFAULT_SESSION_MEMORY_BUDGET_MB):
+        self.root = root
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.session_budget = session_budget_mb * 1024 * 1024
+        os.makedirs(root, exist_ok=True)
+        self._resident = OrderedDict()
+        self._sessions = {}
+        self._resident_bytes = 0
+        # Chunk count of every index built in this process, kept after the index is evicted
+        self._chunk_counts = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def _paths(self, doc_hash):
+        base = os.path.join(self.root, doc_hash[:2], doc_hash)
+        return base + ".txt", base + ".offsets.npy"
+
+    def _sections_path(self, doc_hash):
+        return os.path.join(self.root, doc_hash[:2], doc_hash + ".sections.npy")
+
+    # Write `text` once per content hash and return a handle to it; `sections` are the start
+    # offsets of independently chunked parts (e.g. PDF pages)
+    def put(self, text, sections=None):
+        doc_hash = content_hash(text)
+        text_path, offsets_path = self._paths(doc_hash)
+        os.makedirs(os.path.dirname(text_path), exist_ok=True)
+        # Checked on its own: the same text may have been stored earlier without sections
+        sections_path = self._sections_path(doc_hash)
+        if sections is not None and not os.path.exists(sections_path):
+            _write_once(sections_path, lambda f: np.save(f, np.asarray(sections, dtype=np.int64)))
+            with self._lock:
+                # An index built without the sections is rebuilt with them on next use
+                if doc_hash in self._resident:
+                    self._evict(doc_hash)
+        if not os.path.exists(offsets_path):
+            offsets = [len(text), 0]
+
+            def write_text(f):
+                for start in range(0, len(text), BLOCK_CHARS):
+                    data = text[start:start + BLOCK_CHARS].encode("utf-8", errors=ENCODING_ERRORS)
+                    f.write(data)
+                    offsets.append(offsets[-1] + len(data))
+
+            _write_once(text_path, write_text)
+            # The offsets file is written last, so its presence means the text is complete
+            _write_once(offsets_path, lambda f: np.save(f, np.asarray(offsets, dtype=np.int64)))
+        return doc_hash, self.open(doc_hash)
+
+    def open(self, doc_hash):
+        text_path, offsets_path = self._paths(doc_hash)
+        if not os.path.exists(offsets_path):
+            raise KeyError(f"Document {doc_hash} is not in the store")
+        return StoredText(text_path, np.load(offsets_path))
+
+    def __contains__(self, doc_hash):
+        return os.path.exists(self._paths(doc_hash)[1])
+
+    # The document's retrieval index, rebuilt from disk if it was evicted; `owner` is the session using it
+    def index(self, doc_hash, owner=None):
+        with self._lock:
+            entry = self._resident.get(doc_hash)
+            if entry is not None:
+                self._resident.move_to_end(doc_hash)
+                self._claim(doc_hash, owner)
+                return entry[0]
+        sections_path = self._sections_path(doc_hash)
+        sections = np.load(sections_path) if os.path.exists(sections_path) else None
+        index = DocumentIndex(self.open(doc_hash), sections=sections)
+        size = _index_bytes(index)
+        with self._lock:
+            entry = self._resident.get(doc_hash)
+            if entry is not None:
+                # Built concurrently by another session; keep the first copy
+                index = entry[0]
+            else:
+                self._resident[doc_hash] = (index, size)
+                self._resident_bytes += size
+                self._chunk_counts[doc_hash] = len(index)
+                self.loads += 1
+            self._resident.move_to_end(doc_hash)
+            self._claim(doc_hash, owner)
+            self._enforce_budgets(doc_hash, owner)
+        return index
+
+    # Known without loading anything; None until the document's index has been built once
+    def chunk_count(self, doc_hash):
+        with self._lock:
+            return self._chunk_counts.get(doc_hash)
+
+    def _claim(self, doc_hash, owner):
+        if owner is None:
+            return
+        documents = self._sessions.setdefault(owner, OrderedDict())
+        documents[doc_hash] = None
+        documents.move_to_end(doc_hash)
+
+    def _evict(self, doc_hash):
+        index, size = self._resident.pop(doc_hash)
+        self._resident_bytes -= size
+        self.evictions += 1
+        for owner, documents in list(self._sessions.items()):
+            documents.pop(doc_hash, None)
+            if not documents:
+                del self._sessions[owner]
+
+    # The document just used is never evicted, even if it alone exceeds a budget
+    def _enforce_budgets(self, current, owner):
+        documents = self._sessions.get(owner)
+        while documents and len(documents) > 1:
+            used = sum(self._resident[doc_hash][1] for doc_hash in documents if doc_hash in self._resident)
+            oldest = next(iter(documents))
+            if used <= self.session_budget or oldest == current:
+                break
+            del documents[oldest]
+            if not any(oldest in others for others in self._sessions.values()):
+                self._evict(oldest)
+        while self._resident_bytes > self.memory_budget and len(self._resident) > 1:
+            oldest = next(iter(self._resident))
+            if oldest == current:
+                break
+            self._evict(oldest)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'resident_documents': len(self._resident),
+                'resident_mb': round(self._resident_bytes / (1024 * 1024), 1),
+                'budget_mb': round(self.memory_budget / (1024 * 1024), 1),
+                'sessions': len(self._sessions),
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._resident.clear()
+            self._sessions.clear()
+            self._chunk_counts.clear()
+            self._resident_bytes = 0
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def default_store():
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = DocumentStore()
+        return _default_store
@@ -0,0 +1,229 @@
+import copy
+import os
+
+from analysis import MODEL_NAME, SCOPE_EXCERPTS, answer_question, make_history_entry
+from context_budget import DEFAULT_TOKEN_BUDGET
+from answer_cache import DEFAULT_CACHE_DIR, AnswerCache
+from batch_query import DEFAULT_RETRIES, DEFAULT_WORKERS, retry_rows, run_batch
+from csv_ingestion import ingest_csv, open_dataset
+from document_store import DocumentStore, default_store
+from html_extractor import extract_text
+from http_fetch import HttpCache, decode_body, fetch, fetch_many
+from ingest_manifest import ManifestStore, unchanged_count
+from metrics import span
+from model_backends import get_backend
+from pdf_extraction import PageTextCache, extract_pdf_text
+from retrieval import content_hash
+from table_query import answer_table_question
+
+
+# Handle to an ingested document: the text is spilled to the document store and the
+# retrieval index is loaded from it on demand, so holding a Document costs almost no memory
+class Document:
+    def __init__(self, text, doc_type, source=None, details=None, dataset=None, store=None, sections=None):
+        self.store = store if store is not None else default_store()
+        self.doc_id, self.text = self.store.put(text, sections=sections)
+        self.doc_type = doc_type
+        self.source = source
+        self.details = details or {}
+        self.dataset = dataset
+
+    @property
+    def index(self):
+        return self.retrieval_index()
+
+    def retrieval_index(self, owner=None):
+        return self.store.index(self.doc_id, owner=owner)
+
+    def describe(self):
+        return {
+            'document_id': self.doc_id,
+            'type': self.doc_type,
+            'source': self.source,
+            'characters': len(self.text),
+            'chunks': self.store.chunk_count(self.doc_id),
+            'details': self.details,
+        }
+
+
+# UI-free core: ingestion, querying and export with no Streamlit dependency
+class Engine:
+    def __init__(self, model_factory=None, answer_cache=None, page_cache=None, http_cache=None,
+                 summary_cache=None, model_name=MODEL_NAME, token_budget=DEFAULT_TOKEN_BUDGET,
+                 document_store=None, manifest_store=None):
+        self.model_factory = model_factory or get_backend()
+        self.answer_cache = answer_cache if answer_cache is not None else AnswerCache()
+        if summary_cache is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            summary_cache = AnswerCache(path=os.path.join(DEFAULT_CACHE_DIR, "summaries.sqlite"))
+        self.summary_cache = summary_cache
+        self.token_budget = token_budget
+        self.page_cache = page_cache if page_cache is not None else PageTextCache()
+        self.http_cache = http_cache if http_cache is not None else HttpCache()
+        self.documents = document_store if document_store is not None else DocumentStore()
+        self.manifests = manifest_store if manifest_store is not None else ManifestStore()
+        self.model_name = model_name
+        self.owner = None
+        self.user = None
+        self._models = {}
+
+    # Model handles are created once per name and reused for every query
+    def model(self):
+        if self.model_name not in self._models:
+            self._models[self.model_name] = self.model_factory(self.model_name)
+        return self._models[self.model_name]
+
+    # Same caches, different model source (e.g. one user's API key); `owner` names the session whose
+    # cached model contexts and resident document indexes this view claims, `user` the stable identity
+    # whose file revisions are compared
+    def with_model_factory(self, model_factory, owner=None, user=None):
+        engine = copy.copy(self)
+        engine.model_factory = model_factory
+        engine.owner = owner
+        engine.user = user
+        engine._models = {}
+        return engine
+
+    # Called when a session moves on from `document`; returns how many cached contexts were deleted
+    def release_context(self, document):
+        release = getattr(self.model_factory, "release_context", None)
+        if release is None:
+            return 0
+        return release(document.doc_id, self.owner)
+
+    # Works for a Document or a CorpusSelection
+    def _index(self, document):
+        return document.retrieval_index(self.owner)
+
+    def ingest_text(self, text):
+        with span("extract_text"):
+            return Document(text, 'Text', store=self.documents)
+
+    # Compare a new version of a logical document (same user, kind and source name) with the last one
+    # seen and remember it; returns None for a first or identical version
+    def _record_revision(self, kind, source, manifest, parts):
+        previous = self.manifests.get(kind, source, self.user)
+        self.manifests.put(kind, source, manifest, self.user)
+        if previous is None or previous['doc_id'] == manifest['doc_id']:
+            return None
+        revision = {'previous_id': previous['doc_id']}
+        for part in parts:
+            revision[part] = len(manifest[part])
+            revision[f"unchanged_{part}"] = unchanged_count(previous.get(part), manifest[part])
+        return revision
+
+    # Only pages whose content changed are re-extracted (the page cache holds the rest), and pages are
+    # chunked independently, so unchanged pages keep identical chunks and the answers cached on them
+    def ingest_pdf(self, pdf, max_workers=None, on_progress=None, source=None):
+        with span("extract_pdf"):
+            result = extract_pdf_text(pdf, cache=self.page_cache, max_workers=max_workers,
+                                      on_progress=on_progress)
+            details = {
+                'pages': result.pages,
+                'cached_pages': result.cached_pages,
+                'pages_per_second': result.pages_per_second,
+                'peak_rss_growth_mb': result.peak_rss_growth_mb,
+                'words': len(result.text.split()),
+            }
+            sections, position = [], 0
+            for page_text in result.page_texts:
+                sections.append(position)
+                position += len(page_text) + 1
+            document = Document(result.text, 'PDF', source=source, details=details, store=self.documents,
+                                sections=sections)
+            manifest = {
+                'doc_id': document.doc_id,
+                'pages': list(result.page_hashes),
+                'chunks': [content_hash(chunk.text) for chunk in document.retrieval_index(self.owner).chunks],
+            }
+            revision = self._record_revision("pdf", source, manifest, ("pages", "chunks"))
+            if revision is not None:
+                details['revision'] = revision
+            return document
+
+    # Row blocks that match the previous version of the same file reuse its stored parts and statistics
+    def ingest_csv(self, csv_file, source=None, on_progress=None):
+        with span("extract_csv"):
+            previous = self.manifests.get("csv", source, self.user)
+            dataset = ingest_csv(csv_file, previous=open_dataset(previous['dataset_id']) if previous else None,
+                                 on_progress=on_progress)
+            details = {'rows': dataset.rows, 'columns': len(dataset.columns)}
+            # The model gets a compact schema/statistics summary, not the padded frame
+            document = Document(dataset.summary_text(), 'CSV', source=source, details=details, dataset=dataset,
+                                store=self.documents)
+            manifest = {
+                'doc_id': document.doc_id,
+                'dataset_id': dataset.dataset_id,
+                'blocks': [block['hash'] for block in dataset.manifest.get('blocks', [])],
+            }
+            revision = self._record_revision("csv", source, manifest, ("blocks",))
+            if revision is not None:
+                revision['reused_blocks'] = dataset.manifest.get('reused_blocks', 0)
+                details['revision'] = revision
+            return document
+
+    def ingest_html(self, html, source=None, details=None):
+        with span("extract_html"):
+            return Document(extract_text(html), 'URL', source=source, details=details, store=self.documents)
+
+    def ingest_url(self, url):
+        with span("extract_url"):
+            response = fetch(url, cache=self.http_cache)
+            return self.ingest_html(decode_body(response), source=url, details={'from_cache': response.from_cache})
+
+    # Returns the combined document (None if nothing was fetched) and {url: error} for failures
+    def ingest_urls(self, urls):
+        sections, failures = [], {}
+        with span("extract_url"):
+            for url, result in zip(urls, fetch_many(urls, cache=self.http_cache)):
+                if isinstance(result, Exception):
+                    failures[url] = str(result)
+                else:
+                    sections.append(f"Source: {url}\n{extract_text(decode_body(result))}")
+            if not sections:
+                return None, failures
+            document = Document("\n\n".join(sections), 'URL', source=list(urls),
+                                details={'pages': len(sections)}, store=self.documents)
+        return document, failures
+
+    def _answer_options(self, near_duplicates, scope, token_budget):
+        return dict(answer_cache=self.answer_cache, summary_cache=self.summary_cache,
+                    near_duplicates=near_duplicates, model_name=self.model_name, scope=scope,
+                    token_budget=token_budget or self.token_budget, context_owner=self.owner)
+
+    # CSV questions that are lookups or aggregates are computed locally (the model only phrases the
+    # result); everything else, and every other document type, goes to the model
+    def _answer(self, model, document, question, options, stream=False, on_chunk=None):
+        dataset = getattr(document, "dataset", None)
+        if dataset is not None:
+            result = answer_table_question(model, dataset, question, answer_cache=options['answer_cache'],
+                                           near_duplicates=options['near_duplicates'],
+                                           model_name=options['model_name'], stream=stream, on_chunk=on_chunk)
+            if result is not None:
+                return result
+        result = answer_question(model, self._index(document), question, stream=stream, on_chunk=on_chunk, **options)
+        return dict(result, route='llm') if dataset is not None else result
+
+    def ask(self, document, question, label=None, near_duplicates=False, stream=False, on_chunk=None,
+            scope=SCOPE_EXCERPTS, token_budget=None):
+        options = self._answer_options(near_duplicates, scope, token_budget)
+        result = self._answer(self.model(), document, question, options, stream=stream, on_chunk=on_chunk)
+        answer = result.pop('answer')
+        return make_history_entry(question, answer, label or document.doc_type, **result)
+
+    def _answer_fn(self, document, near_duplicates, scope, token_budget):
+        model = self.model()
+        options = self._answer_options(near_duplicates, scope, token_budget)
+        def answer_fn(question):
+            return self._answer(model, document, question, options)
+        return answer_fn
+
+    def ask_many(self, document, questions, max_workers=DEFAULT_WORKERS, max_retries=DEFAULT_RETRIES,
+                 near_duplicates=False, on_progress=None, scope=SCOPE_EXCERPTS, token_budget=None):
+        return run_batch(questions, self._answer_fn(document, near_duplicates, scope, token_budget),
+                         max_workers=max_workers, max_retries=max_retries, on_progress=on_progress)
+
+    def retry(self, document, rows, positions, max_workers=DEFAULT_WORKERS, max_retries=DEFAULT_RETRIES,
+              near_duplicates=False, on_progress=None, scope=SCOPE_EXCERPTS, token_budget=None):
+        return retry_rows(rows, positions, self._answer_fn(document, near_duplicates, scope, token_budget),
+                          max_workers=max_workers, max_retries=max_retries, on_progress=on_progress)
@@ -0,0 +1,284 @@
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+from metrics import span
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_FORMATS = ("csv", "json", "jsonl") + (("parquet",) if PARQUET_AVAILABLE else ()) + ("pdf",)
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "json": "application/json",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+    "pdf": "application/pdf",
+}
+FILE_NAMES = {
+    "csv": "docugenius_history.csv",
+    "json": "docugenius_history.json",
+    "jsonl": "docugenius_history.jsonl",
+    "parquet": "docugenius_history.parquet",
+    "pdf": "docugenius_history_report.pdf",
+}
+# Flat columns for tabular exports; anything else goes into the JSON "details" column
+EXPORT_COLUMNS = ('timestamp', 'type', 'query', 'answer', 'cached', 'strategy', 'latency',
+                  'tokens_spent', 'batch', 'details')
+ROW_GROUP_SIZE = 1_000
+# Flowables generated ahead of the page being laid out
+PDF_LOOKAHEAD = 64
+# Long answers become several paragraphs; re-wrapping one huge paragraph on every page is quadratic
+PDF_PARAGRAPH_CHARS = 2_000
+TRUNCATED_MARKER = "<b>[Omitted: this item is too large to fit on a page]</b>"
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="export")
+
+
+def flatten_entry(entry):
+    row = {column: entry.get(column) for column in EXPORT_COLUMNS[:-1]}
+    details = {key: value for key, value in entry.items() if key not in EXPORT_COLUMNS and key != 'id'}
+    row['details'] = json.dumps(details, default=str) if details else ""
+    return row
+
+
+def write_csv(entries, target, on_row=None):
+    text = io.TextIOWrapper(target, encoding="utf-8", newline="")
+    writer = csv.DictWriter(text, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    for entry in entries:
+        writer.writerow(flatten_entry(entry))
+        if on_row:
+            on_row()
+    text.detach()
+
+
+def write_jsonl(entries, target, on_row=None):
+    for entry in entries:
+        target.write((json.dumps(entry, default=str) + "\n").encode("utf-8"))
+        if on_row:
+            on_row()
+
+
+# A JSON array written one entry at a time, readable by `cli.py export`
+def write_json(entries, target, on_row=None):
+    target.write(b"[")
+    for number, entry in enumerate(entries):
+        target.write((",\n" if number else "\n").encode("utf-8"))
+        target.write(json.dumps(entry, indent=4, default=str).encode("utf-8"))
+        if on_row:
+            on_row()
+    target.write(b"\n]")
+
+
+def write_parquet(entries, target, on_row=None):
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("Parquet export requires pyarrow")
+    schema = pa.schema([
+        ('timestamp', pa.string()), ('type', pa.string()), ('query', pa.string()), ('answer', pa.string()),
+        ('cached', pa.bool_()), ('strategy', pa.string()), ('latency', pa.float64()),
+        ('tokens_spent', pa.int64()), ('batch', pa.bool_()), ('details', pa.string()),
+    ])
+    with pq.ParquetWriter(target, schema) as writer:
+        rows = []
+        for entry in entries:
+            rows.append(flatten_entry(entry))
+            if on_row:
+                on_row()
+            if len(rows) == ROW_GROUP_SIZE:
+                writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+                rows = []
+        if rows:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+
+
+def _report_styles():
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    styles = getSampleStyleSheet()
+    # Define custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Title'],
+        fontSize=16,
+        spaceAfter=20
+    )
+    heading_style = ParagraphStyle(
+        'Heading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=10
+    )
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=10,
+        spaceAfter=5
+    )
+    return title_style, heading_style, normal_style
+
+
+def _paragraph_pieces(text):
+    while len(text) > PDF_PARAGRAPH_CHARS:
+        cut = text.rfind(" ", 0, PDF_PARAGRAPH_CHARS)
+        if cut <= 0:
+            cut = PDF_PARAGRAPH_CHARS
+        yield text[:cut]
+        text = text[cut:].lstrip()
+    yield text
+
+
+def _report_flowables(entries, total, type_counts, on_row):
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer
+
+    title_style, heading_style, normal_style = _report_styles()
+    # Add title
+    yield Paragraph("DocuGenius Pro Analysis History Report", title_style)
+    yield Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style)
+    yield Spacer(1, 0.25*inch)
+    # Add summary info
+    yield Paragraph("Summary", heading_style)
+    yield Paragraph(f"Total Queries: {total}", normal_style)
+    file_type_text = ", ".join([f"{doc_type}: {count}" for doc_type, count in type_counts.items()])
+    yield Paragraph(f"Document Types: {escape(file_type_text)}", normal_style)
+    yield Spacer(1, 0.25*inch)
+    # Add history entries
+    yield Paragraph("Analysis History", heading_style)
+    for idx, entry in enumerate(entries):
+        yield Paragraph(f"Entry #{idx+1} - {entry['timestamp']} ({escape(entry['type'])})", heading_style)
+        yield Paragraph(f"<b>Query:</b> {escape(entry['query'])}", normal_style)
+        for number, piece in enumerate(_paragraph_pieces(entry['answer'] or "")):
+            yield Paragraph(f"<b>Answer:</b> {escape(piece)}" if number == 0 else escape(piece), normal_style)
+        yield Spacer(1, 0.15*inch)
+        if on_row:
+            on_row()
+
+
+# PDF report laid out one page at a time, so only a page's worth of flowables is ever held;
+# on_truncated is called for each item too large for a page, which is replaced by a marked placeholder
+def build_pdf_report(entries, target, total=None, type_counts=None, on_row=None, on_truncated=None):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.pdfgen.canvas import Canvas
+    from reportlab.platypus import Frame, Paragraph
+
+    if total is None or type_counts is None:
+        # Without precomputed totals the entries have to be a list
+        entries = list(entries)
+        total = len(entries)
+        type_counts = {}
+        for entry in entries:
+            type_counts[entry['type']] = type_counts.get(entry['type'], 0) + 1
+    flowables = _report_flowables(entries, total, type_counts, on_row)
+    canvas = Canvas(target, pagesize=letter)
+    width, height = letter
+    pending = []
+    while True:
+        for flowable in flowables:
+            pending.append(flowable)
+            if len(pending) >= PDF_LOOKAHEAD:
+                break
+        if not pending:
+            break
+        frame = Frame(inch, inch, width - 2*inch, height - 2*inch)
+        # Like Frame.addFromList, but splits whatever overflows the page instead of raising
+        while pending:
+            if frame.add(pending[0], canvas, trySplit=1):
+                pending.pop(0)
+                continue
+            parts = frame.split(pending[0], canvas)
+            if len(parts) > 1 and frame.add(parts[0], canvas, trySplit=1):
+                pending[0:1] = parts[1:]
+            elif frame._atTop:
+                # Taller than a whole page and cannot be split
+                pending[0] = Paragraph(TRUNCATED_MARKER, _report_styles()[2])
+                if on_truncated:
+                    on_truncated()
+                continue
+            break
+        canvas.showPage()
+    canvas.save()
+    return target
+
+
+WRITERS = {
+    "csv": write_csv,
+    "json": write_json,
+    "jsonl": write_jsonl,
+    "parquet": write_parquet,
+    "pdf": build_pdf_report,
+}
+
+
+def export_history(entries, export_format, **options):
+    if export_format not in WRITERS:
+        raise ValueError(f"Unsupported export format: {export_format}")
+    buffer = io.BytesIO()
+    with span(f"export_{export_format}"):
+        WRITERS[export_format](entries, buffer, **options)
+    return buffer.getvalue()
+
+
+# An export running on the background pool; the UI polls it on rerun
+class ExportJob:
+    def __init__(self, export_format, total=None):
+        self.format = export_format
+        self.total = total
+        self.rows_written = 0
+        self.truncated = 0
+        self.data = None
+        self.error = None
+        self.elapsed = None
+        self._future = None
+
+    @property
+    def done(self):
+        return self._future is not None and self._future.done()
+
+    @property
+    def progress(self):
+        if self.done:
+            return 1.0
+        if not self.total:
+            return 0.0
+        return min(self.rows_written / self.total, 0.99)
+
+    @property
+    def file_name(self):
+        return FILE_NAMES[self.format]
+
+    @property
+    def media_type(self):
+        return MEDIA_TYPES[self.format]
+
+    def _count_row(self):
+        self.rows_written += 1
+
+    def _count_truncated(self):
+        self.truncated += 1
+
+    def _run(self, entries_fn, options):
+        start = time.perf_counter()
+        try:
+            self.data = export_history(entries_fn(), self.format, on_row=self._count_row, **options)
+        except Exception as e:
+            self.error = str(e)
+        self.elapsed = round(time.perf_counter() - start, 3)
+
+
+# entries_fn is called on the worker thread, so a store can stream its rows there
+def start_export(entries_fn, export_format, total=None, **options):
+    job = ExportJob(export_format, total)
+    if export_format == "pdf":
+        options.setdefault('total', total)
+        options.setdefault('on_truncated', job._count_truncated)
+    job._future = _executor.submit(job._run, entries_fn, options)
+    return job
@@ -0,0 +1,173 @@
+import copy
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(DEFAULT_CACHE_DIR), "history.sqlite")
+DEFAULT_OWNER = "local"
+CORE_FIELDS = ('timestamp', 'query', 'answer', 'type')
+# Entry timestamps sort as text in this format
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_SEARCH_TERMS = re.compile(r"\w+")
+
+
+def _has_fts5(db):
+    try:
+        db.execute("CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)")
+        db.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# Append-only analysis history in SQLite with a full-text index over queries and answers
+class HistoryStore:
+    def __init__(self, path=DEFAULT_HISTORY_PATH, owner=DEFAULT_OWNER):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.owner = owner
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, owner TEXT NOT NULL, timestamp TEXT NOT NULL, "
+            "query TEXT NOT NULL, answer TEXT NOT NULL, type TEXT NOT NULL, details TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_owner_type ON entries (owner, type, id)")
+        self.full_text = _has_fts5(self._db)
+        if self.full_text:
+            self._db.executescript(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                "query, answer, content='entries', content_rowid='id');"
+                "CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN "
+                "INSERT INTO entries_fts (rowid, query, answer) VALUES (new.id, new.query, new.answer); END;"
+                "CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN "
+                "INSERT INTO entries_fts (entries_fts, rowid, query, answer) "
+                "VALUES ('delete', old.id, old.query, old.answer); END;"
+            )
+        self._db.commit()
+
+    # The same database seen as another owner; shares the connection and its lock
+    def for_owner(self, owner):
+        view = copy.copy(self)
+        view.owner = owner
+        return view
+
+    def append(self, entry):
+        details = {key: value for key, value in entry.items() if key not in CORE_FIELDS}
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO entries (owner, timestamp, query, answer, type, details) VALUES (?, ?, ?, ?, ?, ?)",
+                (self.owner, entry['timestamp'], entry['query'], entry['answer'] or "", entry['type'],
+                 json.dumps(details, default=str)),
+            )
+            self._db.commit()
+            return cursor.lastrowid
+
+    def _where(self, search=None, doc_types=None):
+        clauses, params = ["e.owner = ?"], [self.owner]
+        if doc_types:
+            clauses.append(f"e.type IN ({','.join('?' * len(doc_types))})")
+            params.extend(doc_types)
+        terms = _SEARCH_TERMS.findall(search or "")
+        if terms and self.full_text:
+            clauses.append("e.id IN (SELECT rowid FROM entries_fts WHERE entries_fts MATCH ?)")
+            params.append(" ".join(f'"{term}"*' for term in terms))
+        elif terms:
+            for term in terms:
+                clauses.append("(e.query LIKE ? OR e.answer LIKE ?)")
+                params.extend([f"%{term}%"] * 2)
+        return " AND ".join(clauses), params
+
+    def count(self, search=None, doc_types=None):
+        where, params = self._where(search, doc_types)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM entries e WHERE {where}", params).fetchone()[0]
+
+    # One page of entries, newest first
+    def page(self, offset=0, limit=10, search=None, doc_types=None):
+        where, params = self._where(search, doc_types)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT e.id, e.timestamp, e.query, e.answer, e.type, e.details FROM entries e "
+                f"WHERE {where} ORDER BY e.id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            ).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    # All entries, oldest first, fetched in batches so large histories are never fully in memory
+    def iter_entries(self, batch_size=500, search=None, doc_types=None):
+        where, params = self._where(search, doc_types)
+        last_id = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT e.id, e.timestamp, e.query, e.answer, e.type, e.details FROM entries e "
+                    f"WHERE {where} AND e.id > ? ORDER BY e.id LIMIT ?",
+                    params + [last_id, batch_size],
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._to_entry(row)
+            last_id = rows[-1][0]
+
+    def last(self):
+        entries = self.page(limit=1)
+        return entries[0] if entries else None
+
+    def types(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT DISTINCT type FROM entries WHERE owner = ? ORDER BY type", (self.owner,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def type_counts(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT type, COUNT(*) FROM entries WHERE owner = ? GROUP BY type ORDER BY type", (self.owner,)
+            ).fetchall()
+        return dict(rows)
+
+    def __len__(self):
+        return self.count()
+
+    # Keep only the newest max_entries entries
+    def enforce_retention(self, max_entries):
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM entries WHERE owner = ? AND id NOT IN "
+                "(SELECT id FROM entries WHERE owner = ? ORDER BY id DESC LIMIT ?)",
+                (self.owner, self.owner, max_entries),
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    # Delete every entry of owners whose newest entry is older than max_idle_days; returns entries removed
+    def prune_inactive(self, max_idle_days):
+        cutoff = (datetime.now() - timedelta(days=max_idle_days)).strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            removed = self._db.execute(
+                "DELETE FROM entries WHERE owner IN "
+                "(SELECT owner FROM entries GROUP BY owner HAVING MAX(timestamp) < ?)",
+                (cutoff,),
+            ).rowcount
+            self._db.commit()
+        return removed
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries WHERE owner = ?", (self.owner,))
+            self._db.commit()
+
+    @staticmethod
+    def _to_entry(row):
+        entry = {'id': row[0], 'timestamp': row[1], 'query': row[2], 'answer': row[3], 'type': row[4]}
+        entry.update(json.loads(row[5]))
+        return entry
@@ -0,0 +1,71 @@
+import re
+
+from bs4 import BeautifulSoup, Comment, NavigableString, Tag
+from bs4.element import CData, Declaration, Doctype, ProcessingInstruction
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_PARSER = "lxml"
+except ImportError:
+    DEFAULT_PARSER = "html.parser"
+
+BOILERPLATE_TAGS = {
+    "script", "style", "noscript", "template", "nav", "footer", "aside",
+    "form", "iframe", "svg", "canvas", "button", "select", "head",
+}
+# A <header> is site chrome unless it belongs to the content, e.g. an article's title block
+CONTENT_TAGS = ("article", "main")
+HEADING_TAGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+BLOCK_TAGS = {
+    "p", "div", "article", "section", "main", "li", "ul", "ol", "table", "tr", "td", "th",
+    "blockquote", "pre", "br", "hr", "dd", "dt", "dl", "figure", "figcaption", "body", "header",
+}
+SKIPPED_STRINGS = (Comment, CData, Declaration, Doctype, ProcessingInstruction)
+_SPACES = re.compile(r"[ \t\r\f\v\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+def _emit_heading(tag, level, lines):
+    heading = _SPACES.sub(" ", tag.get_text(" ")).strip()
+    if heading:
+        lines.append(f"\n\n{'#' * level} {heading}\n\n")
+
+
+# Walk the tree once, emitting every visible text node exactly once
+def extract_text(html, parser=None):
+    soup = BeautifulSoup(html, parser or DEFAULT_PARSER)
+    lines = []
+    stack = [soup]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, NavigableString):
+            if not isinstance(node, SKIPPED_STRINGS):
+                lines.append(str(node))
+            continue
+        if isinstance(node, str):
+            # Sentinel pushed after a block element's children
+            lines.append(node)
+            continue
+        if not isinstance(node, Tag):
+            continue
+        name = node.name
+        if name in BOILERPLATE_TAGS or node.get("aria-hidden") == "true" or node.get("role") == "navigation":
+            continue
+        if name == "header" and node.find_parent(CONTENT_TAGS) is None:
+            continue
+        if name in HEADING_TAGS:
+            _emit_heading(node, HEADING_TAGS[name], lines)
+            continue
+        if name in BLOCK_TAGS:
+            lines.append("\n")
+            stack.append("\n")
+        stack.extend(reversed(node.contents))
+    text = "".join(lines)
+    text = "\n".join(_SPACES.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+# The extraction process_url_input used before this module, kept for benchmarking
+def legacy_extract_text(html):
+    soup = BeautifulSoup(html, "html.parser")
+    return " ".join([p.get_text() for p in soup.find_all(["p", "article", "div"])])
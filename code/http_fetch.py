@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from urllib3.util.retry import Retry
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+DEFAULT_TIMEOUT = (5, 20)  # (connect, read) seconds
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_PER_HOST = 2
+USER_AGENT = "DocuGeniusPro/1.0 (+https://github.com/Sivamahendranath/Gemini-Document-RAG)"
+
+FetchResult = namedtuple("FetchResult", ["url", "status", "content", "encoding", "from_cache", "elapsed"])
+
+
+class FetchError(Exception):
+    pass
+
+
+class ResponseTooLarge(FetchError):
+    pass
+
+
+def decode_body(result):
+    return result.content.decode(result.encoding or "utf-8", errors="replace")
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+# One connection-pooled session shared by every caller in the process
+def get_session(pool_size=DEFAULT_MAX_WORKERS * 2):
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            retry = Retry(total=2, backoff_factor=0.3, status_forcelist=(502, 503, 504),
+                          allowed_methods=frozenset(["GET", "HEAD"]))
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+            _session = session
+        return _session
+
+
+# On-disk cache of response bodies revalidated with ETag / Last-Modified
+class HttpCache:
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DEFAULT_CACHE_DIR, "http")
+        os.makedirs(self.path, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key + ".json"), os.path.join(self.path, key + ".body")
+
+    def lookup(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                return meta, f.read()
+        except (OSError, ValueError):
+            return None, None
+
+    def store(self, url, validators, encoding, content):
+        meta_path, body_path = self._paths(url)
+        meta = dict(validators, url=url, encoding=encoding, stored=time.time())
+        with self._lock:
+            with open(body_path + ".tmp", "wb") as f:
+                f.write(content)
+            with open(meta_path + ".tmp", "w") as f:
+                json.dump(meta, f)
+            os.replace(body_path + ".tmp", body_path)
+            os.replace(meta_path + ".tmp", meta_path)
+
+
+def _read_capped(response, max_bytes):
+    declared = response.headers.get("Content-Length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise ResponseTooLarge(f"Response is {int(declared)} bytes, limit is {max_bytes}")
+    parts, size = [], 0
+    for block in response.iter_content(64 * 1024):
+        size += len(block)
+        if size > max_bytes:
+            raise ResponseTooLarge(f"Response exceeded the {max_bytes} byte limit")
+        parts.append(block)
+    return b"".join(parts)
+
+
+def fetch(url, session=None, cache=None, timeout=DEFAULT_TIMEOUT, max_bytes=DEFAULT_MAX_BYTES):
+    session = session or get_session()
+    start = time.perf_counter()
+    headers = {}
+    meta, cached_body = cache.lookup(url) if cache is not None else (None, None)
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 304 and meta is not None:
+            return FetchResult(url, 304, cached_body, meta.get("encoding"), True,
+                               time.perf_counter() - start)
+        response.raise_for_status()
+        content = _read_capped(response, max_bytes)
+        encoding = response.encoding
+        if encoding is None or ("charset" not in response.headers.get("Content-Type", "")
+                                and encoding.lower() == "iso-8859-1"):
+            # The body was streamed, so detect on the bytes read (response.apparent_encoding would re-read it)
+            encoding = chardet.detect(content)["encoding"] if content else None
+        validators = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if cache is not None and (validators["etag"] or validators["last_modified"]):
+            cache.store(url, validators, encoding, content)
+        return FetchResult(url, response.status_code, content, encoding, False,
+                           time.perf_counter() - start)
+
+
+# Fetch several URLs concurrently; results keep input order, failures are returned as exceptions
+def fetch_many(urls, session=None, cache=None, max_workers=DEFAULT_MAX_WORKERS,
+               per_host=DEFAULT_PER_HOST, **kwargs):
+    session = session or get_session()
+    host_limits = {}
+    for url in urls:
+        host_limits.setdefault(urlsplit(url).netloc, threading.BoundedSemaphore(per_host))
+
+    def task(url):
+        with host_limits[urlsplit(url).netloc]:
+            try:
+                return fetch(url, session=session, cache=cache, **kwargs)
+            except Exception as e:
+                return e
+
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(task, urls))
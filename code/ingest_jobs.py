@@ -0,0 +1,208 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+# Jobs running at once across all sessions, and for any one session
+DEFAULT_INGEST_WORKERS = int(os.environ.get("DOCUGENIUS_INGEST_WORKERS", "4"))
+DEFAULT_JOBS_PER_OWNER = int(os.environ.get("DOCUGENIUS_INGEST_JOBS_PER_USER", "2"))
+# Finished jobs kept per owner for the UI to show
+KEEP_FINISHED = 20
+# Results of recent jobs, so an identical upload is not processed twice
+KEEP_RESULTS = 32
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# One ingestion on the background queue; the UI polls it on rerun
+class IngestJob:
+    def __init__(self, owner, kind, name, size, run, key=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.owner = owner
+        self.kind = kind
+        self.name = name
+        self.size = size
+        self.key = key
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Waiting for a worker"
+        self.result = None
+        self.error = None
+        # Problems that did not fail the job, e.g. URLs that could not be fetched
+        self.warnings = []
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._run = run
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return round((self.finished or time.time()) - self.started, 2)
+
+    # Raises JobCancelled once cancellation was requested; long steps call it between units of work
+    def check(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    # Progress callback in the (done, total) form the ingesters use
+    def report(self, done, total, unit=""):
+        self.check()
+        self.progress = min(done / total, 1.0) if total else 0.0
+        self.message = f"{done:,.0f}/{total:,.0f} {unit}" if unit else f"{self.progress:.0%}"
+
+
+# Worker threads take the smallest queued job whose owner is under its concurrency limit
+class IngestQueue:
+    def __init__(self, workers=DEFAULT_INGEST_WORKERS, per_owner=DEFAULT_JOBS_PER_OWNER):
+        self.workers = max(1, workers)
+        self.per_owner = max(1, per_owner)
+        self._heap = []
+        self._order = itertools.count()
+        self._jobs = OrderedDict()
+        self._running = {}
+        self._results = OrderedDict()
+        self._condition = threading.Condition()
+        self._threads = []
+        self.completed = 0
+        self.reused = 0
+
+    def _start_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"ingest-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    # `run(job)` does the work and returns the result; `key` identifies identical inputs
+    def submit(self, owner, kind, name, size, run, key=None):
+        job = IngestJob(owner, kind, name, size, run, key)
+        with self._condition:
+            self._jobs[job.id] = job
+            if key is not None and key in self._results:
+                self._results.move_to_end(key)
+                job.result = self._results[key]
+                job.status, job.progress, job.message = DONE, 1.0, "Already processed"
+                job.started = job.finished = time.time()
+                self.reused += 1
+            else:
+                heapq.heappush(self._heap, (size, next(self._order), job))
+                self._start_workers()
+                self._condition.notify()
+            self._prune(owner)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    # Queued jobs are dropped at once; running ones stop at their next progress report
+    def cancel(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED, message="Cancelled before it started")
+            return True
+
+    def forget(self, job_id):
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+
+    def stats(self):
+        with self._condition:
+            statuses = [job.status for job in self._jobs.values()]
+            return {
+                'queued': statuses.count(QUEUED),
+                'running': statuses.count(RUNNING),
+                'workers': self.workers,
+                'completed': self.completed,
+                'reused': self.reused,
+            }
+
+    def _prune(self, owner):
+        finished = [job.id for job in self._jobs.values() if job.owner == owner and job.done]
+        for job_id in finished[:-KEEP_FINISHED]:
+            del self._jobs[job_id]
+
+    def _finish(self, job, status, message=None, error=None):
+        job.status = status
+        job.finished = time.time()
+        job.error = error
+        if message is not None:
+            job.message = message
+        job._run = None
+
+    # Runs under the condition; skipped jobs go back on the heap in their original order
+    def _next_job(self):
+        skipped, job = [], None
+        while self._heap:
+            item = heapq.heappop(self._heap)
+            candidate = item[2]
+            if candidate.status != QUEUED:
+                continue
+            if self._running.get(candidate.owner, 0) >= self.per_owner:
+                skipped.append(item)
+                continue
+            job = candidate
+            break
+        for item in skipped:
+            heapq.heappush(self._heap, item)
+        return job
+
+    def _work(self):
+        while True:
+            with self._condition:
+                job = self._next_job()
+                while job is None:
+                    self._condition.wait()
+                    job = self._next_job()
+                job.status = RUNNING
+                job.started = time.time()
+                job.message = "Starting"
+                self._running[job.owner] = self._running.get(job.owner, 0) + 1
+            try:
+                job.check()
+                result = job._run(job)
+                job.check()
+            except JobCancelled:
+                status, result, error = CANCELLED, None, None
+            except Exception as e:
+                status, result, error = FAILED, None, str(e)
+            else:
+                status, error = DONE, None
+            with self._condition:
+                job.result = result
+                self._finish(job, status, message={DONE: "Done", CANCELLED: "Cancelled"}.get(status, "Failed"),
+                             error=error)
+                if status == DONE:
+                    self.completed += 1
+                    job.progress = 1.0
+                    if job.key is not None:
+                        self._results[job.key] = result
+                        while len(self._results) > KEEP_RESULTS:
+                            self._results.popitem(last=False)
+                self._running[job.owner] -= 1
+                if not self._running[job.owner]:
+                    del self._running[job.owner]
+                # A slot for this owner opened up; any waiting worker may now take their next job
+                self._condition.notify_all()
@@ -0,0 +1,74 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+# Manifests not updated for this long are deleted; checked at most once an hour
+DEFAULT_IDLE_DAYS = int(os.environ.get("DOCUGENIUS_MANIFEST_IDLE_DAYS", "90"))
+PRUNE_INTERVAL = 3600
+
+
+# Versions are tracked per user, so two users' files that share a name are never compared
+def manifest_key(kind, source, owner=None):
+    return f"{owner}:{kind}:{source}" if owner else f"{kind}:{source}"
+
+
+# Share of `current` hashes that already appeared in `previous` (order-insensitive, counts duplicates)
+def unchanged_count(previous, current):
+    remaining = {}
+    for value in previous or ():
+        remaining[value] = remaining.get(value, 0) + 1
+    unchanged = 0
+    for value in current:
+        if remaining.get(value):
+            remaining[value] -= 1
+            unchanged += 1
+    return unchanged
+
+
+# Latest content manifest (page, row-block and chunk hashes) per logical document, e.g. ("pdf", "contract.pdf")
+class ManifestStore:
+    def __init__(self, path=None, max_idle_days=DEFAULT_IDLE_DAYS):
+        self.max_idle_days = max_idle_days
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "manifests.sqlite")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS manifests (key TEXT PRIMARY KEY, manifest TEXT NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.prune()
+
+    def get(self, kind, source, owner=None):
+        if not source:
+            return None
+        with self._lock:
+            row = self._db.execute("SELECT manifest FROM manifests WHERE key = ?",
+                                   (manifest_key(kind, source, owner),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, kind, source, manifest, owner=None):
+        if not source:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifests (key, manifest, updated) VALUES (?, ?, ?)",
+                (manifest_key(kind, source, owner), json.dumps(manifest), time.time()),
+            )
+            self._db.commit()
+        if time.time() - self._pruned > PRUNE_INTERVAL:
+            self.prune()
+
+    # Forget documents nobody has re-uploaded for max_idle_days; returns manifests removed
+    def prune(self):
+        with self._lock:
+            self._pruned = time.time()
+            removed = self._db.execute("DELETE FROM manifests WHERE updated < ?",
+                                       (self._pruned - self.max_idle_days * 86400,)).rowcount
+            self._db.commit()
+        return removed
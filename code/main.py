@@ -1,27 +1,56 @@
+import time
+# Start of this script run; the first run in a process also pays for every import below
+SCRIPT_STARTED = time.perf_counter()
 import streamlit as st
-import PyPDF2
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-import google.generativeai as genai
 import os
-import time
-import plotly.express as px
-import plotly.graph_objs as go
-from datetime import datetime
-import json
+import hashlib
 import re
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
+import uuid
+from datetime import datetime
 from dotenv import load_dotenv
-from reportlab.lib.units import inch
-from theme_manager import ThemeManager
+from theme_manager import ThemeManager, sidebar_image
+from corpus import Corpus, source_name
+from document_store import spooled_upload
+from engine import Engine
+from export_pipeline import EXPORT_FORMATS, start_export
+from ingest_jobs import DONE, FAILED, IngestQueue
+from analysis import SCOPE_DOCUMENT, SCOPE_EXCERPTS, make_history_entry
+from context_budget import DEFAULT_TOKEN_BUDGET
+from batch_query import failed_positions, parse_question_csv
+from history_store import HistoryStore
+from metrics import REGISTRY, serve_metrics, span
+from model_backends import BACKEND_ENV_VAR, DEFAULT_BACKEND
+from model_client import get_client
+from usage_analytics import default_analytics
+from startup import WARM_START, record_first_render, warm_start_in_background
+IMPORT_SECONDS = time.perf_counter() - SCRIPT_STARTED
 
 load_dotenv()
-# Theme Manager Initialization
-theme_manager = ThemeManager()
+MODEL_BACKEND = os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+HISTORY_PAGE_SIZE = 10
+EXPORT_LABELS = {'csv': "CSV", 'json': "JSON", 'jsonl': "JSON Lines", 'parquet': "Parquet", 'pdf': "PDF Report"}
+DEFAULT_MAX_HISTORY = 50
+# Server-wide usage trends (all sessions) under Settings; off unless the operator enables it
+ADMIN_VIEW = os.environ.get("DOCUGENIUS_ADMIN_VIEW", "").lower() in ("1", "true", "yes")
+# Single-user deployments can name the one user here; otherwise each browser keeps an id in the page URL
+USER_ENV_VAR = "DOCUGENIUS_USER"
+USER_QUERY_PARAM = "user"
+_USER_ID = re.compile(r"[0-9a-f]{32}")
+# Histories whose newest entry is older than this are deleted
+HISTORY_IDLE_DAYS = int(os.environ.get("DOCUGENIUS_HISTORY_IDLE_DAYS", "90"))
+ADMIN_WINDOWS = {
+    "Last hour (per minute)": ("minute", 60),
+    "Last 2 days (per hour)": ("hour", 48),
+    "Last 30 days (per day)": ("day", 30),
+}
+# Queue priority (as a size in bytes) of a URL, whose size is unknown until fetched
+URL_JOB_SIZE = 1 << 20
+# Theme Manager Initialization, kept across reruns so its CSS cache survives
+@st.cache_resource
+def get_theme_manager():
+    return ThemeManager()
+theme_manager = get_theme_manager()
 # Streamlit Page Configuration
 st.set_page_config(
     page_title="DocuGenius Pro",
@@ -32,9 +61,16 @@ st.set_page_config(
 # Initialize Session States
 def initialize_session_states():
     default_states = {
-        'extracted_text': "",
+        'document': None,
+        'corpus': Corpus(),
+        'batch_results': None,
         'processing_status': None,
-        'history': [],
+        'last_entry': None,
+        'export_jobs': [],
+        'ingest_jobs': [],
+        'collected_jobs': set(),
+        'shown_job': None,
+        'session_id': uuid.uuid4().hex,
         'usage_stats': {
             'total_processed': 0,
             'successful_queries': 0,
@@ -45,6 +81,127 @@ def initialize_session_states():
     for key, value in default_states.items():
         if key not in st.session_state:
             st.session_state[key] = value
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = resolve_user_id()
+# Stable across reloads and server restarts, unlike session_id: the signed-in account, DOCUGENIUS_USER,
+# or an id kept in the page URL so that a reload or bookmark finds the same history
+def resolve_user_id():
+    if os.environ.get(USER_ENV_VAR):
+        return os.environ[USER_ENV_VAR]
+    if st.user.get("is_logged_in") and st.user.get("email"):
+        return "account:" + hashlib.sha256(st.user.get("email").lower().encode("utf-8")).hexdigest()[:32]
+    user_id = st.query_params.get(USER_QUERY_PARAM, "")
+    if not _USER_ID.fullmatch(user_id):
+        user_id = uuid.uuid4().hex
+        st.query_params[USER_QUERY_PARAM] = user_id
+    return user_id
+# Headless engine (and its caches) shared by every session in this process
+@st.cache_resource
+def get_engine():
+    return Engine(model_factory=get_client(MODEL_BACKEND, os.environ.get("GEMINI_API_KEY")))
+# Warm start: charts, PDF reports, the Gemini SDK and theme assets load once per process, off the render path
+@st.cache_resource
+def start_warm_start():
+    return warm_start_in_background(MODEL_BACKEND, os.environ.get("GEMINI_API_KEY"), theme_manager)
+# Each session's key gets its own rate-limited client; keys never go into os.environ
+def session_api_key():
+    return st.session_state.get("gemini_api_key") or os.environ.get("GEMINI_API_KEY")
+def session_engine():
+    return get_engine().with_model_factory(get_client(MODEL_BACKEND, session_api_key()),
+                                           owner=st.session_state.session_id, user=st.session_state.user_id)
+# Persistent analysis history, kept on disk instead of in session state; one connection per process
+@st.cache_resource
+def get_shared_history_store():
+    return HistoryStore()
+# Deletes the histories of users gone for HISTORY_IDLE_DAYS; runs at most once an hour per process
+@st.cache_data(ttl=3600, show_spinner=False)
+def prune_inactive_history():
+    return get_shared_history_store().prune_inactive(HISTORY_IDLE_DAYS)
+# Each user reads, searches, trims and clears only their own entries
+def get_history_store():
+    return get_shared_history_store().for_owner(st.session_state.user_id)
+def record_history(entry):
+    store = get_history_store()
+    store.append(entry)
+    store.enforce_retention(st.session_state.get("max_history", DEFAULT_MAX_HISTORY))
+    default_analytics().record('queries', entry['type'], value=entry.get('latency'))
+    st.session_state.last_entry = entry
+def apply_history_retention():
+    get_history_store().enforce_retention(st.session_state.max_history)
+# Optional Prometheus scrape endpoint, started once per process
+@st.cache_resource
+def start_metrics_server():
+    port = os.environ.get("DOCUGENIUS_METRICS_PORT")
+    return serve_metrics(int(port)) if port else None
+# Background ingestion shared by every session in this process; identical uploads reuse the earlier result
+@st.cache_resource
+def get_ingest_queue():
+    return IngestQueue()
+# Sidebar pie chart, rebuilt only when the counts or theme change
+@st.cache_resource(max_entries=64, show_spinner=False)
+def build_usage_pie(file_type_counts, text_color):
+    import plotly.express as px
+    fig = px.pie(
+        values=[count for _, count in file_type_counts], 
+        names=[name for name, _ in file_type_counts], 
+        title="Document Type Distribution",
+        color_discrete_sequence=px.colors.sequential.Viridis
+    )
+    fig.update_layout(
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color=text_color),
+        margin=dict(l=10, r=10, t=30, b=10)
+    )
+    return fig
+# Add an ingested document to the session's corpus and make it the one queried next;
+# a new version of a file replaces the previous one
+def set_document(document):
+    revision = document.details.get('revision') if document.details else None
+    if revision and revision['previous_id'] in st.session_state.corpus:
+        remove_documents([revision['previous_id']])
+    if not st.session_state.corpus.add(document):
+        st.info("ℹ️ This content is already in your corpus; it was not processed again")
+    st.session_state.document = document
+    st.session_state.query_documents = [document.doc_id]
+    release_deselected_contexts()
+# Documents that leave the active selection free their cached model contexts unless another session uses them
+def release_deselected_contexts():
+    corpus = st.session_state.corpus
+    selected = set(st.session_state.get("query_documents") or [])
+    deselected = [doc_id for doc_id in st.session_state.get("active_documents", set()) - selected
+                  if doc_id in corpus]
+    if deselected:
+        engine = session_engine()
+        for doc_id in deselected:
+            engine.release_context(corpus.get(doc_id))
+    st.session_state.active_documents = selected
+def remove_documents(doc_ids):
+    corpus = st.session_state.corpus
+    engine = session_engine()
+    for doc_id in doc_ids:
+        document = corpus.remove(doc_id)
+        if document is not None:
+            # Free its cached model context unless another session still uses it
+            engine.release_context(document)
+    remaining = list(corpus)
+    if st.session_state.document is not None and st.session_state.document.doc_id in doc_ids:
+        st.session_state.document = remaining[-1] if remaining else None
+    st.session_state.query_documents = [doc_id for doc_id in st.session_state.get("query_documents", [])
+                                        if doc_id in corpus]
+    release_deselected_contexts()
+# What a question runs against: one document, or a corpus selection whose answers cite their sources
+def query_target():
+    doc_ids = st.session_state.get("query_documents") or []
+    if len(doc_ids) == 1:
+        return st.session_state.corpus.get(doc_ids[0]), st.session_state.input_type
+    return st.session_state.corpus.select(doc_ids), 'Corpus'
+def count_processed(file_type, count=1):
+    usage_stats = st.session_state.usage_stats
+    usage_stats['file_types'][file_type] += count
+    usage_stats['total_processed'] += count
+    usage_stats['processing_dates'].append(datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    default_analytics().record('documents', file_type, count=count)
 # Application Header
 def render_header():
     st.markdown("""
@@ -56,37 +213,119 @@ def render_header():
 # Sidebar Configuration
 def render_sidebar():
     with st.sidebar:
-        st.image("https://www.netlabsglobal.com/wp-content/uploads/2020/04/netlabs1-1920x960.jpg", caption="🤖 AI Document Assistant 🧠", use_container_width=True)
+        st.image(sidebar_image(), caption="🤖 AI Document Assistant 🧠", use_container_width=True)
         st.markdown("### 🔑 API Configuration")
-        api_key = st.text_input("Enter Gemini API Key", type="password")
+        api_key = st.text_input("Enter Gemini API Key", type="password", key="gemini_api_key")
         if api_key:
-            try:
-                genai.configure(api_key=api_key)
-                st.success("✅ API Key Validated Successfully!")
-                os.environ["GEMINI_API_KEY"] = api_key
-            except Exception as e:
-                st.error("❌ Invalid API Key. Please check and retry.")
+            st.success("✅ API Key set for this session")
         st.markdown("### 📊 Usage Dashboard")
         col1, col2 = st.columns(2)
         with col1:
             st.metric("Files Processed", st.session_state.usage_stats['total_processed'])
         with col2:
             st.metric("Successful Queries", st.session_state.usage_stats['successful_queries'])
-        file_types = st.session_state.usage_stats['file_types']
-        if sum(file_types.values()) > 0:
-            fig = px.pie(
-                values=list(file_types.values()), 
-                names=list(file_types.keys()), 
-                title="Document Type Distribution",
-                color_discrete_sequence=px.colors.sequential.Viridis
+        answer_cache = get_engine().answer_cache
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Cache Hits", answer_cache.hits)
+        with col2:
+            st.metric("Cache Misses", answer_cache.misses)
+        client_stats = get_client(MODEL_BACKEND, session_api_key()).stats()
+        if client_stats['requests']:
+            st.caption(
+                f"Model requests: {client_stats['requests']} · retries: {client_stats['retries']} · "
+                f"shared in-flight: {client_stats['coalesced']} · "
+                f"rate-limit wait: {client_stats['throttled_seconds']:.1f}s"
             )
-            fig.update_layout(
-                paper_bgcolor='rgba(0,0,0,0)',
-                plot_bgcolor='rgba(0,0,0,0)',
-                font=dict(color=theme_manager.themes["Dark"]["text_color"]),
-                margin=dict(l=10, r=10, t=30, b=10)
+        if client_stats['context_hits']:
+            st.caption(
+                f"Cached document context: {client_stats['context_hits']} follow-up(s), "
+                f"~{client_stats['context_tokens_saved']:,} tokens not resent"
+            )
+        jobs = get_ingest_queue().stats()
+        if jobs['queued'] or jobs['running']:
+            st.caption(f"Processing jobs: {jobs['running']} running · {jobs['queued']} queued "
+                       f"(all users, {jobs['workers']} workers)")
+        memory = get_engine().documents.stats()
+        if memory['resident_documents']:
+            st.caption(
+                f"Documents in memory: {memory['resident_documents']} · "
+                f"{memory['resident_mb']:.1f} of {memory['budget_mb']:.0f} MB · "
+                f"evicted to disk: {memory['evictions']}"
             )
+        file_types = st.session_state.usage_stats['file_types']
+        if sum(file_types.values()) > 0:
+            fig = build_usage_pie(tuple(file_types.items()), theme_manager.themes["Dark"]["text_color"])
             st.plotly_chart(fig, use_container_width=True)
+        processing_dates = st.session_state.usage_stats['processing_dates']
+        if processing_dates:
+            st.caption(f"Last document processed {processing_dates[-1]}")
+        stage_latency = REGISTRY.snapshot()
+        if stage_latency:
+            with st.expander("⏱️ Stage Latency"):
+                st.dataframe(
+                    pd.DataFrame([
+                        {'Stage': stage, 'Count': summary['count'],
+                         'p50 ms': round(summary['p50'] * 1000, 1),
+                         'p95 ms': round(summary['p95'] * 1000, 1),
+                         'p99 ms': round(summary['p99'] * 1000, 1)}
+                        for stage, summary in stage_latency.items()
+                    ]),
+                    hide_index=True,
+                    use_container_width=True
+                )
+# Server-wide trend charts, rebuilt only when their rollups change
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_throughput_chart(starts, series, title, text_color):
+    import plotly.graph_objects as go
+    times = [datetime.fromtimestamp(start) for start in starts]
+    fig = go.Figure([go.Bar(x=times, y=counts, name=label or "all") for label, counts in series])
+    fig.update_layout(
+        title=title,
+        barmode='stack',
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color=text_color),
+        margin=dict(l=10, r=10, t=40, b=10)
+    )
+    return fig
+@st.cache_resource(max_entries=16, show_spinner=False)
+def build_latency_chart(starts, means, text_color):
+    import plotly.graph_objects as go
+    times = [datetime.fromtimestamp(start) for start in starts]
+    fig = go.Figure([go.Scatter(x=times, y=[None if mean is None else mean * 1000 for mean in means],
+                                mode='lines+markers', connectgaps=False, name="mean latency")])
+    fig.update_layout(
+        title="Mean query latency (ms)",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font=dict(color=text_color),
+        margin=dict(l=10, r=10, t=40, b=10)
+    )
+    return fig
+@st.fragment(run_every=30)
+def render_admin_view():
+    analytics = default_analytics()
+    st.markdown("#### 📈 Server Usage (all sessions)")
+    resolution, buckets = ADMIN_WINDOWS[st.selectbox("Window", list(ADMIN_WINDOWS), key="admin_window")]
+    documents_today = analytics.totals('documents')
+    queries_today = analytics.totals('queries')
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Documents Today", sum(count for count, _, _ in documents_today.values()))
+    with col2:
+        st.metric("Queries Today", sum(count for count, _, _ in queries_today.values()))
+    with col3:
+        timed = [(count, mean) for count, mean, _ in queries_today.values() if mean is not None]
+        total = sum(count for count, _ in timed)
+        st.metric("Mean Latency", f"{sum(count * mean for count, mean in timed) / total:.2f}s" if total else "-")
+    text_color = theme_manager.themes["Dark"]["text_color"]
+    for metric, title in (('documents', "Documents processed"), ('queries', "Queries answered")):
+        starts, series, _ = analytics.timeline(metric, resolution, buckets)
+        st.plotly_chart(build_throughput_chart(starts, tuple(series.items()), title, text_color),
+                        use_container_width=True, key=f"admin_{metric}")
+    starts, _, means = analytics.timeline('queries', resolution, buckets)
+    st.plotly_chart(build_latency_chart(starts, means, text_color), use_container_width=True, key="admin_latency")
 # Text Processing Function
 def process_text_input(text_input):
     if text_input:
@@ -95,137 +334,267 @@ def process_text_input(text_input):
             for i in range(100):
                 time.sleep(0.01)
                 progress_bar.progress(i + 1)
-            st.session_state.extracted_text = text_input
-            st.session_state.usage_stats['file_types']['Text'] += 1
-            st.session_state.usage_stats['total_processed'] += 1
+            set_document(get_engine().ingest_text(text_input))
+            count_processed('Text')
             st.success("✅ Text processed successfully!")
             return True
     return False
+# Queue an ingestion for this session; the jobs panel reports it and collects the document when done
+def submit_ingest(kind, name, size, run, key=None):
+    job = get_ingest_queue().submit(st.session_state.session_id, kind, name, size, run, key=key)
+    st.session_state.ingest_jobs.append(job.id)
+    return job
 # PDF Processing Function
 def process_pdf_input(pdf_file):
     if pdf_file:
-        with st.spinner("Processing PDF..."):
-            try:
-                pdf_reader = PyPDF2.PdfReader(pdf_file)
-                text = ""
-                progress_bar = st.progress(0)
-                for i, page in enumerate(pdf_reader.pages):
-                    text += page.extract_text() + "\n"
-                    progress_bar.progress((i + 1) / len(pdf_reader.pages))
-                st.session_state.extracted_text = text
-                st.session_state.usage_stats['file_types']['PDF'] += 1
-                st.session_state.usage_stats['total_processed'] += 1
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.metric("Pages", len(pdf_reader.pages))
-                with col2:
-                    st.metric("Words", len(text.split()))
-                with col3:
-                    st.metric("Characters", len(text))
-                st.success("✅ PDF processed successfully!")
-                return True
-            except Exception as e:
-                st.error(f"❌ Error processing PDF: {str(e)}")
-    return False
+        engine = session_engine()
+        workers = st.session_state.get("pdf_workers")
+        digest = hashlib.sha256(pdf_file.getbuffer()).hexdigest()
+        def run(job):
+            # Workers read the spooled file instead of each receiving a copy of the upload
+            with spooled_upload(pdf_file, suffix=".pdf") as (pdf_path, _):
+                return engine.ingest_pdf(pdf_path, max_workers=workers, source=pdf_file.name,
+                                         on_progress=lambda done, total: job.report(done, total, "pages"))
+        # Revisions are tracked per session, so the result is only reused within this session
+        return submit_ingest('PDF', pdf_file.name, pdf_file.size, run,
+                             key=("pdf", digest, pdf_file.name, st.session_state.user_id))
+    return None
+def render_pdf_result(document):
+    details = document.details
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Pages", details['pages'])
+    with col2:
+        st.metric("Words", details['words'])
+    with col3:
+        st.metric("Characters", len(document.text))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Pages/sec", f"{details['pages_per_second']:.1f}")
+    with col2:
+        st.metric("Pages from Cache", details['cached_pages'])
+    with col3:
+        if details['peak_rss_growth_mb'] is not None:
+            st.metric("Memory Growth", f"{details['peak_rss_growth_mb']:.0f} MB",
+                      help="How much extraction raised peak memory use: of the largest worker process, "
+                           "or of the app itself for small PDFs")
+    if 'revision' in details:
+        revision = details['revision']
+        st.info(f"🔁 New version of {document.source}: {revision['unchanged_pages']}/{revision['pages']} pages "
+                f"and {revision['unchanged_chunks']}/{revision['chunks']} chunks unchanged; "
+                f"answers about unchanged passages are reused")
+    st.success("✅ PDF processed successfully!")
 # CSV Processing Function
 def process_csv_input(csv_file):
     if csv_file:
-        with st.spinner("Processing CSV..."):
-            try:
-                # Try different CSV parsing options if the default fails
-                try:
-                    df = pd.read_csv(csv_file)
-                except pd.errors.ParserError:
-                    # Try with different separator
-                    try:
-                        df = pd.read_csv(csv_file, sep=';')
-                    except:
-                        # Try with error handling
-                        df = pd.read_csv(csv_file, error_bad_lines=False, warn_bad_lines=True)
-                
-                st.session_state.extracted_text = df.to_string()
-                st.session_state.usage_stats['file_types']['CSV'] += 1
-                st.session_state.usage_stats['total_processed'] += 1
-                preview_tab, stats_tab, viz_tab = st.tabs(["Preview", "Statistics", "Visualization"])
-                with preview_tab:
-                    st.dataframe(df.head(), use_container_width=True)
-                with stats_tab:
-                    st.markdown("#### 📊 Data Statistics")
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.metric("Rows", df.shape[0])
-                        st.metric("Columns", df.shape[1])
-                    with col2:
-                        st.metric("Missing Values", df.isna().sum().sum())
-                        st.metric("Duplicate Rows", df.duplicated().sum())
-                with viz_tab:
-                    if df.select_dtypes(include=['float64', 'int64']).columns.any():
-                        numeric_col = st.selectbox("Select column for visualization", 
-                            df.select_dtypes(include=['float64', 'int64']).columns)
-                        fig = px.histogram(df, x=numeric_col)
-                        fig.update_layout(
-                            paper_bgcolor='rgba(0,0,0,0)',
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            font=dict(color=theme_manager.themes["Dark"]["text_color"]),
-                            margin=dict(l=20, r=20, t=30, b=20)
-                        )
-                        st.plotly_chart(fig, use_container_width=True)
-                st.success("✅ CSV processed successfully!")
-                return True
-            except Exception as e:
-                # Provide a more user-friendly error message
-                st.error(f"❌ Error processing CSV: The file appears to be invalid or corrupted. Please check the format and try again.")
-                st.info("Try checking for: irregular delimiters, mixed data types, or special characters in your CSV file.")
-    return False
+        engine = session_engine()
+        digest = hashlib.sha256(csv_file.getbuffer()).hexdigest()
+        def run(job):
+            return engine.ingest_csv(csv_file, source=csv_file.name,
+                                     on_progress=lambda done, total: job.report(done / 2**20, total / 2**20, "MB"))
+        return submit_ingest('CSV', csv_file.name, csv_file.size, run,
+                             key=("csv", digest, csv_file.name, st.session_state.user_id))
+    return None
+def render_csv_result(document):
+    dataset = document.dataset
+    if 'revision' in document.details:
+        revision = document.details['revision']
+        st.info(f"🔁 New version of {document.source}: {revision['reused_blocks']}/{revision['blocks']} "
+                f"row blocks reused from the previous upload")
+    preview_tab, stats_tab, viz_tab = st.tabs(["Preview", "Statistics", "Visualization"])
+    with preview_tab:
+        st.dataframe(dataset.head, use_container_width=True)
+    with stats_tab:
+        st.markdown("#### 📊 Data Statistics")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Rows", dataset.rows)
+            st.metric("Columns", len(dataset.columns))
+        with col2:
+            st.metric("Missing Values", dataset.missing_values)
+            st.metric("Duplicate Rows", dataset.duplicate_rows)
+    with viz_tab:
+        if dataset.numeric_columns:
+            import plotly.express as px
+            numeric_col = st.selectbox("Select column for visualization", 
+                dataset.numeric_columns)
+            counts, edges = dataset.histogram(numeric_col)
+            fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts,
+                labels={'x': numeric_col, 'y': 'count'})
+            fig.update_layout(
+                bargap=0,
+                paper_bgcolor='rgba(0,0,0,0)',
+                plot_bgcolor='rgba(0,0,0,0)',
+                font=dict(color=theme_manager.themes["Dark"]["text_color"]),
+                margin=dict(l=20, r=20, t=30, b=20)
+            )
+            st.plotly_chart(fig, use_container_width=True)
+    st.success("✅ CSV processed successfully!")
 # URL Processing Function
 def process_url_input(url_input):
     if url_input:
-        with st.spinner("Processing URL..."):
-            try:
-                response = requests.get(url_input)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                text = " ".join([p.get_text() for p in soup.find_all(['p', 'article', 'div'])])
-                st.session_state.extracted_text = text
-                st.session_state.usage_stats['file_types']['URL'] += 1
-                st.session_state.usage_stats['total_processed'] += 1
-                st.success("✅ URL content extracted successfully!")
-                with st.expander("📱 Page Preview"):
-                    st.markdown(f""" 
-                    <iframe src="{url_input}" width="100%" height="400" 
-                    style="border: 1px solid #ddd; border-radius: 8px;"> </iframe> 
-                    """, unsafe_allow_html=True)
-                return True
-            except Exception as e:
-                st.error(f"❌ Error processing URL: {str(e)}")
-    return False
+        engine = get_engine()
+        def run(job):
+            return engine.ingest_url(url_input)
+        # Page size is unknown until fetched; rank a URL like a mid-sized upload
+        return submit_ingest('URL', url_input, URL_JOB_SIZE, run)
+    return None
+def render_url_result(document):
+    st.success("✅ URL content extracted successfully!"
+        + (" (unchanged since last fetch, served from cache)" if document.details.get('from_cache') else ""))
+    if isinstance(document.source, str):
+        with st.expander("📱 Page Preview"):
+            st.markdown(f""" 
+            <iframe src="{document.source}" width="100%" height="400" 
+            style="border: 1px solid #ddd; border-radius: 8px;"> </iframe> 
+            """, unsafe_allow_html=True)
+# Multiple URL Processing Function
+def process_urls_input(urls):
+    urls = [url.strip() for url in urls if url.strip()]
+    if urls:
+        engine = get_engine()
+        def run(job):
+            document, failures = engine.ingest_urls(urls)
+            for url, error in failures.items():
+                job.warnings.append(f"Skipped {url}: {error}")
+            if document is None:
+                raise ValueError("None of the URLs could be fetched")
+            return document
+        return submit_ingest('URL', f"{len(urls)} URLs", URL_JOB_SIZE * len(urls), run)
+    return None
+# Hand finished jobs' documents to the session, once each; returns the jobs collected in this run
+def collect_ingest_jobs():
+    queue = get_ingest_queue()
+    collected = []
+    for job_id in st.session_state.ingest_jobs:
+        job = queue.get(job_id)
+        if job is None or not job.done or job_id in st.session_state.collected_jobs:
+            continue
+        st.session_state.collected_jobs.add(job_id)
+        collected.append(job)
+        if job.status != DONE:
+            continue
+        set_document(job.result)
+        count_processed(job.kind, job.result.details.get('pages', 1) if job.kind == 'URL' else 1)
+        st.session_state.shown_job = job_id
+    return collected
+@st.fragment(run_every=0.5)
+def poll_ingest_jobs():
+    queue = get_ingest_queue()
+    jobs = [queue.get(job_id) for job_id in st.session_state.ingest_jobs]
+    active = [job for job in jobs if job is not None and not job.done]
+    for job in active:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.progress(job.progress, text=f"{job.kind} · {job.name}: {job.status}, {job.message}")
+        with col2:
+            if st.button("Cancel", key=f"cancel_{job.id}"):
+                queue.cancel(job.id)
+    if not active:
+        st.rerun()
+def render_ingest_jobs():
+    collected = collect_ingest_jobs()
+    queue = get_ingest_queue()
+    jobs = [job for job in map(queue.get, st.session_state.ingest_jobs) if job is not None]
+    if any(not job.done for job in jobs):
+        poll_ingest_jobs()
+    finished = [job for job in jobs if job.done]
+    for job in collected:
+        for warning in job.warnings:
+            st.warning(f"⚠️ {job.name}: {warning}")
+        if job.status == FAILED:
+            st.error(f"❌ Error processing {job.name}: {job.error}")
+    if finished:
+        with st.expander(f"🧾 Processing Jobs ({len(finished)} finished)"):
+            st.dataframe(
+                pd.DataFrame([
+                    {'Job': job.id, 'Type': job.kind, 'Name': job.name, 'Status': job.status,
+                     'Seconds': job.elapsed, 'Note': job.error or job.message}
+                    for job in reversed(finished)
+                ]),
+                hide_index=True,
+                use_container_width=True
+            )
+            if st.button("Clear Finished Jobs"):
+                for job in finished:
+                    queue.forget(job.id)
+                st.session_state.ingest_jobs = [job.id for job in jobs if not job.done]
+                st.rerun()
+    shown = queue.get(st.session_state.shown_job) if st.session_state.shown_job else None
+    document = st.session_state.document
+    if shown is None or shown.status != DONE or document is None or shown.result.doc_id != document.doc_id:
+        return
+    if shown.kind == 'PDF':
+        render_pdf_result(document)
+    elif shown.kind == 'CSV':
+        render_csv_result(document)
+    else:
+        render_url_result(document)
+    with st.expander("📋 Processed Content Preview"):
+        # Only the first block of the stored text is decoded
+        st.text_area("Preview", document.text.preview(1000), height=200, disabled=True)
 # Document Analysis Function
 def analyze_document(api_key, query):
-    if not api_key:
+    if not api_key and MODEL_BACKEND == "gemini":
         st.warning("⚠️ Please configure your Gemini API Key in the sidebar first!")
         return None
     with st.spinner("🧠 Analyzing document..."):
         try:
-            model = genai.GenerativeModel('gemini-1.5-flash-latest')
-            prompt = f"""
-            Based on the following content, provide a detailed and accurate answer to the question.
-            Content: {st.session_state.extracted_text}
-            Question: {query}
-            Please provide a clear and concise answer based only on the provided content.
-            """
-            response = model.generate_content(prompt)
-            answer = response.text
+            stream = st.session_state.get("stream_responses", True)
+            stream_placeholder = st.empty() if stream else None
+            target, label = query_target()
+            entry = session_engine().ask(
+                target,
+                query,
+                label=label,
+                near_duplicates=st.session_state.get("cache_near_duplicates", False),
+                scope=st.session_state.get("answer_scope", SCOPE_EXCERPTS),
+                token_budget=st.session_state.get("token_budget"),
+                stream=stream,
+                on_chunk=(lambda partial: stream_placeholder.markdown(partial + "▌")) if stream else None
+            )
+            if stream_placeholder is not None:
+                stream_placeholder.empty()
             # Store in history
-            st.session_state.history.append({
-                'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'query': query,
-                'answer': answer,
-                'type': st.session_state.input_type
-            })
+            record_history(entry)
             st.session_state.usage_stats['successful_queries'] += 1
-            return answer
+            return entry['answer']
         except Exception as e:
             st.error(f"❌ Error during analysis: {str(e)}")
             return None
+# Batch Analysis Function
+def analyze_batch(api_key, questions, max_workers, positions=None):
+    if not api_key and MODEL_BACKEND == "gemini":
+        st.warning("⚠️ Please configure your Gemini API Key in the sidebar first!")
+        return None
+    engine = session_engine()
+    target, label = query_target()
+    options = dict(
+        near_duplicates=st.session_state.get("cache_near_duplicates", False),
+        scope=st.session_state.get("answer_scope", SCOPE_EXCERPTS),
+        token_budget=st.session_state.get("token_budget")
+    )
+    progress_bar = st.progress(0)
+    def report_progress(done, total):
+        progress_bar.progress(done / total, text=f"Answered {done}/{total} questions")
+    if positions is None:
+        rows = engine.ask_many(target, questions, max_workers=max_workers,
+                               on_progress=report_progress, **options)
+        positions = range(len(rows))
+    else:
+        rows = engine.retry(target, st.session_state.batch_results, positions,
+                            max_workers=max_workers, on_progress=report_progress, **options)
+    for position in positions:
+        row = rows[position]
+        details = {key: value for key, value in row.items() if key not in ('#', 'question', 'answer')}
+        answer = row['answer'] if row['status'] == 'ok' else f"❌ Failed: {row['error']}"
+        record_history(
+            make_history_entry(row['question'], answer, label, batch=True, **details)
+        )
+        if row['status'] == 'ok':
+            st.session_state.usage_stats['successful_queries'] += 1
+    st.session_state.batch_results = rows
+    return rows
 # Reset Usage Statistics Function
 def reset_usage_stats():
     st.session_state.usage_stats = {
@@ -234,62 +603,93 @@ def reset_usage_stats():
         'processing_dates': [],
         'file_types': {'PDF': 0, 'CSV': 0, 'URL': 0, 'Text': 0}
     }
-    st.session_state.history = []
+    get_history_store().clear()
+    st.session_state.last_entry = None
     st.success("Usage statistics and history have been reset!")
-# PDF Report Generation Function
-def generate_pdf_report(history, filename="docugenius_history_report.pdf"):
-    try:
-        doc = SimpleDocTemplate(filename, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
-        # Define custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Title'],
-            fontSize=16,
-            spaceAfter=20
-        )
-        heading_style = ParagraphStyle(
-            'Heading',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=10
-        )
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=5
+# Export Functions: jobs run on a background pool and finish into in-memory buffers
+def start_history_exports(formats):
+    store = get_history_store()
+    total = store.count()
+    if total == 0:
+        st.warning("No history data to export!")
+        return
+    type_counts = store.type_counts()
+    jobs = []
+    for export_format in formats:
+        options = {'type_counts': type_counts} if export_format == "pdf" else {}
+        jobs.append(start_export(store.iter_entries, export_format, total=total, **options))
+    st.session_state.export_jobs = jobs
+@st.fragment(run_every=0.5)
+def poll_export_jobs():
+    jobs = st.session_state.export_jobs
+    for job in jobs:
+        st.progress(job.progress, text=f"{EXPORT_LABELS[job.format]}: {job.rows_written}/{job.total} entries")
+    if all(job.done for job in jobs):
+        st.rerun()
+def render_export_jobs():
+    jobs = st.session_state.export_jobs
+    if not jobs:
+        return
+    if not all(job.done for job in jobs):
+        poll_export_jobs()
+        return
+    for job in jobs:
+        if job.error:
+            st.error(f"{EXPORT_LABELS[job.format]} export failed: {job.error}")
+        else:
+            st.download_button(
+                f"⬇️ Download {EXPORT_LABELS[job.format]} ({len(job.data) / 1024:,.0f} KB, {job.elapsed:.1f}s)",
+                data=job.data,
+                file_name=job.file_name,
+                mime=job.media_type,
+                key=f"download_{job.format}"
+            )
+            if job.truncated:
+                st.warning(f"{job.truncated} item(s) were too large for a page and are marked as omitted "
+                           f"in the {EXPORT_LABELS[job.format]}")
+# Batch Analysis Panel
+def render_batch_analysis():
+    source = st.radio("Question Source", ["Paste Questions", "Upload CSV"], horizontal=True)
+    questions = []
+    if source == "Paste Questions":
+        pasted = st.text_area("Enter one question per line", height=200)
+        questions = [line.strip() for line in pasted.splitlines() if line.strip()]
+    else:
+        questions_file = st.file_uploader("Drop a CSV with a 'question' column", type=["csv"])
+        if questions_file:
+            questions = parse_question_csv(questions_file)
+    workers = st.slider("Concurrent Requests", min_value=1, max_value=16, value=4)
+    if st.button(f"🤖 Analyze {len(questions)} Questions", key="batch_btn", disabled=not questions):
+        analyze_batch(session_api_key(), questions, workers)
+    rows = st.session_state.get("batch_results")
+    if rows:
+        failed = failed_positions(rows)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Answered", len(rows) - len(failed))
+        with col2:
+            st.metric("Failed", len(failed))
+        with col3:
+            latencies = [row['latency'] for row in rows if row.get('latency') is not None]
+            st.metric("Mean Latency", f"{sum(latencies) / len(latencies):.2f}s" if latencies else "-")
+        columns = ['#', 'question', 'status', 'answer', 'latency', 'attempts', 'cached', 'error']
+        if any(row.get('route') for row in rows):
+            # CSV questions: which path (pandas or the model) answered each one
+            columns.insert(4, 'route')
+        st.dataframe(
+            pd.DataFrame(rows, columns=columns),
+            use_container_width=True, hide_index=True
         )
-        # Add title
-        elements.append(Paragraph("DocuGenius Pro Analysis History Report", title_style))
-        elements.append(Paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", normal_style))
-        elements.append(Spacer(1, 0.25*inch))       
-        # Add summary info
-        elements.append(Paragraph("Summary", heading_style))
-        elements.append(Paragraph(f"Total Queries: {len(history)}", normal_style))
-        file_types = {}
-        for entry in history:
-            if entry['type'] in file_types:
-                file_types[entry['type']] += 1
-            else:
-                file_types[entry['type']] = 1
-        file_type_text = ", ".join([f"{doc_type}: {count}" for doc_type, count in file_types.items()])
-        elements.append(Paragraph(f"Document Types: {file_type_text}", normal_style))
-        elements.append(Spacer(1, 0.25*inch))
-        # Add history entries
-        elements.append(Paragraph("Analysis History", heading_style))
-        for idx, entry in enumerate(history):
-            elements.append(Paragraph(f"Entry #{idx+1} - {entry['timestamp']} ({entry['type']})", heading_style))
-            elements.append(Paragraph(f"<b>Query:</b> {entry['query']}", normal_style))
-            elements.append(Paragraph(f"<b>Answer:</b> {entry['answer']}", normal_style))
-            elements.append(Spacer(1, 0.15*inch))
-        # Build and save PDF
-        doc.build(elements)
-        return filename
-    except Exception as e:
-        st.error(f"Failed to generate PDF report: {str(e)}")
-        return None
+        if failed:
+            retry_selection = st.multiselect(
+                "Failed questions to retry",
+                failed,
+                default=failed,
+                format_func=lambda position: f"#{rows[position]['#']}: {rows[position]['question']}"
+            )
+            if st.button("🔁 Retry Selected", disabled=not retry_selection):
+                analyze_batch(session_api_key(), None, workers, positions=retry_selection)
+                st.rerun()
 # Main Application
 def main():
     initialize_session_states()
@@ -308,38 +708,84 @@ def main():
             horizontal=True
         )
         st.session_state.input_type = input_type
-        processing_success = False
+        text_processed = False
         if input_type == "Text Input":
             text_input = st.text_area("Enter Your Text", height=200)
             if st.button("Process Text"):
-                processing_success = process_text_input(text_input)
+                text_processed = process_text_input(text_input)
         elif input_type == "PDF Upload":
             pdf_file = st.file_uploader("Drop your PDF here", type=["pdf"])
             if st.button("Process PDF"):
-                processing_success = process_pdf_input(pdf_file)
+                process_pdf_input(pdf_file)
         elif input_type == "CSV Upload":
             csv_file = st.file_uploader("Drop your CSV here", type=["csv"])
             if st.button("Process CSV"):
-                processing_success = process_csv_input(csv_file)
+                process_csv_input(csv_file)
         elif input_type == "Web URL":
-            url_input = st.text_input("Enter URL")
-            if st.button("Process URL"):
-                processing_success = process_url_input(url_input)
-        if processing_success and st.session_state.extracted_text:
+            if st.checkbox("Fetch multiple URLs"):
+                urls_input = st.text_area("Enter one URL per line", height=150)
+                if st.button("Process URLs"):
+                    process_urls_input(urls_input.splitlines())
+            else:
+                url_input = st.text_input("Enter URL")
+                if st.button("Process URL"):
+                    process_url_input(url_input)
+        # Uploads are processed in the background; finished jobs are picked up on the next rerun
+        render_ingest_jobs()
+        if text_processed and st.session_state.document is not None:
             with st.expander("📋 Processed Content Preview"):
-                preview_text = st.session_state.extracted_text[:1000] + "..." \
-                    if len(st.session_state.extracted_text) > 1000 \
-                    else st.session_state.extracted_text
+                # Only the first block of the stored text is decoded
+                preview_text = st.session_state.document.text.preview(1000)
                 st.text_area("Preview", preview_text, height=200, disabled=True)
+        corpus = st.session_state.corpus
+        if len(corpus):
+            with st.expander(f"🗂️ Your Corpus ({len(corpus)} documents)"):
+                st.dataframe(
+                    pd.DataFrame([
+                        {'Label': row['label'], 'Name': row['name'], 'Type': row['type'],
+                         'Characters': row['characters'], 'Added': row['added']}
+                        for row in corpus.describe()
+                    ]),
+                    hide_index=True,
+                    use_container_width=True
+                )
+                to_remove = st.multiselect("Remove documents", [document.doc_id for document in corpus],
+                                           format_func=lambda doc_id: f"{corpus.label(doc_id)} · {source_name(corpus.get(doc_id))}")
+                if to_remove and st.button("🗑️ Remove Selected"):
+                    remove_documents(to_remove)
+                    st.rerun()
     with tab2:
         st.markdown("### 🔍 Document Analysis")
-        if st.session_state.extracted_text:
-            query = st.text_input(
-                "What would you like to know about your document?",
-                placeholder="e.g., 'Summarize the main points' or 'What are the key insights?'"
+        corpus = st.session_state.corpus
+        if len(corpus):
+            st.multiselect(
+                "Documents to query",
+                [document.doc_id for document in corpus],
+                format_func=lambda doc_id: f"{corpus.label(doc_id)} · {source_name(corpus.get(doc_id))}",
+                key="query_documents",
+                on_change=release_deselected_contexts
             )
-            if st.button("🤖 Analyze", key="analyze_btn"):
-                answer = analyze_document(os.environ.get("GEMINI_API_KEY"), query)
+        if len(corpus) and not st.session_state.get("query_documents"):
+            st.info("Select at least one document to query")
+        elif len(corpus):
+            analysis_mode = st.radio("Mode", ["Single Question", "Batch Questions"], horizontal=True)
+            st.radio(
+                "Answer From",
+                [SCOPE_EXCERPTS, SCOPE_DOCUMENT],
+                format_func={SCOPE_EXCERPTS: "Most relevant excerpts", SCOPE_DOCUMENT: "Whole document"}.get,
+                horizontal=True,
+                key="answer_scope"
+            )
+            query = ""
+            if analysis_mode == "Batch Questions":
+                render_batch_analysis()
+            else:
+                query = st.text_input(
+                    "What would you like to know about your document?",
+                    placeholder="e.g., 'Summarize the main points' or 'What are the key insights?'"
+                )
+            if analysis_mode == "Single Question" and st.button("🤖 Analyze", key="analyze_btn"):
+                answer = analyze_document(session_api_key(), query)
                 if answer:
                     selected_theme = st.session_state.get("theme_selector", "Dark")
                     accent_color = theme_manager.themes[selected_theme]["accent_color"]
@@ -353,12 +799,61 @@ def main():
                     <div style='line-height: 1.6;'>{answer}</div>
                     </div>
                     """, unsafe_allow_html=True)
+                    last_entry = st.session_state.last_entry
+                    if last_entry.get('route') == 'pandas':
+                        timing = (f"computed in {last_entry['compute_time'] * 1000:.1f} ms, "
+                                  if 'compute_time' in last_entry else "")
+                        st.caption(
+                            f"🧮 Answered from the data with pandas · {last_entry['operation']} · "
+                            f"{timing}{last_entry['latency'] * 1000:.0f} ms in total"
+                            + (" · model used only to phrase the result" if last_entry.get('llm_calls') else "")
+                        )
+                    elif last_entry.get('route') == 'llm':
+                        st.caption(f"🤖 Not a table lookup; answered by the model in {last_entry['latency']:.2f}s")
+                    if last_entry.get('reused_evidence'):
+                        st.caption("⚡ Reused the answer from an earlier version of this document (same passages)")
+                    elif last_entry.get('cached'):
+                        st.caption("⚡ Served from answer cache")
+                    elif 'generation_time' in last_entry:
+                        st.caption(
+                            f"⏱️ First token after {last_entry['time_to_first_token']:.2f}s · "
+                            f"total generation {last_entry['generation_time']:.2f}s · "
+                            f"{last_entry['strategy'].replace('_', '-')} strategy, "
+                            f"{last_entry['llm_calls']} model call(s), ~{last_entry['tokens_spent']:,} tokens"
+                        )
+                    if last_entry.get('truncated'):
+                        st.warning(f"⚠️ Even summarised, the document did not fit the prompt token budget; this answer "
+                                   f"covers only the first {last_entry['covered_share']:.0%} of it. Raise the "
+                                   f"Prompt Token Budget in Settings to cover all of it.")
+                    if last_entry.get('context_cache') == 'hit':
+                        st.caption(f"♻️ Document reused from the model's context cache · "
+                                   f"~{last_entry['tokens_saved']:,} tokens not resent")
+                    elif last_entry.get('context_cache') == 'created':
+                        st.caption(f"♻️ Document ({last_entry['cached_tokens']:,} tokens) cached for follow-up questions")
+                    if last_entry.get('sources'):
+                        st.caption("📎 Sources: " + " · ".join(
+                            f"[{source['label']}] {source['source']} (chunks {', '.join(map(str, source['chunks']))})"
+                            for source in last_entry['sources']
+                        ))
         else:
             st.info("Please process a document first before analysis")
     with tab3:
         st.markdown("### 📚 Analysis History")
-        if st.session_state.history:
-            for idx, entry in enumerate(reversed(st.session_state.history)):
+        history_store = get_history_store()
+        search_col, type_col = st.columns([2, 1])
+        with search_col:
+            history_search = st.text_input("Search queries and answers", key="history_search")
+        with type_col:
+            history_types = st.multiselect("Document Type", history_store.types(), key="history_types")
+        matching = history_store.count(search=history_search, doc_types=history_types)
+        if matching:
+            pages = (matching + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+            page_number = 1
+            if pages > 1:
+                page_number = st.selectbox("Page", range(1, pages + 1), key="history_page")
+            offset = (page_number - 1) * HISTORY_PAGE_SIZE
+            st.caption(f"Showing {offset + 1}-{min(offset + HISTORY_PAGE_SIZE, matching)} of {matching} entries")
+            for entry in history_store.page(offset, HISTORY_PAGE_SIZE, search=history_search, doc_types=history_types):
                 selected_theme = st.session_state.get("theme_selector", "Dark")
                 bg_color = theme_manager.themes[selected_theme]["sidebar_background"]
                 accent_color = theme_manager.themes[selected_theme]["accent_color"]
@@ -387,12 +882,12 @@ def main():
                  border-left: 3px solid {info_color}; 
                  padding: 15px; 
                  border-radius: 5px;'>
-            <p style='margin: 0;'>No analysis history yet. Perform an analysis to see it here.</p>
+            <p style='margin: 0;'>{'No analysis history matches your search.' if history_search or history_types else 'No analysis history yet. Perform an analysis to see it here.'}</p>
             </div>
             """, unsafe_allow_html=True)
     with tab4:
         st.markdown("### ⚙️ Application Settings")
-        settings_tabs = st.tabs(["General", "Appearance", "Export"])
+        settings_tabs = st.tabs(["General", "Appearance", "Export"] + (["Server Usage"] if ADMIN_VIEW else []))
         with settings_tabs[0]:
             st.markdown("#### 🔧 General Settings")
             default_model = st.selectbox(
@@ -403,11 +898,38 @@ def main():
                 "Maximum Analysis History", 
                 min_value=5, 
                 max_value=100, 
-                value=50
+                value=DEFAULT_MAX_HISTORY,
+                key="max_history",
+                on_change=apply_history_retention
             )
             st.markdown("#### 🔒 Privacy Options")
             st.checkbox("Automatically clear history after session")
             st.checkbox("Anonymize document content")
+            st.checkbox("Stream responses as they are generated", value=True, key="stream_responses")
+            st.number_input(
+                "Prompt Token Budget",
+                min_value=4_000,
+                max_value=1_000_000,
+                value=DEFAULT_TOKEN_BUDGET,
+                step=4_000,
+                help="Prompts estimated above this size are answered with map-reduce over document summaries.",
+                key="token_budget"
+            )
+            st.slider(
+                "PDF Extraction Workers",
+                min_value=1,
+                max_value=max(os.cpu_count() or 1, 2),
+                value=os.cpu_count() or 1,
+                key="pdf_workers"
+            )
+            st.markdown("#### ⚡ Answer Cache")
+            st.checkbox(
+                "Treat questions differing only in case, spacing or punctuation as identical",
+                key="cache_near_duplicates"
+            )
+            if st.button("Clear Answer Cache"):
+                get_engine().answer_cache.clear()
+                st.success("Answer cache cleared!")
         with settings_tabs[1]:
             st.markdown("#### 🎨 Appearance Customization")
             theme_options = st.selectbox(
@@ -424,52 +946,40 @@ def main():
             if st.button("Apply Theme"):
                 selected_theme = st.session_state.theme_selector
                 selected_font = st.session_state.font_selector
+                st.session_state.applied_theme = (selected_theme, selected_font)
                 theme_manager.apply_theme(selected_theme, selected_font)
                 st.success(f"Applied {selected_theme} theme with {selected_font} font!")
         with settings_tabs[2]:
             st.markdown("#### 📤 Data Export")
-            export_format = st.multiselect(
+            export_labels = st.multiselect(
                 "Export Formats", 
-                ["CSV", "JSON", "PDF Report"],
+                [EXPORT_LABELS[export_format] for export_format in EXPORT_FORMATS],
                 default=["CSV"]
             )
             if st.button("Export Analysis History"):
-                try:
-                    if len(st.session_state.history) == 0:
-                        st.warning("No history data to export!")
-                    else:
-                        export_success_messages = []
-                        
-                        if "CSV" in export_format:
-                            history_df = pd.DataFrame(st.session_state.history)
-                            csv_filename = "docugenius_history.csv"
-                            history_df.to_csv(csv_filename, index=False)
-                            export_success_messages.append(f"✓ Exported as CSV: {csv_filename}")
-                        if "JSON" in export_format:
-                            json_filename = "docugenius_history.json"
-                            with open(json_filename, "w") as f:
-                                json.dump(st.session_state.history, f, indent=4)
-                            export_success_messages.append(f"✓ Exported as JSON: {json_filename}")
-                        if "PDF Report" in export_format:
-                            pdf_filename = "docugenius_history_report.pdf"
-                            pdf_path = generate_pdf_report(st.session_state.history, pdf_filename)
-                            if pdf_path:
-                                export_success_messages.append(f"✓ Exported as PDF Report: {pdf_filename}")
-                        if export_success_messages:
-                            st.success("Export completed successfully!\n" + "\n".join(export_success_messages))
-                except Exception as e:
-                    st.error(f"Export failed: {str(e)}")
+                formats = [export_format for export_format in EXPORT_FORMATS if EXPORT_LABELS[export_format] in export_labels]
+                start_history_exports(formats)
+            render_export_jobs()
+        if ADMIN_VIEW:
+            with settings_tabs[3]:
+                render_admin_view()
     render_sidebar()
 # Optional: Add a reset button in sidebar
 def add_reset_functionality():
     with st.sidebar:
         if st.button("🔄 Reset Usage Stats", key="reset_button"):
             reset_usage_stats()
-# Apply default theme at the start
-theme_manager.apply_theme("Dark", "Roboto")
+# Apply the chosen (default: Dark/Roboto) theme on every rerun
+theme_manager.apply_theme(*st.session_state.get("applied_theme", ("Dark", "Roboto")))
 # Run the application
 def run():
-    main()
-    add_reset_functionality()
+    start_metrics_server()
+    prune_inactive_history()
+    if WARM_START:
+        start_warm_start()
+    with span("render"):
+        main()
+        add_reset_functionality()
+    record_first_render(IMPORT_SECONDS, time.perf_counter() - SCRIPT_STARTED)
 if __name__ == "__main__":
     run()
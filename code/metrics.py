@@ -0,0 +1,125 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the cumulative Prometheus histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Percentiles are computed over the most recent samples of each stage
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_PREFIX = "docugenius"
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _percentile(ordered, quantile):
+    return ordered[min(int(quantile * len(ordered)), len(ordered) - 1)]
+
+
+# Cumulative bucket counts for export plus a rolling window for percentiles
+class LatencyHistogram:
+    def __init__(self, window=WINDOW):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.recent.append(seconds)
+        for position, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[position] += 1
+                return
+        self.buckets[-1] += 1
+
+    def summary(self):
+        ordered = sorted(self.recent)
+        summary = {'count': self.count, 'mean': self.total / self.count if self.count else 0.0}
+        for quantile in QUANTILES:
+            summary[f"p{int(quantile * 100)}"] = _percentile(ordered, quantile) if ordered else 0.0
+        return summary
+
+
+class MetricsRegistry:
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            if stage not in self._stages:
+                self._stages[stage] = LatencyHistogram(self.window)
+            self._stages[stage].observe(seconds)
+
+    # Time a block of code as one sample of `stage`, whether or not it raises
+    @contextmanager
+    def span(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {stage: histogram.summary() for stage, histogram in sorted(self._stages.items())}
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+
+    def prometheus_text(self):
+        name = f"{METRIC_PREFIX}_stage_duration_seconds"
+        lines = [f"# HELP {name} Time spent in each processing stage.", f"# TYPE {name} histogram"]
+        quantile_lines = [
+            f"# HELP {METRIC_PREFIX}_stage_latency_seconds Rolling-window latency percentiles per stage.",
+            f"# TYPE {METRIC_PREFIX}_stage_latency_seconds summary",
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for stage, histogram in stages:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.total:.6f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+                ordered = sorted(histogram.recent)
+                for quantile in QUANTILES:
+                    value = _percentile(ordered, quantile) if ordered else 0.0
+                    quantile_lines.append(
+                        f'{METRIC_PREFIX}_stage_latency_seconds{{stage="{stage}",quantile="{quantile}"}} {value:.6f}'
+                    )
+        return "\n".join(lines + quantile_lines) + "\n"
+
+
+# Process-wide registry used by the engine, the Streamlit app and the API
+REGISTRY = MetricsRegistry()
+span = REGISTRY.span
+observe = REGISTRY.observe
+
+
+# Stand-alone Prometheus scrape endpoint for processes without an HTTP server of their own
+def serve_metrics(port, host="0.0.0.0", registry=REGISTRY):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    return server
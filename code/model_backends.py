@@ -0,0 +1,271 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+
+from context_budget import estimate_tokens
+from rate_limit import TokenBucket
+
+# A backend is a callable model_name -> model, where a model offers the subset of
+# genai.GenerativeModel the engine uses: generate_content(prompt, stream=False) and count_tokens(text).
+# Backends that can hold a document server-side also offer create_context(model_name, text, ttl) -> name,
+# extend_context(name, ttl), delete_context(name) and context_model(model_name, name)
+DEFAULT_BACKEND = "gemini"
+# Gemini refuses cached content smaller than this
+GEMINI_MIN_CONTEXT_TOKENS = 32_768
+BACKEND_ENV_VAR = "DOCUGENIUS_MODEL_BACKEND"
+
+UsageMetadata = namedtuple("UsageMetadata", ["prompt_token_count", "candidates_token_count", "total_token_count"])
+FakeResponse = namedtuple("FakeResponse", ["text", "usage_metadata"])
+TokenCount = namedtuple("TokenCount", ["total_tokens"])
+_WORDS = re.compile(r"[A-Za-z0-9]+")
+
+
+# With an explicit key the models get their own service client instead of the genai.configure() global
+class GeminiBackend:
+    min_context_tokens = GEMINI_MIN_CONTEXT_TOKENS
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+        self._service_client = None
+        self._cache_client = None
+        self._lock = threading.Lock()
+
+    def _client(self):
+        with self._lock:
+            if self._service_client is None:
+                from google.ai import generativelanguage as glm
+                self._service_client = glm.GenerativeServiceClient(client_options={"api_key": self.api_key})
+            return self._service_client
+
+    def _caches(self):
+        with self._lock:
+            if self._cache_client is None:
+                if self.api_key:
+                    from google.ai import generativelanguage as glm
+                    self._cache_client = glm.CacheServiceClient(client_options={"api_key": self.api_key})
+                else:
+                    from google.generativeai.client import get_default_cache_client
+                    self._cache_client = get_default_cache_client()
+            return self._cache_client
+
+    # Loads the SDK and, with a key, opens the service client, so the first request pays neither
+    def warm(self):
+        import google.generativeai  # noqa: F401
+        if self.api_key:
+            self._client()
+
+    def __call__(self, model_name):
+        import google.generativeai as genai
+        model = genai.GenerativeModel(model_name)
+        if self.api_key and hasattr(model, "_client"):
+            model._client = self._client()
+        return model
+
+    def create_context(self, model_name, text, ttl):
+        from google.generativeai import protos
+        if not model_name.startswith("models/"):
+            model_name = f"models/{model_name}"
+        cached_content = protos.CachedContent(
+            model=model_name,
+            contents=[protos.Content(role="user", parts=[protos.Part(text=text)])],
+            ttl={"seconds": int(ttl)},
+        )
+        request = protos.CreateCachedContentRequest(cached_content=cached_content)
+        return self._caches().create_cached_content(request).name
+
+    def extend_context(self, name, ttl):
+        from google.generativeai import protos
+        from google.protobuf import field_mask_pb2
+        request = protos.UpdateCachedContentRequest(
+            cached_content=protos.CachedContent(name=name, ttl={"seconds": int(ttl)}),
+            update_mask=field_mask_pb2.FieldMask(paths=["ttl"]),
+        )
+        self._caches().update_cached_content(request)
+
+    def delete_context(self, name):
+        from google.generativeai import protos
+        self._caches().delete_cached_content(protos.DeleteCachedContentRequest(name=name))
+
+    # Same as GenerativeModel.from_cached_content, without the extra lookup request
+    def context_model(self, model_name, name):
+        model = self(model_name)
+        model._cached_content = name
+        return model
+
+
+# Raised for injected failures; `code` mirrors the HTTP status a real API error would carry
+class FakeBackendError(Exception):
+    def __init__(self, message, code=503):
+        super().__init__(message)
+        self.code = code
+
+
+def _fraction(*parts):
+    digest = hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+# Deterministic offline stand-in for Gemini: same prompt, same answer, same timing, same failures
+# Optional quotas behave like the real API: calls over the limit fail with a 429
+class FakeBackend:
+    def __init__(self, first_token_latency=0.05, chunk_delay=0.01, chunks=4, answer_tokens=60,
+                 error_rate=0.0, error_code=503, seed=0, quota_rpm=None, quota_tpm=None,
+                 min_context_tokens=1024):
+        self.first_token_latency = first_token_latency
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.seed = seed
+        self.request_quota = TokenBucket(quota_rpm) if quota_rpm else None
+        self.token_quota = TokenBucket(quota_tpm) if quota_tpm else None
+        self.min_context_tokens = min_context_tokens
+        self._lock = threading.Lock()
+        self._attempts = {}
+        self._contexts = {}
+        self.calls = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+
+    def __call__(self, model_name):
+        return FakeModel(self, model_name)
+
+    def create_context(self, model_name, text, ttl):
+        self._start_call(model_name, text)
+        with self._lock:
+            name = f"cachedContents/fake-{len(self._contexts) + 1}-{hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]}"
+            self._contexts[name] = [model_name, text, time.monotonic() + ttl]
+        return name
+
+    def extend_context(self, name, ttl):
+        self._context(name)[2] = time.monotonic() + ttl
+
+    def delete_context(self, name):
+        with self._lock:
+            self._contexts.pop(name, None)
+
+    def context_model(self, model_name, name):
+        return FakeModel(self, model_name, context=name)
+
+    def _context(self, name):
+        with self._lock:
+            context = self._contexts.get(name)
+            if context is None or context[2] <= time.monotonic():
+                self._contexts.pop(name, None)
+                raise FakeBackendError(f"CachedContent not found (or expired): {name}", 404)
+            return context
+
+    def stats(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'errors': self.errors,
+                'quota_errors': self.quota_errors,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'total_tokens': self.prompt_tokens + self.completion_tokens,
+                'cached_tokens': self.cached_tokens,
+                'contexts': len(self._contexts),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._attempts.clear()
+            self.calls = self.errors = self.quota_errors = self.prompt_tokens = self.completion_tokens = 0
+            self.cached_tokens = 0
+
+    # Failures depend on the prompt and how often it has been tried, not on thread interleaving
+    def _start_call(self, model_name, prompt):
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        over_quota = ((self.request_quota is not None and not self.request_quota.try_consume(1))
+                      or (self.token_quota is not None and not self.token_quota.try_consume(estimate_tokens(prompt))))
+        if over_quota:
+            with self._lock:
+                self.calls += 1
+                self.errors += 1
+                self.quota_errors += 1
+            raise FakeBackendError(f"Quota exceeded for {model_name}", 429)
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.calls += 1
+            failed = self.error_rate and _fraction(self.seed, key, attempt) < self.error_rate
+            if failed:
+                self.errors += 1
+            else:
+                self.prompt_tokens += estimate_tokens(prompt)
+        if failed:
+            time.sleep(self.first_token_latency)
+            raise FakeBackendError(f"Injected failure for {model_name} (attempt {attempt + 1})", self.error_code)
+        return key
+
+    # The answer reuses words from the prompt, starting at an offset chosen by the prompt hash
+    def _answer_chunks(self, key, prompt):
+        vocabulary = _WORDS.findall(prompt) or ["answer"]
+        start = int(key[:8], 16) % len(vocabulary)
+        words = [vocabulary[(start + number) % len(vocabulary)] for number in range(self.answer_tokens)]
+        size = max(1, -(-len(words) // self.chunks))
+        return [" ".join(words[offset:offset + size]) + " " for offset in range(0, len(words), size)]
+
+    def _finish_call(self, prompt, text):
+        completion = estimate_tokens(text)
+        if self.token_quota is not None:
+            self.token_quota.adjust(completion)
+        with self._lock:
+            self.completion_tokens += completion
+        prompt_tokens = estimate_tokens(prompt)
+        return UsageMetadata(prompt_tokens, completion, prompt_tokens + completion)
+
+
+# With a context, the cached document is read from the backend and only the prompt is billed as input
+class FakeModel:
+    _Chunk = namedtuple("_Chunk", ["text"])
+
+    def __init__(self, backend, model_name, context=None):
+        self.backend = backend
+        self.model_name = model_name
+        self.context = context
+
+    def generate_content(self, prompt, stream=False):
+        cached_text = ""
+        if self.context is not None:
+            cached_text = self.backend._context(self.context)[1]
+        key = self.backend._start_call(self.model_name, prompt)
+        if cached_text:
+            with self.backend._lock:
+                self.backend.cached_tokens += estimate_tokens(cached_text)
+        chunks = self.backend._answer_chunks(key, f"{cached_text}\n{prompt}" if cached_text else prompt)
+        if stream:
+            return self._iterate(prompt, chunks)
+        time.sleep(self.backend.first_token_latency + self.backend.chunk_delay * (len(chunks) - 1))
+        text = "".join(chunks)
+        return FakeResponse(text, self.backend._finish_call(prompt, text))
+
+    def _iterate(self, prompt, chunks):
+        time.sleep(self.backend.first_token_latency)
+        for number, text in enumerate(chunks):
+            if number and self.backend.chunk_delay:
+                time.sleep(self.backend.chunk_delay)
+            yield self._Chunk(text)
+        self.backend._finish_call(prompt, "".join(chunks))
+
+    def count_tokens(self, text):
+        return TokenCount(estimate_tokens(text))
+
+
+BACKENDS = {"gemini": GeminiBackend, "fake": FakeBackend}
+
+
+# Pick a backend by name, defaulting to $DOCUGENIUS_MODEL_BACKEND and then Gemini
+def get_backend(name=None, **options):
+    name = name or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend: {name} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name](**options)
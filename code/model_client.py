@@ -0,0 +1,280 @@
+import hashlib
+import os
+import random
+import threading
+import time
+
+from context_budget import estimate_tokens
+from context_cache import ContextCache
+from model_backends import BACKEND_ENV_VAR, DEFAULT_BACKEND, get_backend
+from rate_limit import RateLimiter
+from streaming import _chunk_text
+
+# Free-tier Gemini 1.5 Flash quotas; override per deployment
+DEFAULT_REQUESTS_PER_MINUTE = int(os.environ.get("DOCUGENIUS_REQUESTS_PER_MINUTE", "15"))
+DEFAULT_TOKENS_PER_MINUTE = int(os.environ.get("DOCUGENIUS_TOKENS_PER_MINUTE", "1000000"))
+DEFAULT_MAX_ATTEMPTS = 5
+BASE_DELAY = 0.5
+MAX_DELAY = 20.0
+# Output tokens reserved up front for each call and settled once the answer is known
+RESPONSE_TOKEN_RESERVE = 512
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"ResourceExhausted", "TooManyRequests", "InternalServerError", "ServiceUnavailable",
+                    "BadGateway", "GatewayTimeout", "DeadlineExceeded"}
+
+
+def is_retryable(error):
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and code in RETRYABLE_CODES:
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+# Exponential backoff with full jitter
+def backoff_delay(attempt, base=BASE_DELAY, cap=MAX_DELAY):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def _response_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    count = getattr(usage, "candidates_token_count", None)
+    if isinstance(count, int):
+        return count
+    return estimate_tokens(response.text)
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks = []
+        self.result = None
+        self.error = None
+        self.done = False
+        self.condition = threading.Condition()
+
+    def finish(self, result=None, error=None):
+        with self.condition:
+            self.result, self.error, self.done = result, error, True
+            self.condition.notify_all()
+
+
+# Identical concurrent calls share one upstream request; streaming followers replay the leader's chunks
+class SingleFlight:
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _leave(self, key):
+        with self._lock:
+            self._flights.pop(key, None)
+
+    def call(self, key, function):
+        flight, leader = self._join(key)
+        if not leader:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done)
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            result = function()
+        except Exception as e:
+            self._leave(key)
+            flight.finish(error=e)
+            raise
+        self._leave(key)
+        flight.finish(result=result)
+        return result
+
+    def stream(self, key, function):
+        flight, leader = self._join(key)
+        if leader:
+            return self._lead(key, flight, function)
+        return self._follow(flight)
+
+    def _lead(self, key, flight, function):
+        error = None
+        try:
+            for chunk in function():
+                with flight.condition:
+                    flight.chunks.append(chunk)
+                    flight.condition.notify_all()
+                yield chunk
+        except BaseException as e:
+            error = e if isinstance(e, Exception) else RuntimeError("Upstream stream was abandoned")
+            raise
+        finally:
+            self._leave(key)
+            flight.finish(error=error)
+
+    def _follow(self, flight):
+        position = 0
+        while True:
+            with flight.condition:
+                flight.condition.wait_for(lambda: flight.done or len(flight.chunks) > position)
+                chunks = flight.chunks[position:]
+                done, error = flight.done, flight.error
+            for chunk in chunks:
+                yield chunk
+            position += len(chunks)
+            if done and position >= len(flight.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+# Wraps a backend for one API key: rate limits, retries and coalescing shared by every model it creates
+class ModelClient:
+    def __init__(self, backend, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.backend = backend
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_attempts = max_attempts
+        self.flights = SingleFlight()
+        self.contexts = ContextCache(backend)
+        self._models = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.throttled_seconds = 0.0
+
+    def __call__(self, model_name):
+        with self._lock:
+            if model_name not in self._models:
+                self._models[model_name] = ClientModel(self, self.backend(model_name), model_name)
+            return self._models[model_name]
+
+    def cached_model(self, model_name, handle):
+        key = (model_name, handle.name)
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = ClientModel(self, self.backend.context_model(model_name, handle.name),
+                                                f"{model_name}@{handle.name}")
+            return self._models[key]
+
+    # A new document replaces the old one for `owner`; its cached context goes once nobody else uses it
+    def release_context(self, doc_hash, owner=None):
+        released = self.contexts.release(doc_hash, owner)
+        if released:
+            with self._lock:
+                live = self.contexts.names()
+                for key in [key for key in self._models if isinstance(key, tuple) and key[1] not in live]:
+                    del self._models[key]
+        return released
+
+    def stats(self):
+        contexts = self.contexts.stats()
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'coalesced': self.flights.coalesced,
+            'throttled_seconds': round(self.throttled_seconds, 3),
+            'context_hits': contexts['hits'],
+            'context_tokens_saved': contexts['tokens_saved'],
+        }
+
+    def _acquire(self, prompt):
+        reserved = estimate_tokens(prompt) + RESPONSE_TOKEN_RESERVE
+        waited = self.limiter.acquire(reserved)
+        with self._lock:
+            self.requests += 1
+            self.throttled_seconds += waited
+        return reserved
+
+    def _retry(self, attempt, error):
+        if attempt + 1 >= self.max_attempts or not is_retryable(error):
+            return False
+        with self._lock:
+            self.retries += 1
+        time.sleep(backoff_delay(attempt))
+        return True
+
+    def generate(self, model, prompt):
+        for attempt in range(self.max_attempts):
+            reserved = self._acquire(prompt)
+            try:
+                response = model.generate_content(prompt)
+            except Exception as e:
+                # Failed calls are not billed
+                self.limiter.settle(reserved, 0)
+                if self._retry(attempt, e):
+                    continue
+                raise
+            self.limiter.settle(reserved, estimate_tokens(prompt) + _response_tokens(response))
+            return response
+
+    # Only failures before the first chunk are retried; a half-delivered answer cannot be replayed
+    def stream(self, model, prompt):
+        for attempt in range(self.max_attempts):
+            reserved = self._acquire(prompt)
+            try:
+                iterator = iter(model.generate_content(prompt, stream=True))
+                first = next(iterator, None)
+            except Exception as e:
+                # Failed calls are not billed
+                self.limiter.settle(reserved, 0)
+                if self._retry(attempt, e):
+                    continue
+                raise
+            break
+        parts = []
+        try:
+            if first is not None:
+                parts.append(_chunk_text(first))
+                yield first
+            for chunk in iterator:
+                parts.append(_chunk_text(chunk))
+                yield chunk
+        finally:
+            self.limiter.settle(reserved, estimate_tokens(prompt) + estimate_tokens("".join(parts)))
+
+
+class ClientModel:
+    def __init__(self, client, model, model_name):
+        self.client = client
+        self.model = model
+        self.model_name = model_name
+
+    def generate_content(self, prompt, stream=False):
+        key = (self.model_name, stream, hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+        if stream:
+            return self.client.flights.stream(key, lambda: self.client.stream(self.model, prompt))
+        return self.client.flights.call(key, lambda: self.client.generate(self.model, prompt))
+
+    def count_tokens(self, text):
+        return self.model.count_tokens(text)
+
+    # (model bound to the document's cached context, handle, created) or None if it cannot be cached
+    def cached_context(self, doc_hash, text, owner=None):
+        result = self.client.contexts.acquire(self.model_name, doc_hash, text, owner)
+        if result is None:
+            return None
+        handle, created = result
+        return self.client.cached_model(self.model_name, handle), handle, created
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# One shared client per (backend, API key) in this process; keys are only held by their own client
+def get_client(backend_name=None, api_key=None, **options):
+    backend_name = backend_name or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND)
+    if backend_name != "gemini":
+        api_key = None
+    key_id = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
+    with _clients_lock:
+        if (backend_name, key_id) not in _clients:
+            backend_options = {'api_key': api_key} if api_key else {}
+            _clients[(backend_name, key_id)] = ModelClient(get_backend(backend_name, **backend_options),
+                                                           **options)
+        return _clients[(backend_name, key_id)]
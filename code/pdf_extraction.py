@@ -0,0 +1,172 @@
+import hashlib
+import io
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import PyPDF2
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+# Below this many uncached pages a process pool costs more than it saves
+PARALLEL_THRESHOLD = 16
+
+ExtractionResult = namedtuple(
+    "ExtractionResult",
+    ["text", "pages", "page_texts", "page_hashes", "cached_pages", "elapsed", "pages_per_second",
+     "peak_rss_growth_mb"],
+)
+
+
+def _page_hash(page):
+    contents = page.get_contents()
+    data = contents.get_data() if contents is not None else b""
+    return hashlib.sha256(data).hexdigest()
+
+
+# PDFs arrive as bytes or as a path to a spooled upload; a path keeps the file out of memory
+# and is all that has to be sent to each worker process
+def _open_pdf(source):
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, "rb")
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Peak RSS of a worker process when it started, so each batch can report its own growth
+_worker_baseline_mb = None
+
+
+def _start_worker():
+    global _worker_baseline_mb
+    _worker_baseline_mb = peak_rss_mb()
+
+
+def _extract_pages(source, page_numbers):
+    with _open_pdf(source) as stream:
+        reader = PyPDF2.PdfReader(stream)
+        pages = [(number, reader.pages[number].extract_text() or "") for number in page_numbers]
+    peak = peak_rss_mb()
+    return pages, None if peak is None else peak - _worker_baseline_mb
+
+
+# Extracted page text keyed by the hash of the page's content stream
+class PageTextCache:
+    def __init__(self, path=None, max_entries=50000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "pdf_pages.sqlite")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages (hash TEXT PRIMARY KEY, text TEXT NOT NULL, stored REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get_many(self, hashes):
+        found = {}
+        unique = list(set(hashes))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for page_hash, text in self._db.execute(
+                    f"SELECT hash, text FROM pages WHERE hash IN ({placeholders})", batch
+                ):
+                    found[page_hash] = text
+        return found
+
+    def put_many(self, items):
+        now = time.time()
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO pages (hash, text, stored) VALUES (?, ?, ?)",
+                [(page_hash, text, now) for page_hash, text in items],
+            )
+            self._db.execute(
+                "DELETE FROM pages WHERE hash IN (SELECT hash FROM pages ORDER BY stored DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._db.commit()
+
+
+# Extract all pages of a PDF, reusing cached pages and fanning the rest out to worker processes
+def extract_pdf_text(source, cache=None, max_workers=None, on_progress=None):
+    with _open_pdf(source) as stream:
+        return _extract_pdf_text(source, PyPDF2.PdfReader(stream), cache, max_workers, on_progress)
+
+
+def _extract_pdf_text(source, reader, cache, max_workers, on_progress):
+    start = time.perf_counter()
+    page_count = len(reader.pages)
+    page_hashes = [_page_hash(page) for page in reader.pages]
+    cached = cache.get_many(page_hashes) if cache is not None else {}
+    page_texts = [cached.get(page_hash) for page_hash in page_hashes]
+    missing = [number for number, text in enumerate(page_texts) if text is None]
+    done = page_count - len(missing)
+    if on_progress is not None:
+        on_progress(done, page_count)
+
+    max_workers = max_workers or os.cpu_count() or 1
+    if len(missing) < PARALLEL_THRESHOLD or max_workers == 1:
+        baseline = peak_rss_mb()
+        for number in missing:
+            page_texts[number] = reader.pages[number].extract_text() or ""
+            done += 1
+            if on_progress is not None:
+                on_progress(done, page_count)
+        # Zero when the process had already peaked higher before this run
+        growth = None if baseline is None else peak_rss_mb() - baseline
+    else:
+        growth = 0.0
+        # Small batches keep progress granular while amortising the per-task PDF parse
+        batch_size = max(1, min(32, len(missing) // (max_workers * 4)))
+        batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(batches)), initializer=_start_worker) as executor:
+            futures = [executor.submit(_extract_pages, source, batch) for batch in batches]
+            try:
+                for future in as_completed(futures):
+                    pages, worker_growth = future.result()
+                    for number, text in pages:
+                        page_texts[number] = text
+                    if worker_growth is None:
+                        growth = None
+                    elif growth is not None:
+                        growth = max(growth, worker_growth)
+                    done += len(pages)
+                    if on_progress is not None:
+                        on_progress(done, page_count)
+            except BaseException:
+                # e.g. a cancelled job raising from on_progress: drop the batches not started yet
+                for future in futures:
+                    future.cancel()
+                raise
+
+    if cache is not None and missing:
+        cache.put_many((page_hashes[number], page_texts[number]) for number in missing)
+    text = "".join(page_text + "\n" for page_text in page_texts)
+    elapsed = time.perf_counter() - start
+    return ExtractionResult(
+        text=text,
+        pages=page_count,
+        page_texts=page_texts,
+        page_hashes=page_hashes,
+        cached_pages=page_count - len(missing),
+        elapsed=elapsed,
+        pages_per_second=page_count / elapsed if elapsed > 0 else float(page_count),
+        peak_rss_growth_mb=growth,
+    )
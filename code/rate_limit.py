@@ -0,0 +1,70 @@
+import threading
+import time
+
+
+# Refills `per_minute` units a minute up to `capacity`; the balance may go negative to settle usage after the fact
+class TokenBucket:
+    def __init__(self, per_minute, capacity=None, clock=time.monotonic):
+        self.rate = per_minute / 60.0
+        self.capacity = float(capacity if capacity is not None else per_minute)
+        self.clock = clock
+        self._available = self.capacity
+        self._updated = clock()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = self.clock()
+        self._available = min(self.capacity, self._available + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def available(self):
+        with self._condition:
+            self._refill()
+            return self._available
+
+    def try_consume(self, amount):
+        with self._condition:
+            self._refill()
+            if self._available < min(amount, self.capacity):
+                return False
+            self._available -= amount
+            return True
+
+    # Block until `amount` is available (anything above capacity only needs a full bucket); returns seconds waited
+    def consume(self, amount):
+        start = self.clock()
+        with self._condition:
+            while True:
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self._available >= needed:
+                    self._available -= amount
+                    return self.clock() - start
+                self._condition.wait((needed - self._available) / self.rate)
+
+    # Charge (or refund, if negative) usage that was only known after the call
+    def adjust(self, amount):
+        with self._condition:
+            self._refill()
+            self._available = min(self.capacity, self._available - amount)
+            self._condition.notify_all()
+
+
+# Requests-per-minute and tokens-per-minute limits for one API key
+class RateLimiter:
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens):
+        waited = 0.0
+        if self.requests is not None:
+            waited += self.requests.consume(1)
+        if self.tokens is not None:
+            waited += self.tokens.consume(tokens)
+        return waited
+
+    def settle(self, reserved, used):
+        if self.tokens is not None and used != reserved:
+            self.tokens.adjust(used - reserved)
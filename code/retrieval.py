@@ -0,0 +1,187 @@
+import hashlib
+import re
+from collections import Counter, namedtuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+DEFAULT_CHUNK_SIZE = 1200
+DEFAULT_CHUNK_OVERLAP = 200
+DEFAULT_TOP_K = 4
+
+Chunk = namedtuple("Chunk", ["index", "start", "end", "text"])
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+
+
+# Split text into overlapping character windows, snapped to whitespace
+def chunk_text(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    if overlap >= chunk_size:
+        raise ValueError("overlap must be smaller than chunk_size")
+    chunks = []
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + chunk_size, length)
+        if end < length:
+            # Prefer breaking before a markdown heading, then at any whitespace
+            boundary = text.rfind("\n#", start + chunk_size // 2, end)
+            if boundary == -1:
+                boundary = text.rfind(" ", start + chunk_size // 2, end)
+            if boundary != -1:
+                end = boundary
+        piece = text[start:end]
+        if piece.strip():
+            chunks.append(Chunk(len(chunks), start, end, piece))
+        if end >= length:
+            break
+        next_start = end - overlap
+        if next_start <= start:
+            next_start = end
+        while next_start < end and not text[next_start - 1].isspace():
+            next_start += 1
+        start = next_start
+    return chunks
+
+
+# Chunk each section (e.g. PDF page) on its own, so an edit in one section leaves the
+# chunks of every other section byte-for-byte unchanged; offsets stay global
+def chunk_sections(text, boundaries, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP):
+    chunks = []
+    ends = list(boundaries[1:]) + [len(text)]
+    for start, end in zip(boundaries, ends):
+        for chunk in chunk_text(text[start:end], chunk_size, overlap):
+            chunks.append(Chunk(len(chunks), start + chunk.start, start + chunk.end, chunk.text))
+    return chunks
+
+
+# BM25 over a term-major sparse matrix held in plain NumPy arrays
+class BM25Index:
+    def __init__(self, token_lists, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab = {}
+        self.num_docs = len(token_lists)
+        self.doc_lengths = np.array([len(tokens) for tokens in token_lists], dtype=np.float32)
+        self.avg_doc_length = float(self.doc_lengths.mean()) if self.num_docs else 0.0
+        postings = {}
+        for doc_id, tokens in enumerate(token_lists):
+            for term, count in Counter(tokens).items():
+                term_id = self.vocab.setdefault(term, len(self.vocab))
+                postings.setdefault(term_id, []).append((doc_id, count))
+        indptr = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        for term_id, entries in postings.items():
+            indptr[term_id + 1] = len(entries)
+        self.indptr = np.cumsum(indptr)
+        self.doc_ids = np.empty(self.indptr[-1], dtype=np.int32)
+        self.term_freqs = np.empty(self.indptr[-1], dtype=np.float32)
+        for term_id, entries in postings.items():
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            self.doc_ids[start:end] = [doc_id for doc_id, _ in entries]
+            self.term_freqs[start:end] = [count for _, count in entries]
+        doc_freqs = np.diff(self.indptr).astype(np.float32)
+        self.idf = np.log(1.0 + (self.num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5))
+
+    def score(self, query_tokens):
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        if not self.num_docs:
+            return scores
+        norm = self.k1 * (1.0 - self.b + self.b * self.doc_lengths / max(self.avg_doc_length, 1.0))
+        for term in set(query_tokens):
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                continue
+            start, end = self.indptr[term_id], self.indptr[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.term_freqs[start:end]
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1.0) / (tf + norm[docs])
+        return scores
+
+
+# Deterministic local stand-in for an embedding model (feature hashing)
+class HashingEmbeddingBackend:
+    def __init__(self, dimensions=256):
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for token in tokenize(text):
+                digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dimensions] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+# Gemini embedding backend; needs genai.configure() to have been called
+class GeminiEmbeddingBackend:
+    def __init__(self, model_name="models/text-embedding-004"):
+        self.model_name = model_name
+
+    def embed(self, texts):
+        import google.generativeai as genai
+        vectors = []
+        for text in texts:
+            result = genai.embed_content(model=self.model_name, content=text, task_type="retrieval_document")
+            vectors.append(result["embedding"])
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+
+# Chunked retrieval index built once per document; `text` may be a str or a StoredText view
+class DocumentIndex:
+    def __init__(self, text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_CHUNK_OVERLAP,
+                 embedding_backend=None, lexical_weight=0.5, sections=None):
+        self.text = text
+        # Decoded only while the index is built; afterwards the chunks hold the only in-memory copy
+        source = str(text)
+        self.doc_hash = content_hash(source)
+        if sections is not None and len(sections):
+            self.chunks = chunk_sections(source, [int(start) for start in sections], chunk_size, overlap)
+        else:
+            self.chunks = chunk_text(source, chunk_size, overlap)
+        self.bm25 = BM25Index([tokenize(chunk.text) for chunk in self.chunks])
+        self.embedding_backend = embedding_backend
+        self.lexical_weight = lexical_weight
+        self.embeddings = None
+        if embedding_backend is not None and self.chunks:
+            self.embeddings = embedding_backend.embed([chunk.text for chunk in self.chunks])
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query, top_k=DEFAULT_TOP_K):
+        if not self.chunks:
+            return []
+        scores = self.bm25.score(tokenize(query))
+        if self.embeddings is not None:
+            lexical = scores / scores.max() if scores.max() > 0 else scores
+            query_vector = self.embedding_backend.embed([query])[0]
+            semantic = np.clip(self.embeddings @ query_vector, 0.0, None)
+            scores = self.lexical_weight * lexical + (1.0 - self.lexical_weight) * semantic
+        top_k = min(top_k, len(self.chunks))
+        if not scores.any():
+            # Nothing matched (e.g. "summarize this"), fall back to the opening chunks
+            return [(chunk, 0.0) for chunk in self.chunks[:top_k]]
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [(self.chunks[i], float(scores[i])) for i in best]
+
+
+def format_context(results):
+    ordered = sorted(results, key=lambda item: item[0].start)
+    return "\n\n".join(
+        f"[Chunk {chunk.index} | chars {chunk.start}-{chunk.end}]\n{chunk.text}"
+        for chunk, _ in ordered
+    )
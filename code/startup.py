@@ -0,0 +1,222 @@
+"""Startup profiling, warm start and static asset bundling for the Streamlit app.
+
+Examples:
+    python code/startup.py profile                  # import-time breakdown of code/main.py
+    python code/startup.py profile --lazy --json    # include modules imported on first use
+    python code/startup.py fetch-fonts              # bundle the theme fonts under code/static/fonts
+    python code/startup.py serve -- --server.port 8501
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from metrics import REGISTRY
+from model_backends import BACKEND_ENV_VAR, DEFAULT_BACKEND
+from model_client import get_client
+from theme_manager import FONT_WEIGHTS, FONTS_DIR, GOOGLE_FONTS_CSS, ThemeManager, font_file, sidebar_image
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+MAIN_SCRIPT = os.path.join(CODE_DIR, "main.py")
+# Imported on first use (charts, PDF reports, the Gemini SDK) rather than when the page first loads
+LAZY_MODULES = ("plotly.express", "plotly.graph_objects", "reportlab.platypus", "google.generativeai",
+                "google.ai.generativelanguage")
+# Preload LAZY_MODULES, the model client and theme assets in the background once per process
+WARM_START = os.environ.get("DOCUGENIUS_WARM_START", "").lower() in ("1", "true", "yes")
+# Google Fonts only serves woff2 files to browsers it recognises
+WOFF2_USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+_FONT_FACE = re.compile(r"/\* ([\w-]+) \*/\s*@font-face \{[^}]*?font-weight: (\d+);[^}]*?src: url\((\S+?)\)")
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+_first_render_lock = threading.Lock()
+_first_render_recorded = False
+
+
+# Absolute modules imported at the top level of `script`, in order
+def script_imports(script=MAIN_SCRIPT):
+    with open(script, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+# Imports `modules` in a fresh interpreter under -X importtime: [(module, self seconds, cumulative seconds, depth)]
+def import_profile(modules, python=sys.executable):
+    code = "; ".join(f"import {module}" for module in modules)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, (CODE_DIR, os.environ.get("PYTHONPATH")))))
+    completed = subprocess.run([python, "-X", "importtime", "-c", code], cwd=CODE_DIR, env=env,
+                               capture_output=True, text=True)
+    if completed.returncode:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return entries
+
+
+# Self time summed per top-level package, largest first: [(package, seconds, share of the total)]
+def import_breakdown(entries):
+    packages = {}
+    for module, self_seconds, _, _ in entries:
+        package = module.split(".")[0]
+        packages[package] = packages.get(package, 0.0) + self_seconds
+    total = sum(packages.values()) or 1.0
+    return [(package, seconds, seconds / total)
+            for package, seconds in sorted(packages.items(), key=lambda item: item[1], reverse=True)]
+
+
+# Imports the app's modules, opens the model client and loads theme assets; returns seconds per step
+def warm_start(backend_name=None, api_key=None, theme_manager=None, modules=None):
+    timings = {}
+    for module in modules if modules is not None else script_imports() + list(LAZY_MODULES):
+        start = time.perf_counter()
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            continue
+        timings[module] = time.perf_counter() - start
+    start = time.perf_counter()
+    client = get_client(backend_name or os.environ.get(BACKEND_ENV_VAR, DEFAULT_BACKEND), api_key)
+    warm = getattr(client.backend, "warm", None)
+    if warm is not None:
+        warm()
+    timings["model client"] = time.perf_counter() - start
+    start = time.perf_counter()
+    if theme_manager is not None:
+        theme_manager.warm()
+    else:
+        sidebar_image()
+    timings["theme assets"] = time.perf_counter() - start
+    REGISTRY.observe("warm_start", sum(timings.values()))
+    return timings
+
+
+def warm_start_in_background(backend_name=None, api_key=None, theme_manager=None):
+    thread = threading.Thread(target=warm_start, args=(backend_name, api_key, theme_manager),
+                              name="warm-start", daemon=True)
+    thread.start()
+    return thread
+
+
+# The first script run in a process pays the imports; later reruns find them loaded, so only the first counts
+def record_first_render(import_seconds, render_seconds):
+    global _first_render_recorded
+    with _first_render_lock:
+        if _first_render_recorded:
+            return False
+        _first_render_recorded = True
+    REGISTRY.observe("startup_imports", import_seconds)
+    REGISTRY.observe("first_render", render_seconds)
+    return True
+
+
+# Downloads the latin subset of each font weight the themes use into static/fonts
+def fetch_fonts(font_names, weights=FONT_WEIGHTS, subset="latin"):
+    import requests
+    os.makedirs(FONTS_DIR, exist_ok=True)
+    saved = []
+    for font_name in font_names:
+        response = requests.get(
+            GOOGLE_FONTS_CSS,
+            params={'family': f"{font_name}:wght@{';'.join(str(weight) for weight in weights)}", 'display': "swap"},
+            headers={'User-Agent': WOFF2_USER_AGENT},
+            timeout=30,
+        )
+        response.raise_for_status()
+        for subset_name, weight, url in _FONT_FACE.findall(response.text):
+            if subset_name != subset:
+                continue
+            font = requests.get(url, timeout=30)
+            font.raise_for_status()
+            path = os.path.join(FONTS_DIR, font_file(font_name, int(weight)))
+            with open(path, "wb") as f:
+                f.write(font.content)
+            saved.append(path)
+    return saved
+
+
+def cmd_profile(args):
+    modules = script_imports(args.script) + (list(LAZY_MODULES) if args.lazy else [])
+    entries = import_profile(modules)
+    breakdown = import_breakdown(entries)
+    total = sum(seconds for _, seconds, _ in breakdown)
+    if args.json:
+        print(json.dumps({
+            'script': args.script,
+            'total_seconds': round(total, 4),
+            'packages': [{'package': package, 'seconds': round(seconds, 4), 'share': round(share, 4)}
+                         for package, seconds, share in breakdown],
+            'slowest_modules': [{'module': module, 'self_seconds': round(self_seconds, 4)}
+                                for module, self_seconds, _, _ in
+                                sorted(entries, key=lambda entry: entry[1], reverse=True)[:args.top]],
+        }, indent=2))
+        return
+    print(f"Imports for {os.path.basename(args.script)}{' (with lazy modules)' if args.lazy else ''}: {total:.2f}s")
+    for package, seconds, share in breakdown[:args.top]:
+        print(f"  {package:<28} {seconds:>7.3f}s  {share:>5.1%}")
+    if len(breakdown) > args.top:
+        rest = sum(seconds for _, seconds, _ in breakdown[args.top:])
+        print(f"  {f'({len(breakdown) - args.top} more)':<28} {rest:>7.3f}s  {rest / (total or 1.0):>5.1%}")
+
+
+def cmd_fetch_fonts(args):
+    saved = fetch_fonts(args.font or list(ThemeManager().fonts))
+    print(f"Saved {len(saved)} font files to {FONTS_DIR}", file=sys.stderr)
+
+
+# Warms this process, then runs the Streamlit server in it, so the first session finds everything loaded
+def cmd_serve(args):
+    timings = warm_start(api_key=os.environ.get("GEMINI_API_KEY"))
+    print(f"Warm start: {sum(timings.values()):.2f}s", file=sys.stderr)
+    from streamlit.web import cli as streamlit_cli
+    sys.argv = ["streamlit", "run", MAIN_SCRIPT, "--server.enableStaticServing=true", *args.streamlit_args]
+    sys.exit(streamlit_cli.main())
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="docugenius-startup", description="DocuGenius Pro startup tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    profile = commands.add_parser("profile", help="report where import time goes when the app starts")
+    profile.add_argument("--script", default=MAIN_SCRIPT)
+    profile.add_argument("--lazy", action="store_true", help="also import the modules loaded on first use")
+    profile.add_argument("--top", type=int, default=15)
+    profile.add_argument("--json", action="store_true", help="print machine-readable results")
+    profile.set_defaults(handler=cmd_profile)
+
+    fonts = commands.add_parser("fetch-fonts", help="download the theme fonts into static/fonts")
+    fonts.add_argument("--font", action="append", help="font family to fetch (default: all theme fonts)")
+    fonts.set_defaults(handler=cmd_fetch_fonts)
+
+    serve = commands.add_parser("serve", help="warm start, then run the Streamlit app")
+    serve.add_argument("streamlit_args", nargs=argparse.REMAINDER, help="passed on to `streamlit run`")
+    serve.set_defaults(handler=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    load_dotenv()
+    args = build_parser().parse_args(argv)
+    if getattr(args, "streamlit_args", None) and args.streamlit_args[0] == "--":
+        args.streamlit_args = args.streamlit_args[1:]
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import time
+from collections import namedtuple
+
+StreamResult = namedtuple("StreamResult", ["text", "time_to_first_token", "total_time", "chunks"])
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text or ""
+    except (AttributeError, ValueError):
+        # Gemini raises ValueError on .text for chunks without parts (e.g. safety stops)
+        return ""
+
+
+# Consume a streaming generate_content call, reporting partial text as it arrives
+def stream_generate(model, prompt, on_chunk=None, clock=time.perf_counter):
+    start = clock()
+    time_to_first_token = None
+    parts = []
+    for chunk in model.generate_content(prompt, stream=True):
+        text = _chunk_text(chunk)
+        if not text:
+            continue
+        if time_to_first_token is None:
+            time_to_first_token = clock() - start
+        parts.append(text)
+        if on_chunk is not None:
+            on_chunk("".join(parts))
+    total_time = clock() - start
+    if time_to_first_token is None:
+        time_to_first_token = total_time
+    return StreamResult("".join(parts), time_to_first_token, total_time, len(parts))
+
+
+# Blocking call with the same timing report, for when streaming is disabled
+def generate(model, prompt, clock=time.perf_counter):
+    start = clock()
+    response = model.generate_content(prompt)
+    total_time = clock() - start
+    return StreamResult(response.text, total_time, total_time, 1)
+
+
+# Minimal local model that yields pre-set chunks, for exercising the streaming path
+class FakeChunkModel:
+    _Chunk = namedtuple("_Chunk", ["text"])
+
+    def __init__(self, chunks, delay=0.0):
+        self.chunks = list(chunks)
+        self.delay = delay
+
+    def generate_content(self, prompt, stream=False):
+        if not stream:
+            return self._Chunk("".join(self.chunks))
+        return self._iterate()
+
+    def _iterate(self):
+        for text in self.chunks:
+            if self.delay:
+                time.sleep(self.delay)
+            yield self._Chunk(text)
@@ -0,0 +1,386 @@
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from analysis import MODEL_NAME
+from answer_cache import make_cache_key
+from context_budget import estimate_tokens
+from csv_ingestion import ColumnStats
+from metrics import observe, span
+from streaming import generate, stream_generate
+
+# Bump whenever the routing rules or the phrasing prompt change so cached answers are not reused
+TABLE_TEMPLATE_VERSION = "1"
+MAX_RESULT_ROWS = 50
+MAX_TOP_ROWS = 100
+
+AGGREGATE_WORDS = (
+    ("std", r"standard deviation|std(?:dev)?|stdev"),
+    ("median", r"median"),
+    ("mean", r"average|mean|avg"),
+    ("sum", r"sum|total"),
+    ("min", r"minimum|min|lowest|smallest"),
+    ("max", r"maximum|max|highest|largest|biggest"),
+)
+# Longest phrases first so "is not" wins over "is" and ">=" over ">"
+OPERATORS = (
+    ("ge", r">=|at least|no less than|greater than or equal to"),
+    ("le", r"<=|at most|no more than|less than or equal to"),
+    ("ne", r"!=|<>|is not|isn't|not equal to|does not equal"),
+    ("gt", r">|greater than|more than|larger than|higher than|above|over|exceeds?"),
+    ("lt", r"<|less than|fewer than|smaller than|lower than|below|under"),
+    ("contains", r"contains|containing|includes?"),
+    ("eq", r"==|=|equals?|equal to|is"),
+)
+OPERATOR_SYMBOLS = {'ge': ">=", 'le': "<=", 'ne': "!=", 'gt': ">", 'lt': "<", 'contains': "contains", 'eq': "=="}
+# Questions about reasons or meaning are left to the model even if they mention a statistic
+OPEN_ENDED = re.compile(r"^\s*(why|how come|explain|describe|summari[sz]e|compare|what does .* mean|"
+                        r"what (?:is|are) the (?:trend|pattern|insight)s?)\b", re.IGNORECASE)
+VALUE = r"\"[^\"]*\"|'[^']*'|-?\d[\d,]*(?:\.\d+)?|[\w.@/-]+"
+
+Condition = namedtuple("Condition", ["column", "op", "value"])
+# A parsed tabular question: what to compute over which columns, for the rows matching `conditions`
+TablePlan = namedtuple("TablePlan", ["kind", "column", "aggregate", "group_by", "limit", "descending",
+                                     "conditions"])
+TableResult = namedtuple("TableResult", ["operation", "value", "rows_matched"])
+
+
+def _normalize(text):
+    return re.sub(r"[\s_\-]+", " ", text.lower()).strip()
+
+
+def _column_pattern(columns):
+    names = sorted({_normalize(name) for name in columns}, key=len, reverse=True)
+    return "|".join(re.escape(name).replace(r"\ ", r"[\s_\-]+") for name in names if name)
+
+
+def _resolve(columns, mention):
+    mention = _normalize(mention)
+    for name in columns:
+        if _normalize(name) == mention:
+            return name
+    return None
+
+
+def _coerce(dataset, column, op, raw):
+    value = raw.strip("\"'")
+    if dataset.stats[column].numeric:
+        if op == "contains":
+            return None
+        try:
+            return float(value.replace(",", ""))
+        except ValueError:
+            return None
+    if op not in ("eq", "ne", "contains"):
+        return None
+    return value
+
+
+def _conditions(dataset, question, columns_pattern):
+    operators = "|".join(pattern for _, pattern in OPERATORS)
+    regex = re.compile(rf"(?<![\w])(?P<column>{columns_pattern})\s*(?:is\s+)?(?P<op>{operators})"
+                       rf"(?:(?<=[a-z])\s+|(?<![a-z])\s*)(?P<value>{VALUE})",
+                       re.IGNORECASE)
+    conditions, spans = [], []
+    for match in regex.finditer(question):
+        column = _resolve(dataset.columns, match.group("column"))
+        op_text = match.group("op").lower()
+        op = next(name for name, pattern in OPERATORS if re.fullmatch(pattern, op_text))
+        value = _coerce(dataset, column, op, match.group("value"))
+        if value is None:
+            return None, []
+        conditions.append(Condition(column, op, value))
+        spans.append(match.span())
+    return conditions, spans
+
+
+def _mentions(dataset, question, columns_pattern, skip):
+    regex = re.compile(rf"(?<![\w])(?:{columns_pattern})(?![\w])", re.IGNORECASE)
+    found = []
+    for match in regex.finditer(question):
+        if any(start <= match.start() < end for start, end in skip):
+            continue
+        found.append((match.start(), _resolve(dataset.columns, match.group(0))))
+    return found
+
+
+def _aggregate(question):
+    for name, pattern in AGGREGATE_WORDS:
+        match = re.search(rf"\b(?:{pattern})\b", question, re.IGNORECASE)
+        if match:
+            return name, match.start()
+    return None, None
+
+
+# Rule-based classification: returns a TablePlan for questions that can be computed exactly, else None
+def plan_table_question(dataset, question):
+    if OPEN_ENDED.search(question) or not dataset.columns:
+        return None
+    columns_pattern = _column_pattern(dataset.columns)
+    conditions, condition_spans = _conditions(dataset, question, columns_pattern)
+    if conditions is None:
+        return None
+    mentions = _mentions(dataset, question, columns_pattern, condition_spans)
+    numeric = [column for _, column in mentions if dataset.stats[column].numeric]
+    lowered = question.lower()
+
+    top = re.search(r"\b(top|bottom|highest|lowest|largest|smallest|biggest|first|last)\s+(\d+)\b", lowered) or \
+        re.search(r"\b(\d+)\s+(highest|lowest|largest|smallest|biggest|most|least)\b", lowered)
+    if top:
+        words = [group for group in top.groups() if not group.isdigit()]
+        limit = int(next(group for group in top.groups() if group.isdigit()))
+        by = re.search(rf"\bby\s+({columns_pattern})", question, re.IGNORECASE)
+        column = _resolve(dataset.columns, by.group(1)) if by else (numeric[-1] if numeric else None)
+        if column is None or not dataset.stats[column].numeric:
+            return None
+        descending = words[0] in ("top", "highest", "largest", "biggest", "most", "first")
+        return TablePlan("top", column, None, None, min(max(limit, 1), MAX_TOP_ROWS), descending, conditions)
+
+    distinct = re.search(rf"\b(?:unique|distinct)\s+(?:values?\s+(?:of|in|for)\s+)?({columns_pattern})",
+                         question, re.IGNORECASE)
+    if distinct:
+        column = _resolve(dataset.columns, distinct.group(1))
+        counting = re.search(r"\bhow many\b|\bnumber of\b|\bcount\b", lowered) is not None
+        return TablePlan("nunique" if counting else "distinct", column, None, None, MAX_RESULT_ROWS, True, conditions)
+
+    aggregate, position = _aggregate(question)
+    if aggregate is not None:
+        group = re.search(rf"\b(?:by|per|for each|grouped by|across)\s+({columns_pattern})", question, re.IGNORECASE)
+        group_by = _resolve(dataset.columns, group.group(1)) if group else None
+        # The measured column is the numeric one named closest after the aggregate word
+        candidates = [(start, column) for start, column in mentions
+                      if dataset.stats[column].numeric and column != group_by]
+        after = [column for start, column in candidates if start > position]
+        column = after[0] if after else (candidates[-1][1] if candidates else None)
+        if column is not None:
+            if group_by is not None and aggregate in ("median", "std"):
+                return None
+            others = [name for _, name in mentions if name not in (column, group_by)]
+            if aggregate in ("min", "max") and group_by is None and others and \
+                    re.match(r"\s*(which|who|what)\b", lowered):
+                # "Which product has the highest price?" asks for the row, not the value
+                return TablePlan("top", column, None, None, 1, aggregate == "max", conditions)
+            return TablePlan("group" if group_by else "aggregate", column, aggregate, group_by, MAX_RESULT_ROWS,
+                             aggregate != "min", conditions)
+
+    if re.search(r"\bhow many\b|\bnumber of (?:rows|records|entries|lines)\b|\bcount (?:of )?(?:the )?"
+                 r"(?:rows|records|entries)\b|\bcount rows\b", lowered):
+        group = re.search(rf"\b(?:by|per|for each|in each)\s+({columns_pattern})", question, re.IGNORECASE)
+        if group:
+            return TablePlan("group", None, "count", _resolve(dataset.columns, group.group(1)), MAX_RESULT_ROWS,
+                             True, conditions)
+        if not conditions and not re.search(r"\b(rows|records|entries|lines)\b", lowered):
+            return None
+        return TablePlan("count", None, None, None, None, True, conditions)
+    return None
+
+
+def _mask(frame, conditions):
+    mask = np.ones(len(frame), dtype=bool)
+    for condition in conditions:
+        values = frame[condition.column]
+        if condition.op == "contains":
+            matched = values.str.contains(condition.value, case=False, regex=False)
+        elif isinstance(condition.value, str):
+            matched = values.str.lower() == condition.value.lower()
+            if condition.op == "ne":
+                matched = ~matched
+        else:
+            matched = {
+                'gt': values > condition.value, 'ge': values >= condition.value,
+                'lt': values < condition.value, 'le': values <= condition.value,
+                'eq': values == condition.value, 'ne': values != condition.value,
+            }[condition.op]
+        mask &= matched.fillna(False).to_numpy(dtype=bool)
+    return mask
+
+
+def describe_plan(plan):
+    if plan.kind == "count":
+        text = "count(rows)"
+    elif plan.kind == "top":
+        text = f"{'top' if plan.descending else 'bottom'} {plan.limit} rows by {plan.column}"
+    elif plan.kind in ("distinct", "nunique"):
+        text = f"{'distinct' if plan.kind == 'distinct' else 'count distinct'}({plan.column})"
+    elif plan.kind == "group":
+        text = f"{plan.aggregate}({plan.column or 'rows'}) by {plan.group_by}"
+    else:
+        text = f"{plan.aggregate}({plan.column})"
+    if plan.conditions:
+        text += " where " + " and ".join(
+            f"{condition.column} {OPERATOR_SYMBOLS[condition.op]} "
+            + (repr(condition.value) if isinstance(condition.value, str) else _format_value(condition.value))
+            for condition in plan.conditions
+        )
+    return text
+
+
+def _stat_value(stats, aggregate):
+    return {'mean': stats.mean, 'sum': stats.total if stats.count else None, 'min': stats.minimum,
+            'max': stats.maximum, 'std': stats.std}[aggregate]
+
+
+# Executes a plan part by part, reading only the columns it needs; unfiltered aggregates come
+# straight from the statistics gathered at ingestion
+def run_table_plan(dataset, plan):
+    needed = {condition.column for condition in plan.conditions}
+    needed.update(column for column in (plan.column, plan.group_by) if column)
+    columns = [name for name in dataset.columns if name in needed] or dataset.columns[:1]
+    operation = describe_plan(plan)
+
+    if plan.kind == "aggregate" and not plan.conditions and plan.aggregate != "median":
+        stats = dataset.stats[plan.column]
+        return TableResult(operation, _stat_value(stats, plan.aggregate), stats.count)
+    if plan.kind == "count" and not plan.conditions:
+        return TableResult(operation, dataset.rows, dataset.rows)
+
+    matched = 0
+    stats, medians, counts, groups, top = ColumnStats(True), [], None, [], []
+    for part in dataset.iter_parts(dataset.columns if plan.kind == "top" else columns):
+        mask = _mask(part, plan.conditions)
+        selected = part[mask] if plan.conditions else part
+        matched += len(selected)
+        if plan.kind == "aggregate":
+            if plan.aggregate == "median":
+                medians.append(selected[plan.column].dropna().to_numpy(dtype=np.float64))
+            else:
+                stats.update(selected[plan.column])
+        elif plan.kind in ("distinct", "nunique"):
+            part_counts = selected[plan.column].value_counts()
+            counts = part_counts if counts is None else counts.add(part_counts, fill_value=0)
+        elif plan.kind == "group":
+            if plan.column is None:
+                groups.append(selected.groupby(plan.group_by, dropna=False).size().to_frame("count"))
+            else:
+                groups.append(selected.groupby(plan.group_by, dropna=False)[plan.column]
+                              .agg(["sum", "count", "min", "max"]))
+        elif plan.kind == "top":
+            candidates = selected.dropna(subset=[plan.column])
+            pick = candidates.nlargest if plan.descending else candidates.nsmallest
+            top.append(pick(plan.limit, plan.column))
+
+    if plan.kind == "count":
+        return TableResult(operation, matched, matched)
+    if plan.kind == "aggregate":
+        if plan.aggregate == "median":
+            values = np.concatenate(medians) if medians else np.empty(0)
+            return TableResult(operation, float(np.median(values)) if len(values) else None, len(values))
+        return TableResult(operation, _stat_value(stats, plan.aggregate), stats.count)
+    if plan.kind in ("distinct", "nunique"):
+        counts = counts if counts is not None else pd.Series(dtype=np.int64)
+        if plan.kind == "nunique":
+            return TableResult(operation, int(len(counts)), matched)
+        frame = counts.sort_values(ascending=False).head(plan.limit).astype(np.int64).rename("rows")
+        return TableResult(operation, frame.rename_axis(plan.column).reset_index(), matched)
+    if plan.kind == "top":
+        frame = pd.concat(top) if top else dataset.head.head(0)
+        pick = frame.nlargest if plan.descending else frame.nsmallest
+        return TableResult(operation, pick(plan.limit, plan.column).reset_index(drop=True), matched)
+
+    # Grouped: combine the per-part partial aggregates
+    if not groups:
+        return TableResult(operation, pd.DataFrame(columns=[plan.group_by, plan.aggregate]), 0)
+    partial = pd.concat(groups)
+    if plan.column is None:
+        values = partial.groupby(level=0, dropna=False)["count"].sum()
+    else:
+        combined = partial.groupby(level=0, dropna=False).agg({"sum": "sum", "count": "sum", "min": "min", "max": "max"})
+        values = combined["sum"] / combined["count"].where(combined["count"] > 0) if plan.aggregate == "mean" \
+            else combined[plan.aggregate]
+    values = values.sort_values(ascending=not plan.descending).head(plan.limit)
+    label = plan.aggregate if plan.column is None else f"{plan.aggregate} {plan.column}"
+    return TableResult(operation, values.rename(label).rename_axis(plan.group_by).reset_index(), matched)
+
+
+def _format_value(value, separators=True):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "n/a"
+    if isinstance(value, (int, np.integer)):
+        return f"{int(value):,}" if separators else str(int(value))
+    if isinstance(value, (float, np.floating)):
+        if value and abs(value) < 1:
+            return f"{float(value):.6g}"
+        return f"{float(value):,.4f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def markdown_table(frame):
+    header = "| " + " | ".join(str(column) for column in frame.columns) + " |"
+    divider = "| " + " | ".join("---" for _ in frame.columns) + " |"
+    # Cells are shown as stored (no thousands separators, so ids and years read naturally)
+    rows = ["| " + " | ".join(_format_value(value, separators=False) for value in row) + " |"
+            for row in frame.itertuples(index=False, name=None)]
+    return "\n".join([header, divider] + rows)
+
+
+def format_result(result):
+    if isinstance(result.value, pd.DataFrame):
+        if result.value.empty:
+            return "No rows matched."
+        return markdown_table(result.value)
+    return _format_value(result.value)
+
+
+def build_table_prompt(query, operation, result_text, rows_matched):
+    return f"""
+            A question about a CSV dataset was answered exactly with pandas.
+            Question: {query}
+            Computation: {operation} (over {rows_matched} matching rows)
+            Result:
+            {result_text}
+            Write a short, direct answer to the question from this result. Do not change, round or recompute
+            any numbers, and do not add information that is not in the result.
+            """
+
+
+# Answer a question over a CSV dataset locally when it is a lookup or aggregate; returns None when
+# the question needs the model. With `model`, the model only phrases the computed result.
+def answer_table_question(model, dataset, query, answer_cache=None, near_duplicates=False, model_name=MODEL_NAME,
+                          stream=False, on_chunk=None, phrase=True):
+    start = time.perf_counter()
+    with span("table_route"):
+        plan = plan_table_question(dataset, query)
+    if plan is None:
+        return None
+    cache_key = None
+    if answer_cache is not None:
+        cache_key = make_cache_key(dataset.dataset_id, query, model_name if phrase else "local",
+                                   f"{TABLE_TEMPLATE_VERSION}:table", near_duplicates=near_duplicates)
+        answer = answer_cache.get(cache_key)
+        if answer is not None:
+            return {'answer': answer, 'cached': True, 'strategy': 'cache', 'tokens_spent': 0, 'route': 'pandas',
+                    'operation': describe_plan(plan), 'latency': round(time.perf_counter() - start, 3)}
+    compute_start = time.perf_counter()
+    with span("table_query"):
+        result = run_table_plan(dataset, plan)
+    compute_time = time.perf_counter() - compute_start
+    result_text = format_result(result)
+    local_answer = f"**{result.operation}** ({result.rows_matched:,} matching rows):\n\n{result_text}"
+    usage = {'strategy': 'table', 'route': 'pandas', 'operation': result.operation,
+             'compute_time': round(compute_time, 4), 'llm_calls': 0, 'tokens_spent': 0}
+    answer = local_answer
+    if phrase and model is not None:
+        prompt = build_table_prompt(query, result.operation, result_text, result.rows_matched)
+        try:
+            with span("model_call"):
+                generated = stream_generate(model, prompt, on_chunk=on_chunk) if stream else generate(model, prompt)
+        except Exception as e:
+            # The computed result stands on its own; phrasing is optional
+            usage['phrasing_error'] = str(e)
+        else:
+            observe("model_first_token", generated.time_to_first_token)
+            prompt_tokens = estimate_tokens(prompt)
+            answer = generated.text.strip() or local_answer
+            if isinstance(result.value, pd.DataFrame) and not result.value.empty:
+                # Keep the exact rows next to the phrasing
+                answer += "\n\n" + result_text
+            usage.update(llm_calls=1, prompt_tokens=prompt_tokens,
+                         tokens_spent=prompt_tokens + estimate_tokens(generated.text),
+                         time_to_first_token=round(generated.time_to_first_token, 3),
+                         generation_time=round(generated.total_time, 3))
+    if answer_cache is not None:
+        answer_cache.put(cache_key, answer)
+    return dict(usage, answer=answer, cached=False, latency=round(time.perf_counter() - start, 3))
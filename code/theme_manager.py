@@ -1,5 +1,24 @@
+import functools
+import os
 import streamlit as st
 
+# Assets shipped with the app; Streamlit serves this folder at app/static when static serving is enabled
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+FONTS_DIR = os.path.join(STATIC_DIR, "fonts")
+FONT_WEIGHTS = (300, 400, 600, 700)
+SIDEBAR_IMAGE = os.path.join(STATIC_DIR, "sidebar.svg")
+GOOGLE_FONTS_CSS = "https://fonts.googleapis.com/css2"
+
+# Bundled file of one font weight, e.g. ("Open Sans", 600) -> OpenSans-600.woff2
+def font_file(font_name, weight):
+    return f"{font_name.replace(' ', '')}-{weight}.woff2"
+
+# Read once per process instead of fetching a remote image on every render
+@functools.lru_cache(maxsize=None)
+def sidebar_image():
+    with open(SIDEBAR_IMAGE, encoding="utf-8") as image:
+        return image.read()
+
 class ThemeManager:
     def __init__(self):
         self.themes = {
@@ -43,12 +62,30 @@ class ThemeManager:
             "Inter": "'Inter', sans-serif",
             "Montserrat": "'Montserrat', sans-serif"
         }
-    def apply_theme(self, theme_name, font_name):
+    def font_bundled(self, font_name):
+        return all(os.path.exists(os.path.join(FONTS_DIR, font_file(font_name, weight))) for weight in FONT_WEIGHTS)
+    # @font-face rules for a font bundled under static/fonts (an installed copy is preferred); fonts not yet
+    # bundled with `startup.py fetch-fonts` are still loaded from Google Fonts so the choice keeps working
+    def font_faces(self, font_name):
+        if not self.font_bundled(font_name):
+            weights = ";".join(str(weight) for weight in FONT_WEIGHTS)
+            return f"@import url('{GOOGLE_FONTS_CSS}?family={font_name.replace(' ', '+')}:wght@{weights}&display=swap');"
+        rules = []
+        for weight in FONT_WEIGHTS:
+            file_name = font_file(font_name, weight)
+            rules.append(
+                f"@font-face {{ font-family: '{font_name}'; font-style: normal; font-weight: {weight}; "
+                f"font-display: swap; src: local('{font_name}'), url('app/static/fonts/{file_name}') format('woff2'); }}"
+            )
+        return "\n        ".join(rules)
+    # The CSS only depends on (theme, font), so build each combination once
+    @functools.lru_cache(maxsize=None)
+    def build_css(self, theme_name, font_name):
         selected_theme = self.themes.get(theme_name, self.themes["Dark"])
         selected_font = self.fonts.get(font_name, "'Roboto', sans-serif")
         theme_css = f"""
         <style>
-        @import url('https://fonts.googleapis.com/css2?family={font_name.replace(" ", "+")}:wght@300;400;600;700&display=swap');
+        {self.font_faces(font_name)}
         .stApp {{
             background-color: {selected_theme['background']};
             color: {selected_theme['text_color']};
@@ -131,4 +168,12 @@ class ThemeManager:
         }}
         </style>
         """
-        st.markdown(theme_css, unsafe_allow_html=True)
\ No newline at end of file
+        return theme_css
+    def apply_theme(self, theme_name, font_name):
+        st.markdown(self.build_css(theme_name, font_name), unsafe_allow_html=True)
+    # Builds every theme/font combination and loads the bundled images ahead of the first page
+    def warm(self):
+        for theme_name in self.themes:
+            for font_name in self.fonts:
+                self.build_css(theme_name, font_name)
+        sidebar_image()
\ No newline at end of file
@@ -0,0 +1,151 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+
+from answer_cache import DEFAULT_CACHE_DIR
+
+# Bucket width in seconds for each rollup resolution
+RESOLUTIONS = {'minute': 60, 'hour': 3600, 'day': 86400}
+# How long buckets of each resolution are kept (None: forever)
+RETENTION = {'minute': 2 * 86400, 'hour': 90 * 86400, 'day': None}
+# Buffered events are written once this many have accumulated, or this long after the last write
+FLUSH_EVENTS = 200
+FLUSH_SECONDS = 2.0
+PRUNE_SECONDS = 3600
+
+
+# Server-wide usage counters in time-bucketed rollups, shared by every session (and the API) through SQLite
+class UsageAnalytics:
+    def __init__(self, path=None, clock=time.time):
+        self.clock = clock
+        self._lock = threading.Lock()
+        if path is None:
+            os.makedirs(DEFAULT_CACHE_DIR, exist_ok=True)
+            path = os.path.join(DEFAULT_CACHE_DIR, "analytics.sqlite")
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rollups (resolution TEXT NOT NULL, bucket INTEGER NOT NULL, "
+            "metric TEXT NOT NULL, label TEXT NOT NULL, count INTEGER NOT NULL, total REAL NOT NULL, "
+            "minimum REAL, maximum REAL, PRIMARY KEY (resolution, metric, bucket, label))"
+        )
+        self._db.commit()
+        self._pending = {}
+        self._pending_events = 0
+        self._last_flush = clock()
+        self._last_prune = 0.0
+        self._writes = 0
+        self._results = {}
+        atexit.register(self.flush)
+
+    # O(1): folds the event into in-memory buckets, which are written to SQLite in batches
+    def record(self, metric, label="", value=None, count=1):
+        now = self.clock()
+        with self._lock:
+            for resolution, seconds in RESOLUTIONS.items():
+                key = (resolution, int(now // seconds) * seconds, metric, label)
+                entry = self._pending.get(key)
+                if entry is None:
+                    entry = self._pending[key] = [0, 0.0, None, None]
+                entry[0] += count
+                if value is not None:
+                    entry[1] += value
+                    entry[2] = value if entry[2] is None else min(entry[2], value)
+                    entry[3] = value if entry[3] is None else max(entry[3], value)
+            self._pending_events += 1
+            due = self._pending_events >= FLUSH_EVENTS or now - self._last_flush >= FLUSH_SECONDS
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._pending_events = 0
+            now = self._last_flush = self.clock()
+            if pending:
+                self._db.executemany(
+                    "INSERT INTO rollups (resolution, bucket, metric, label, count, total, minimum, maximum) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (resolution, metric, bucket, label) DO UPDATE SET "
+                    "count = count + excluded.count, total = total + excluded.total, "
+                    "minimum = CASE WHEN minimum IS NULL OR excluded.minimum < minimum "
+                    "THEN excluded.minimum ELSE minimum END, "
+                    "maximum = CASE WHEN maximum IS NULL OR excluded.maximum > maximum "
+                    "THEN excluded.maximum ELSE maximum END",
+                    [key + tuple(entry) for key, entry in pending.items()],
+                )
+                self._writes += 1
+            if now - self._last_prune >= PRUNE_SECONDS:
+                self._last_prune = now
+                for resolution, keep in RETENTION.items():
+                    if keep is not None:
+                        self._db.execute("DELETE FROM rollups WHERE resolution = ? AND bucket < ?",
+                                         (resolution, now - keep))
+            self._db.commit()
+
+    # Changes whenever any process has written new aggregates; results are cached against it
+    def version(self):
+        self.flush()
+        with self._lock:
+            return self._db.execute("PRAGMA data_version").fetchone()[0], self._writes
+
+    # A result is reused while no new data was written and its window has not moved on
+    def _cached(self, key, window, compute):
+        version = self.version(), window
+        cached = self._results.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        with self._lock:
+            result = compute()
+        self._results[key] = (version, result)
+        return result
+
+    # The last `buckets` buckets of `metric`, zero-filled and oldest first:
+    # (bucket starts, {label: counts}, mean value per bucket or None)
+    def timeline(self, metric, resolution="minute", buckets=60):
+        seconds = RESOLUTIONS[resolution]
+        last = int(self.clock() // seconds) * seconds
+        starts = tuple(range(last - (buckets - 1) * seconds, last + 1, seconds))
+
+        def compute():
+            counts, totals = {}, [[0, 0.0] for _ in starts]
+            for bucket, label, count, total in self._db.execute(
+                "SELECT bucket, label, count, total FROM rollups "
+                "WHERE resolution = ? AND metric = ? AND bucket >= ?",
+                (resolution, metric, starts[0]),
+            ):
+                position = (bucket - starts[0]) // seconds
+                counts.setdefault(label, [0] * len(starts))[position] += count
+                totals[position][0] += count
+                totals[position][1] += total
+            means = tuple(total / count if count else None for count, total in totals)
+            return starts, {label: tuple(values) for label, values in sorted(counts.items())}, means
+        return self._cached(("timeline", metric, resolution, buckets), starts[0], compute)
+
+    # Per-label totals of `metric` over the last `days` days: {label: (count, mean value, max value)}
+    def totals(self, metric, days=1):
+        since = (int(self.clock() // 86400) - (days - 1)) * 86400
+
+        def compute():
+            return {
+                label: (count, total / count if count and maximum is not None else None, maximum)
+                for label, count, total, maximum in self._db.execute(
+                    "SELECT label, SUM(count), SUM(total), MAX(maximum) FROM rollups "
+                    "WHERE resolution = 'day' AND metric = ? AND bucket >= ? GROUP BY label ORDER BY label",
+                    (metric, since),
+                )
+            }
+        return self._cached(("totals", metric, days), since, compute)
+
+
+_default_analytics = None
+_default_analytics_lock = threading.Lock()
+
+
+def default_analytics():
+    global _default_analytics
+    with _default_analytics_lock:
+        if _default_analytics is None:
+            _default_analytics = UsageAnalytics()
+        return _default_analytics
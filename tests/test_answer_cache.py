@@ -0,0 +1,71 @@
+import answer_cache
+from answer_cache import AnswerCache, make_cache_key
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+def key(query, near_duplicates=False, doc_hash="doc", model_name="model"):
+    return make_cache_key(doc_hash, query, model_name, "v1", near_duplicates=near_duplicates)
+
+
+def test_answers_expire_after_the_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "time", clock.time)
+    cache = AnswerCache(path=str(tmp_path / "answers.sqlite"), ttl_seconds=60)
+    cache.put("k", "answer")
+    clock.now += 59
+    assert cache.get("k") == "answer"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert cache.disk_usage()['entries'] == 0
+    assert cache.misses == 1
+
+
+def test_disk_tier_evicts_least_recently_accessed_over_the_byte_budget(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(answer_cache.time, "time", clock.time)
+    cache = AnswerCache(path=str(tmp_path / "answers.sqlite"), max_memory_entries=1, max_disk_bytes=250)
+    for name in ("a", "b"):
+        cache.put(name, name * 100)
+        clock.now += 1
+    # Read "a" from disk, so "b" becomes the least recently accessed
+    assert cache.get("a") == "a" * 100
+    clock.now += 1
+    cache.put("c", "c" * 100)
+    assert cache.disk_usage() == {'entries': 2, 'bytes': 200}
+    assert cache.get("b") is None
+    assert cache.get("a") == "a" * 100
+    assert cache.get("c") == "c" * 100
+
+
+def test_memory_tier_keeps_the_most_recent_entries(tmp_path):
+    cache = AnswerCache(path=str(tmp_path / "answers.sqlite"), max_memory_entries=2)
+    for name in ("a", "b", "c"):
+        cache.put(name, name)
+    assert list(cache._memory) == ["b", "c"]
+    assert cache.get("a") == "a"
+    assert cache.stats['disk_hits'] == 1
+    assert cache.get("a") == "a"
+    assert cache.stats['memory_hits'] == 1
+
+
+def test_near_duplicate_questions_share_a_key():
+    assert key("What is the  warranty?", near_duplicates=True) == key("what is the warranty", near_duplicates=True)
+    assert key("What is the  warranty?") == key("What is the warranty?")
+    assert key("What is the warranty?") != key("what is the warranty")
+    assert key("What is the warranty?", doc_hash="other") != key("What is the warranty?")
+    assert key("What is the warranty?", model_name="other") != key("What is the warranty?")
+
+
+def test_answers_persist_across_instances(tmp_path):
+    path = str(tmp_path / "answers.sqlite")
+    AnswerCache(path=path).put(key("question"), "stored answer")
+    reopened = AnswerCache(path=path)
+    assert reopened.get(key("question")) == "stored answer"
+    assert reopened.stats['disk_hits'] == 1
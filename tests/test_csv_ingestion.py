@@ -0,0 +1,97 @@
+import io
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from csv_ingestion import ColumnStats, ingest_csv
+
+
+def csv_file(frame, **options):
+    return io.BytesIO(frame.to_csv(index=False, **options).encode("utf-8"))
+
+
+@pytest.fixture
+def sales():
+    rng = np.random.default_rng(7)
+    return pd.DataFrame({
+        'region': rng.choice(["north", "south", "east"], size=1000),
+        'units': rng.integers(1, 50, size=1000),
+        'price': np.round(rng.uniform(1, 100, size=1000), 2),
+    })
+
+
+def test_column_stats_match_pandas_across_chunks_and_merges():
+    values = pd.Series([3.0, None, 7.5, -2.0, 11.0, None, 4.25])
+    first, second = ColumnStats(True), ColumnStats(True)
+    first.update(values[:3])
+    second.update(values[3:])
+    first.merge(second)
+    assert (first.count, first.nulls) == (5, 2)
+    assert first.minimum == -2.0 and first.maximum == 11.0
+    assert first.mean == pytest.approx(values.mean())
+    assert first.std == pytest.approx(values.std())
+    restored = ColumnStats.from_dict(first.to_dict())
+    assert restored.mean == first.mean and restored.std == first.std
+
+
+def test_text_columns_count_values_but_have_no_mean():
+    stats = ColumnStats(False)
+    stats.update(pd.Series(["a", None, "b"]))
+    assert (stats.count, stats.nulls, stats.mean, stats.std) == (2, 1, None, None)
+
+
+def test_chunked_ingest_keeps_every_row_and_whole_file_statistics(tmp_path, sales):
+    dataset = ingest_csv(csv_file(sales), chunk_rows=128, root=str(tmp_path))
+    assert dataset.rows == 1000
+    assert len(dataset.part_paths) == 8
+    assert dataset.numeric_columns == ["units", "price"]
+    assert dataset.stats['price'].mean == pytest.approx(sales['price'].mean())
+    assert dataset.stats['units'].maximum == sales['units'].max()
+    loaded = dataset.load()
+    assert loaded['units'].sum() == sales['units'].sum()
+    assert list(loaded['region']) == list(sales['region'])
+    assert len(dataset.sample) == 20
+
+
+def test_appended_rows_reuse_the_unchanged_blocks(tmp_path, sales):
+    first = ingest_csv(csv_file(sales), chunk_rows=100, root=str(tmp_path))
+    extra = sales.head(50).assign(units=99)
+    revised = ingest_csv(csv_file(pd.concat([sales, extra])), chunk_rows=100, root=str(tmp_path), previous=first)
+    assert revised.manifest['reused_blocks'] == 10
+    assert revised.rows == 1050
+    assert revised.stats['units'].total == sales['units'].sum() + 99 * 50
+    assert revised.load()['units'].sum() == revised.stats['units'].total
+
+
+def test_blocks_are_not_reused_when_a_column_changes_type(tmp_path, sales):
+    first = ingest_csv(csv_file(sales), chunk_rows=100, root=str(tmp_path))
+    revised = sales.astype({'units': str})
+    revised.loc[0, 'units'] = "unknown"
+    second = ingest_csv(csv_file(revised), chunk_rows=100, root=str(tmp_path), previous=first)
+    assert second.manifest['reused_blocks'] == 0
+    assert "units" not in second.numeric_columns
+
+
+def test_concurrent_ingests_of_the_same_file_agree(tmp_path, sales):
+    data = sales.to_csv(index=False).encode("utf-8")
+    barrier = threading.Barrier(4)
+    results, errors = [], []
+
+    def ingest():
+        barrier.wait()
+        try:
+            results.append(ingest_csv(io.BytesIO(data), chunk_rows=100, root=str(tmp_path)))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=ingest) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert {dataset.dataset_id for dataset in results} == {results[0].dataset_id}
+    assert all(dataset.rows == 1000 for dataset in results)
+    assert not list(tmp_path.glob("*.partial"))
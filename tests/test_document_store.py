@@ -0,0 +1,51 @@
+import threading
+
+import numpy as np
+
+from document_store import DocumentStore
+
+
+def test_put_round_trips_text(tmp_path):
+    store = DocumentStore(root=str(tmp_path))
+    text = "héllo wörld " * 20000
+    doc_hash, stored = store.put(text)
+    assert doc_hash in store
+    assert str(stored) == text
+    assert stored[5:40] == text[5:40]
+
+
+def test_concurrent_puts_of_the_same_text_all_succeed(tmp_path):
+    text = "page one\n" * 50000 + "page two\n" * 50000
+    sections = [0, 450000]
+    for trial in range(20):
+        store = DocumentStore(root=str(tmp_path / str(trial)))
+        barrier = threading.Barrier(4)
+        results, errors = [], []
+
+        def put():
+            barrier.wait()
+            try:
+                results.append(store.put(text, sections=sections)[0])
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=put) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert errors == []
+        assert len(set(results)) == 1
+        assert str(store.open(results[0])) == text
+        assert list(np.load(store._sections_path(results[0]))) == sections
+        assert not list(tmp_path.rglob("*.partial"))
+
+
+def test_sections_are_added_to_text_stored_without_them(tmp_path):
+    store = DocumentStore(root=str(tmp_path))
+    text = "first page\nsecond page\n"
+    doc_hash, _ = store.put(text)
+    assert len(store.index(doc_hash)) == 1
+    store.put(text, sections=[0, 11])
+    assert list(np.load(store._sections_path(doc_hash))) == [0, 11]
+    assert [chunk.text.strip() for chunk in store.index(doc_hash).chunks] == ["first page", "second page"]
@@ -0,0 +1,62 @@
+import io
+import json
+
+import PyPDF2
+from reportlab.platypus import Flowable
+
+import export_pipeline
+from export_pipeline import build_pdf_report, export_history, start_export
+
+
+def entries(count, answer="An answer."):
+    return [{'timestamp': "2026-01-01 10:00:00", 'type': "Text", 'query': f"question {i}", 'answer': answer,
+             'strategy': "retrieval"} for i in range(count)]
+
+
+# Taller than any page and cannot be split
+class TallBox(Flowable):
+    def wrap(self, available_width, available_height):
+        return available_width, available_height * 3
+
+    def split(self, available_width, available_height):
+        return []
+
+
+def pdf_text(data):
+    return "".join(page.extract_text() for page in PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+def test_jsonl_export_writes_one_line_per_entry():
+    lines = export_history(entries(3), "jsonl").decode("utf-8").splitlines()
+    assert [json.loads(line)['query'] for line in lines] == ["question 0", "question 1", "question 2"]
+
+
+def test_long_answers_are_split_across_pages():
+    buffer = io.BytesIO()
+    build_pdf_report(entries(2, answer="word " * 20000), buffer)
+    assert len(PyPDF2.PdfReader(io.BytesIO(buffer.getvalue())).pages) > 2
+
+
+def test_items_too_large_for_a_page_are_replaced_and_counted(monkeypatch):
+    report_flowables = export_pipeline._report_flowables
+
+    def with_tall_box(*args):
+        yield TallBox()
+        yield from report_flowables(*args)
+
+    monkeypatch.setattr(export_pipeline, "_report_flowables", with_tall_box)
+    truncated = []
+    buffer = io.BytesIO()
+    build_pdf_report(entries(2), buffer, on_truncated=lambda: truncated.append(1))
+    text = pdf_text(buffer.getvalue())
+    assert len(truncated) == 1
+    assert "Omitted" in text
+    assert "question 1" in text
+
+
+def test_export_job_counts_truncated_items(monkeypatch):
+    monkeypatch.setattr(export_pipeline, "_report_flowables", lambda *args: iter([TallBox()]))
+    job = start_export(lambda: entries(1), "pdf", total=1, type_counts={'Text': 1})
+    job._future.result()
+    assert job.error is None
+    assert job.truncated == 1
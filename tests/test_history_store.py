@@ -0,0 +1,36 @@
+from datetime import datetime, timedelta
+
+from history_store import TIMESTAMP_FORMAT, HistoryStore
+
+
+def entry(query, days_ago=0):
+    timestamp = (datetime.now() - timedelta(days=days_ago)).strftime(TIMESTAMP_FORMAT)
+    return {'timestamp': timestamp, 'query': query, 'answer': f"answer to {query}", 'type': 'Text'}
+
+
+def test_owners_see_only_their_own_entries(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    alice, bob = store.for_owner("alice"), store.for_owner("bob")
+    alice.append(entry("revenue"))
+    assert [row['query'] for row in alice.page()] == ["revenue"]
+    assert len(bob) == 0
+    bob.clear()
+    assert len(alice) == 1
+
+
+def test_history_survives_reopening_the_store(tmp_path):
+    path = str(tmp_path / "history.sqlite")
+    HistoryStore(path, owner="alice").append(entry("revenue"))
+    assert HistoryStore(path, owner="alice").last()['query'] == "revenue"
+
+
+def test_prune_inactive_removes_only_idle_owners(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    idle, active = store.for_owner("idle"), store.for_owner("active")
+    idle.append(entry("old", days_ago=120))
+    idle.append(entry("older", days_ago=100))
+    active.append(entry("old", days_ago=120))
+    active.append(entry("recent", days_ago=1))
+    assert store.prune_inactive(90) == 2
+    assert len(idle) == 0
+    assert len(active) == 2
@@ -0,0 +1,127 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from http_fetch import HttpCache, ResponseTooLarge, decode_body, fetch, fetch_many
+
+TEXT = "Café crème brûlée, naïve façade and jalapeño piñata. " * 40
+# path -> (Content-Type header, body)
+PAGES = {
+    "/utf8-no-charset": ("text/html", TEXT.encode("utf-8")),
+    "/latin1-declared": ("text/html; charset=iso-8859-1", TEXT.encode("iso-8859-1")),
+    "/utf8-declared": ("text/html; charset=utf-8", TEXT.encode("utf-8")),
+    "/etag": ("text/html; charset=utf-8", TEXT.encode("utf-8")),
+    "/large": ("text/plain", b"x" * 200_000),
+}
+# Requests currently being served under /slow/, and the most seen at once
+in_flight = {'now': 0, 'peak': 0}
+in_flight_lock = threading.Lock()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/large-streamed":
+            # No Content-Length: only the bytes actually read can trip the cap
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.end_headers()
+            for _ in range(50):
+                self.wfile.write(b"x" * 4096)
+            return
+        if self.path.startswith("/slow/"):
+            self.serve_slowly()
+            return
+        if self.path not in PAGES:
+            self.send_error(404)
+            return
+        content_type, body = PAGES[self.path]
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if self.path == "/etag":
+            self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def serve_slowly(self):
+        with in_flight_lock:
+            in_flight['now'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+        time.sleep(0.05)
+        with in_flight_lock:
+            in_flight['now'] -= 1
+        body = self.path.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def session():
+    with requests.Session() as session:
+        yield session
+
+
+def test_detects_encoding_when_no_charset_is_sent(server, session):
+    result = fetch(server + "/utf8-no-charset", session=session)
+    assert result.encoding.lower().replace("_", "-") == "utf-8"
+    assert decode_body(result) == TEXT
+
+
+@pytest.mark.parametrize("path, encoding", [("/latin1-declared", "iso-8859-1"), ("/utf8-declared", "utf-8")])
+def test_declared_charset_is_kept(server, session, path, encoding):
+    result = fetch(server + path, session=session)
+    assert result.encoding.lower() == encoding
+    assert decode_body(result) == TEXT
+
+
+def test_revalidated_body_keeps_its_encoding(server, session, tmp_path):
+    cache = HttpCache(path=str(tmp_path))
+    first = fetch(server + "/etag", session=session, cache=cache)
+    second = fetch(server + "/etag", session=session, cache=cache)
+    assert not first.from_cache
+    assert second.from_cache and second.status == 304
+    assert decode_body(second) == TEXT
+
+
+@pytest.mark.parametrize("path", ["/large", "/large-streamed"])
+def test_bodies_over_the_byte_cap_are_rejected(server, session, path):
+    with pytest.raises(ResponseTooLarge):
+        fetch(server + path, session=session, max_bytes=100_000)
+    assert len(fetch(server + path, session=session, max_bytes=300_000).content) > 100_000
+
+
+def test_fetch_many_limits_requests_per_host(server, session):
+    in_flight['peak'] = 0
+    urls = [f"{server}/slow/{i}" for i in range(8)]
+    results = fetch_many(urls, session=session, max_workers=8, per_host=2)
+    assert [result.content.decode("utf-8") for result in results] == [f"/slow/{i}" for i in range(8)]
+    assert in_flight['peak'] == 2
+
+
+def test_fetch_many_returns_failures_in_place(server, session):
+    results = fetch_many([server + "/utf8-declared", server + "/missing"], session=session)
+    assert decode_body(results[0]) == TEXT
+    assert isinstance(results[1], requests.HTTPError)
@@ -0,0 +1,29 @@
+import time
+
+from ingest_manifest import ManifestStore, unchanged_count
+
+
+def test_manifests_are_kept_per_user(tmp_path):
+    store = ManifestStore(str(tmp_path / "manifests.sqlite"))
+    store.put("pdf", "contract.pdf", {'doc_id': "a"}, owner="alice")
+    assert store.get("pdf", "contract.pdf", owner="alice") == {'doc_id': "a"}
+    assert store.get("pdf", "contract.pdf", owner="bob") is None
+    assert store.get("pdf", "contract.pdf") is None
+
+
+def test_manifests_survive_reopening_and_idle_ones_are_pruned(tmp_path):
+    path = str(tmp_path / "manifests.sqlite")
+    store = ManifestStore(path)
+    store.put("pdf", "old.pdf", {'doc_id': "old"}, owner="alice")
+    store.put("pdf", "new.pdf", {'doc_id': "new"}, owner="alice")
+    with store._lock:
+        store._db.execute("UPDATE manifests SET updated = ? WHERE key LIKE '%old.pdf'", (time.time() - 100 * 86400,))
+        store._db.commit()
+    reopened = ManifestStore(path, max_idle_days=90)
+    assert reopened.get("pdf", "old.pdf", owner="alice") is None
+    assert reopened.get("pdf", "new.pdf", owner="alice") == {'doc_id': "new"}
+
+
+def test_unchanged_count_ignores_order_and_counts_duplicates():
+    assert unchanged_count(["a", "b", "b"], ["b", "a", "b", "b", "c"]) == 3
+    assert unchanged_count(None, ["a"]) == 0
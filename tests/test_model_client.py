@@ -0,0 +1,135 @@
+import threading
+import time
+
+import pytest
+
+from model_backends import FakeBackend
+from model_client import ModelClient, SingleFlight
+from rate_limit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_token_bucket_spends_and_refills():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=3, clock=clock)
+    assert all(bucket.try_consume(1) for _ in range(3))
+    assert not bucket.try_consume(1)
+    clock.now += 1.0
+    assert bucket.try_consume(1)
+    clock.now += 100.0
+    assert bucket.available == 3
+
+
+def test_token_bucket_settles_usage_after_the_fact():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=10, clock=clock)
+    assert bucket.try_consume(4)
+    bucket.adjust(8)
+    assert bucket.available == -2
+    assert not bucket.try_consume(1)
+    bucket.adjust(-5)
+    assert bucket.available == 3
+
+
+def test_token_bucket_consume_waits_for_refill():
+    bucket = TokenBucket(1200, capacity=1)
+    assert bucket.consume(1) == pytest.approx(0.0, abs=0.01)
+    assert bucket.consume(1) == pytest.approx(0.05, abs=0.04)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flights, release, calls = SingleFlight(), threading.Event(), []
+
+    def upstream():
+        calls.append(1)
+        release.wait(5)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.call("key", upstream))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.coalesced == 4)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert results == ["answer"] * 5
+    # The flight is over, so the next call goes upstream again
+    flights.call("key", upstream)
+    assert len(calls) == 2
+
+
+def test_single_flight_shares_errors_with_followers():
+    flights, release = SingleFlight(), threading.Event()
+
+    def upstream():
+        release.wait(5)
+        raise RuntimeError("quota exceeded")
+
+    errors = []
+
+    def call():
+        try:
+            flights.call("key", upstream)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    wait_until(lambda: flights.coalesced == 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ["quota exceeded"] * 3
+
+
+def test_single_flight_stream_followers_replay_leader_chunks():
+    flights, release = SingleFlight(), threading.Event()
+
+    def upstream():
+        yield "a"
+        release.wait(5)
+        yield "b"
+        yield "c"
+
+    leader = flights.stream("key", upstream)
+    assert next(leader) == "a"
+    follower_chunks = []
+    follower = threading.Thread(target=lambda: follower_chunks.extend(flights.stream("key", upstream)))
+    follower.start()
+    wait_until(lambda: follower_chunks == ["a"])
+    release.set()
+    assert list(leader) == ["b", "c"]
+    follower.join(5)
+    assert follower_chunks == ["a", "b", "c"]
+
+
+def test_client_sends_identical_concurrent_prompts_upstream_once():
+    backend = FakeBackend(first_token_latency=0.2, chunk_delay=0.0)
+    model = ModelClient(backend, requests_per_minute=6000)("fake-model")
+    answers = []
+    threads = [threading.Thread(target=lambda: answers.append(model.generate_content("same prompt").text))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert backend.calls == 1
+    assert model.client.flights.coalesced == 3
+    assert len(set(answers)) == 1 and len(answers) == 4
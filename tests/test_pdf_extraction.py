@@ -0,0 +1,39 @@
+import pytest
+from reportlab.pdfgen import canvas
+
+from pdf_extraction import PARALLEL_THRESHOLD, PageTextCache, extract_pdf_text
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    def make(pages):
+        path = str(tmp_path / f"{len(pages)}-pages.pdf")
+        pdf = canvas.Canvas(path)
+        for text in pages:
+            pdf.drawString(72, 720, text)
+            pdf.showPage()
+        pdf.save()
+        return path
+    return make
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_pages_are_extracted_in_order(make_pdf, max_workers):
+    pages = [f"page number {i}" for i in range(PARALLEL_THRESHOLD + 4)]
+    progress = []
+    result = extract_pdf_text(make_pdf(pages), max_workers=max_workers,
+                              on_progress=lambda done, total: progress.append((done, total)))
+    assert [text.strip() for text in result.page_texts] == pages
+    assert result.pages == len(pages)
+    assert progress[-1] == (len(pages), len(pages))
+    assert result.peak_rss_growth_mb is None or result.peak_rss_growth_mb >= 0
+
+
+def test_cached_pages_are_not_extracted_again(make_pdf, tmp_path):
+    cache = PageTextCache(str(tmp_path / "pages.sqlite"))
+    first = extract_pdf_text(make_pdf(["alpha", "beta", "gamma"]), cache=cache)
+    assert first.cached_pages == 0
+    revised = extract_pdf_text(make_pdf(["alpha", "beta", "gamma", "delta"]), cache=cache)
+    assert revised.cached_pages == 3
+    assert revised.page_hashes[:3] == first.page_hashes
+    assert revised.page_texts[3].strip() == "delta"
@@ -0,0 +1,82 @@
+from collections import namedtuple
+
+import pytest
+
+from streaming import FakeChunkModel, generate, stream_generate
+
+
+class StepClock:
+    def __init__(self, step=1.0):
+        self.now = 0.0
+        self.step = step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+# Chunk whose .text raises, as Gemini does for chunks without parts (e.g. a safety stop)
+class PartlessChunk:
+    @property
+    def text(self):
+        raise ValueError("Response has no parts")
+
+
+class ScriptedModel:
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.yielded = 0
+
+    def generate_content(self, prompt, stream=False):
+        assert stream
+        return self._iterate()
+
+    def _iterate(self):
+        for chunk in self.chunks:
+            self.yielded += 1
+            yield chunk
+
+
+def test_stream_reports_growing_partial_text():
+    partials = []
+    result = stream_generate(FakeChunkModel(["The ", "answer ", "is 42."]), "prompt", on_chunk=partials.append)
+    assert result.text == "The answer is 42."
+    assert result.chunks == 3
+    assert partials == ["The ", "The answer ", "The answer is 42."]
+
+
+def test_stream_matches_blocking_generate():
+    model = FakeChunkModel(["One ", "two ", "three."])
+    assert stream_generate(model, "prompt").text == generate(model, "prompt").text
+
+
+def test_stream_times_first_token_from_first_text_chunk():
+    Chunk = namedtuple("Chunk", ["text"])
+    model = ScriptedModel([Chunk(""), PartlessChunk(), Chunk("Hello"), Chunk(" world")])
+    result = stream_generate(model, "prompt", clock=StepClock())
+    # Clock reads: start, first text chunk, end
+    assert result.time_to_first_token == 1.0
+    assert result.total_time == 2.0
+    assert result.text == "Hello world"
+    assert result.chunks == 2
+
+
+def test_stream_without_text_falls_back_to_total_time():
+    model = ScriptedModel([PartlessChunk(), namedtuple("Chunk", ["text"])(None)])
+    result = stream_generate(model, "prompt", clock=StepClock())
+    assert result.text == ""
+    assert result.chunks == 0
+    assert result.time_to_first_token == result.total_time
+
+
+def test_callback_error_cancels_the_stream():
+    Chunk = namedtuple("Chunk", ["text"])
+    model = ScriptedModel([Chunk("a"), Chunk("b"), Chunk("c"), Chunk("d")])
+
+    def stop_after_two(partial):
+        if len(partial) == 2:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        stream_generate(model, "prompt", on_chunk=stop_after_two)
+    assert model.yielded == 2
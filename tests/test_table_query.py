@@ -0,0 +1,110 @@
+import io
+
+import pandas as pd
+import pytest
+
+from answer_cache import AnswerCache
+from csv_ingestion import ingest_csv
+from model_backends import FakeBackend
+from table_query import answer_table_question, plan_table_question, run_table_plan
+
+ORDERS = pd.DataFrame({
+    'product': ["lamp", "desk", "chair", "lamp", "sofa", "desk", "chair", "lamp"],
+    'region': ["north", "south", "north", "east", "south", "north", "east", "south"],
+    'units': [3, 1, 4, 2, 1, 5, 2, 6],
+    'price': [20.0, 150.0, 45.5, 20.0, 499.0, 140.0, 45.5, 22.0],
+})
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    data = io.BytesIO(ORDERS.to_csv(index=False).encode("utf-8"))
+    # Small blocks, so every computation has to combine several parts
+    return ingest_csv(data, chunk_rows=3, root=str(tmp_path))
+
+
+def run(dataset, question):
+    plan = plan_table_question(dataset, question)
+    assert plan is not None, question
+    return plan, run_table_plan(dataset, plan)
+
+
+def test_mean_uses_the_stored_statistics(dataset):
+    plan, result = run(dataset, "What is the average price?")
+    assert (plan.kind, plan.aggregate, plan.column) == ("aggregate", "mean", "price")
+    assert result.value == pytest.approx(ORDERS['price'].mean())
+    assert result.rows_matched == len(ORDERS)
+
+
+def test_median_with_a_condition_scans_the_matching_rows(dataset):
+    _, result = run(dataset, "What is the median price where region is north?")
+    assert result.value == pytest.approx(ORDERS[ORDERS['region'] == "north"]['price'].median())
+    assert result.rows_matched == 3
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many rows where units > 2?", int((ORDERS['units'] > 2).sum())),
+    ("How many rows where product is lamp?", 3),
+    ("How many rows are there?", len(ORDERS)),
+])
+def test_count_where(dataset, question, expected):
+    plan, result = run(dataset, question)
+    assert plan.kind == "count"
+    assert result.value == expected
+
+
+def test_top_n_returns_whole_rows(dataset):
+    plan, result = run(dataset, "Show the top 3 rows by price")
+    assert (plan.kind, plan.limit, plan.descending) == ("top", 3, True)
+    assert list(result.value['price']) == sorted(ORDERS['price'], reverse=True)[:3]
+    assert list(result.value['product']) == ["sofa", "desk", "desk"]
+
+
+def test_which_row_has_the_highest_value(dataset):
+    plan, result = run(dataset, "Which product has the highest price?")
+    assert (plan.kind, plan.limit) == ("top", 1)
+    assert result.value['product'][0] == "sofa"
+
+
+def test_group_sum_combines_partial_aggregates(dataset):
+    plan, result = run(dataset, "What is the total units by region?")
+    assert (plan.kind, plan.aggregate, plan.group_by) == ("group", "sum", "region")
+    expected = ORDERS.groupby("region")['units'].sum()
+    assert dict(zip(result.value['region'], result.value['sum units'])) == expected.to_dict()
+
+
+def test_distinct_count(dataset):
+    plan, result = run(dataset, "How many unique product are there?")
+    assert plan.kind == "nunique"
+    assert result.value == ORDERS['product'].nunique()
+
+
+@pytest.mark.parametrize("question", [
+    "Why are sofa sales so low?",
+    "Summarize the pricing strategy",
+    "What do these products have in common?",
+    "What is the median price by region?",
+])
+def test_open_ended_questions_fall_back_to_the_model(dataset, question):
+    assert plan_table_question(dataset, question) is None
+    assert answer_table_question(None, dataset, question) is None
+
+
+def test_local_answers_are_cached_without_a_model(dataset, tmp_path):
+    cache = AnswerCache(path=str(tmp_path / "answers.sqlite"))
+    first = answer_table_question(None, dataset, "What is the total units?", answer_cache=cache, phrase=False)
+    assert first['route'] == "pandas" and first['llm_calls'] == 0
+    assert str(int(ORDERS['units'].sum())) in first['answer']
+    second = answer_table_question(None, dataset, "What is the total units?", answer_cache=cache, phrase=False)
+    assert second['cached'] and second['answer'] == first['answer']
+
+
+def test_the_model_only_phrases_the_computed_result(dataset):
+    backend = FakeBackend()
+    result = answer_table_question(backend("gemini-1.5-flash"), dataset, "Show the top 2 rows by units")
+    assert result['route'] == "pandas"
+    assert result['llm_calls'] == 1
+    assert backend.calls == 1
+    # The exact rows are kept next to the phrasing
+    assert "| lamp | south | 6 | 22 |" in result['answer']
+    assert "| desk | north | 5 | 140 |" in result['answer']
@@ -0,0 +1,19 @@
+import theme_manager
+from theme_manager import FONT_WEIGHTS, ThemeManager, font_file
+
+
+def test_fonts_not_bundled_are_loaded_from_google_fonts(tmp_path, monkeypatch):
+    monkeypatch.setattr(theme_manager, "FONTS_DIR", str(tmp_path))
+    css = ThemeManager().build_css("Dark", "Open Sans")
+    assert "@import url('https://fonts.googleapis.com/css2?family=Open+Sans:wght@300;400;600;700" in css
+    assert "@font-face" not in css
+
+
+def test_bundled_fonts_are_served_locally(tmp_path, monkeypatch):
+    monkeypatch.setattr(theme_manager, "FONTS_DIR", str(tmp_path))
+    for weight in FONT_WEIGHTS:
+        (tmp_path / font_file("Inter", weight)).write_bytes(b"wOF2")
+    css = ThemeManager().build_css("Light", "Inter")
+    assert css.count("@font-face") == len(FONT_WEIGHTS)
+    assert "url('app/static/fonts/Inter-700.woff2')" in css
+    assert "googleapis" not in css